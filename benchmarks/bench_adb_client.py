@@ -0,0 +1,80 @@
+"""
+Compares adb queries/second of the in-process socket client against the subprocess path.
+
+Runs against the fake adb server. If a real adb binary is on PATH the subprocess path uses it
+(pointed at the fake server), otherwise the fake adb tool is used, which also pays python
+startup and so overstates the subprocess cost.
+
+    python benchmarks/bench_adb_client.py [--seconds 3]
+"""
+
+import argparse
+import shutil
+import sys
+import time
+from subprocess import check_output
+from typing import Callable
+
+from android_tester.adb_client import AdbClient
+from android_tester.simulator import FakeToolchain, make_device
+
+
+def measure(name: str, func: Callable[[], object], seconds: float) -> float:
+    count = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while time.perf_counter() < deadline:
+        func()
+        count += 1
+    qps = count / (time.perf_counter() - start)
+    print(f"  {name:<40} {qps:10.1f} queries/s")
+    return qps
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="adb socket client vs subprocess benchmark"
+    )
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+    real_adb = shutil.which("adb")
+    devices = [make_device(f"emulator-{5554 + 2 * i}") for i in range(4)]
+    with FakeToolchain(devices, adb_server=True) as sim:
+        adb = real_adb or "adb"
+        print(
+            f"subprocess path uses {'real adb at ' + real_adb if real_adb else 'the fake adb tool'}"
+        )
+        client = AdbClient(port=sim.server.port)
+        results = {}
+        print("adb devices -l")
+        results["subprocess devices"] = measure(
+            "subprocess (sh -c adb devices -l)",
+            lambda: check_output(f"{adb} devices -l", shell=True),
+            args.seconds,
+        )
+        results["socket devices"] = measure(
+            "socket client host:devices-l", client.devices_l, args.seconds
+        )
+        print("adb shell getprop")
+        cmd = f"{adb} -s emulator-5554 shell getprop ro.product.model"
+        results["subprocess shell"] = measure(
+            "subprocess (sh -c adb shell getprop)",
+            lambda: check_output(cmd, shell=True),
+            args.seconds,
+        )
+        results["socket shell"] = measure(
+            "socket client shell:getprop",
+            lambda: client.shell("emulator-5554", "getprop ro.product.model"),
+            args.seconds,
+        )
+    print(
+        f"speedup devices: {results['socket devices'] / results['subprocess devices']:.1f}x"
+    )
+    print(
+        f"speedup shell:   {results['socket shell'] / results['subprocess shell']:.1f}x"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""
+Process spawn throughput: command strings run through /bin/sh (the old exec_cmd/os.system
+path) against argv lists run directly, which lets subprocess use vfork/posix_spawn and
+skips the shell process in between.
+
+    python benchmarks/bench_spawn.py [--seconds 3]
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import time
+from typing import Callable
+
+from android_tester import aio
+from android_tester.common import run_cmd
+
+
+def measure(
+    name: str, func: Callable[[], object], seconds: float, unit: str = "spawns/s"
+) -> float:
+    count = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while time.perf_counter() < deadline:
+        func()
+        count += 1
+    rate = count / (time.perf_counter() - start)
+    print(f"  {name:<44} {rate:10.1f} {unit}")
+    return rate
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="shell vs argv process spawn benchmark"
+    )
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+    true = shutil.which("true")
+    if true is None:
+        print("true not found on PATH")
+        return 1
+    results = {}
+    results["os.system"] = measure(
+        "os.system (sh -c true)", lambda: os.system(true), args.seconds
+    )
+    results["shell"] = measure(
+        "subprocess.run(shell=True)",
+        lambda: subprocess.run(true, shell=True, check=False),
+        args.seconds,
+    )
+    results["argv"] = measure(
+        "subprocess.run(argv)",
+        lambda: subprocess.run([true], check=False),
+        args.seconds,
+    )
+    results["posix_spawn"] = measure(
+        "subprocess.run(argv, close_fds=False)",
+        lambda: subprocess.run([true], check=False, close_fds=False),
+        args.seconds,
+    )
+    results["run_cmd"] = measure(
+        "common.run_cmd(argv) (asyncio, captured)",
+        lambda: run_cmd([true]),
+        args.seconds,
+    )
+    results["aio batch"] = 16 * measure(
+        "aio.run, batches of 16 concurrently",
+        lambda: aio.run_sync(_batch(true, 16)),
+        args.seconds,
+        unit="batches/s",
+    )
+    print(f"concurrent aio.run: {results['aio batch']:.1f} spawns/s")
+    print(f"speedup argv vs shell: {results['argv'] / results['shell']:.1f}x")
+    return 0
+
+
+async def _batch(true: str, count: int) -> None:
+    await asyncio.gather(*[aio.run([true]) for _ in range(count)])
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""
+Orchestration overhead benchmarks against the simulator: device enumeration, waiting for an
+emulator to boot, APK install and the multi-device fan-out. The fake tools answer instantly
+(or after fixed configured latencies), so the times measured are android_tester's own.
+
+    pytest benchmarks/test_bench_orchestration.py [--benchmark-compare]
+"""
+
+import asyncio
+import os
+import tempfile
+from typing import Iterator
+
+import pytest
+
+from android_tester.android_tests import run_all_devices
+from android_tester.common import get_live_devices
+from android_tester.emulator_pool import launch_emulator
+from android_tester.install_cache import InstallCache, install_if_changed
+from android_tester.logpump import BOOT_COMPLETED, LogPump
+from android_tester.props import PROPS
+from android_tester.readiness import wait_until_ready
+from android_tester.simulator import FakeToolchain, make_device
+
+pytest.importorskip("pytest_benchmark")
+
+DEVICE_COUNT = 8
+DEVICES = [make_device(f"R58M{i}", model="Galaxy S10") for i in range(DEVICE_COUNT)]
+PACKAGE = "com.example.app"
+
+
+@pytest.fixture(name="apk")
+def fixture_apk() -> Iterator[str]:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "app-debug.apk")
+        with open(path, encoding="utf-8", mode="w") as file:
+            file.write(PACKAGE)  # the fake adb reads the package name from the apk
+        yield path
+
+
+@pytest.mark.parametrize("adb_server", [False, True], ids=["subprocess", "adb_server"])
+def test_enumerate_devices(benchmark, adb_server: bool) -> None:
+    with FakeToolchain(DEVICES, adb_server=adb_server):
+
+        def enumerate_devices() -> int:
+            PROPS.invalidate()
+            return len(get_live_devices())
+
+        assert benchmark(enumerate_devices) == DEVICE_COUNT
+
+
+def test_boot_wait(benchmark) -> None:
+    """Overhead of launching an emulator and detecting it ready, on top of a 0.2 s boot"""
+    ports = iter(range(5600, 5800, 2))
+    with FakeToolchain([], avds=["Pixel_API_33"], boot_duration=0.2):
+
+        def boot() -> bool:
+            port = next(ports)
+            process = launch_emulator("Pixel_API_33", port)
+            assert process is not None and process.stdout is not None
+            pump = LogPump(process.stdout, name=f"emulator-{port}")
+            trigger = pump.add_trigger(BOOT_COMPLETED)
+            pump.start()
+            try:
+                return wait_until_ready(
+                    f"emulator-{port}",
+                    timeout=30,
+                    console_port=port,
+                    boot_signal=trigger.event,
+                ).ready
+            finally:
+                process.terminate()
+                process.wait()
+                pump.join()
+
+        assert benchmark.pedantic(boot, rounds=5, iterations=1)
+
+
+@pytest.mark.parametrize("cached", [False, True], ids=["push", "skip"])
+def test_install(benchmark, apk: str, cached: bool) -> None:
+    with FakeToolchain(DEVICES[:1]) as sim:
+        cache = InstallCache(os.path.join(sim.root, "install_cache.json"))
+
+        def install() -> bool:
+            if not cached:
+                cache.forget(DEVICES[0]["serial"])
+            return asyncio.run(
+                install_if_changed(DEVICES[0]["serial"], apk, PACKAGE, cache)
+            )
+
+        install()  # warm the cache for the skip case
+        assert benchmark(install) is not cached
+
+
+def test_fan_out(benchmark) -> None:
+    with FakeToolchain(DEVICES) as sim:
+        devices = get_live_devices()
+        output_root = os.path.join(sim.root, "out")
+        results = benchmark.pedantic(
+            run_all_devices,
+            args=(devices,),
+            kwargs={"output_root": output_root},
+            rounds=3,
+            iterations=1,
+        )
+        assert len(results) == DEVICE_COUNT and all(result.ok for result in results)
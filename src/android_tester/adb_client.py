@@ -0,0 +1,259 @@
+"""
+In-process adb client speaking the adb server wire protocol over TCP, so that queries
+don't have to spawn a shell and an adb client process each time.
+
+Every request is a 4 hex digit length followed by the service name, answered by OKAY or
+FAIL. The server closes the connection once a service is done (host:transport switches
+the same connection over to the device first), so every request opens its own connection:
+a local TCP connect, far cheaper than spawning the adb executable.
+"""
+
+from __future__ import annotations
+
+import os
+import socket
+import struct
+import threading
+import time
+from typing import Iterator
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 5037
+SYNC_DATA_MAX = 64 * 1024
+CLIENT_ENV = "ANDROID_TESTER_ADB"  # set to "subprocess" to disable the socket client
+
+
+class AdbError(Exception):
+    """The adb server answered FAIL or the connection broke"""
+
+
+def server_port() -> int:
+    return int(os.environ.get("ANDROID_ADB_SERVER_PORT", DEFAULT_PORT))
+
+
+class AdbConnection:
+    """A single connection to the adb server"""
+
+    def __init__(self, sock: socket.socket) -> None:
+        self.sock = sock
+
+    def close(self) -> None:
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+    def send_request(self, service: str) -> None:
+        payload = service.encode("utf-8")
+        self.sock.sendall(f"{len(payload):04x}".encode("ascii") + payload)
+        self.read_status(service)
+
+    def read_status(self, service: str = "") -> None:
+        status = self.read_exact(4)
+        if status == b"OKAY":
+            return
+        if status == b"FAIL":
+            raise AdbError(
+                f"{service}: {self.read_length_prefixed().decode('utf-8', 'replace')}"
+            )
+        raise AdbError(f"{service}: unexpected status {status!r}")
+
+    def read_exact(self, size: int) -> bytes:
+        chunks: list[bytes] = []
+        remaining = size
+        while remaining > 0:
+            chunk = self.sock.recv(remaining)
+            if not chunk:
+                raise AdbError(
+                    f"connection closed, {remaining} of {size} bytes missing"
+                )
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return b"".join(chunks)
+
+    def read_length_prefixed(self) -> bytes:
+        size = int(self.read_exact(4), 16)
+        return self.read_exact(size)
+
+    def read_all(self, timeout: float | None = None) -> bytes:
+        """Reads until the server closes the connection, raises TimeoutError after timeout
+        seconds in total (None: the socket timeout per read)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        chunks: list[bytes] = []
+        while True:
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"no end of output within {timeout}s")
+                self.sock.settimeout(remaining)
+            chunk = self.sock.recv(SYNC_DATA_MAX)
+            if not chunk:
+                return b"".join(chunks)
+            chunks.append(chunk)
+
+    def iter_length_prefixed(self) -> Iterator[bytes]:
+        """Yields the length prefixed messages of a streaming service (track-devices)"""
+        while True:
+            try:
+                yield self.read_length_prefixed()
+            except AdbError:
+                return
+
+
+class AdbClient:
+    """adb server client: host:devices-l, host:transport, shell: and sync:"""
+
+    def __init__(
+        self, host: str = DEFAULT_HOST, port: int | None = None, timeout: float = 60
+    ) -> None:
+        self.host = host
+        self.port = port if port is not None else server_port()
+        self.timeout = timeout
+
+    def connect(self, timeout: float | None = None) -> AdbConnection:
+        sock = socket.create_connection(
+            (self.host, self.port), timeout=self.timeout if timeout is None else timeout
+        )
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return AdbConnection(sock)
+
+    def host_query(self, service: str) -> str:
+        conn = self.connect()
+        try:
+            conn.send_request(service)
+            return conn.read_length_prefixed().decode("utf-8", "replace")
+        finally:
+            conn.close()
+
+    def version(self) -> int:
+        return int(self.host_query("host:version"), 16)
+
+    def devices_l(self) -> list[str]:
+        """Same lines as `adb devices -l` without the header"""
+        lines = self.host_query("host:devices-l").splitlines()
+        return [line.strip() for line in lines if line.strip()]
+
+    def transport(self, serial: str, timeout: float | None = None) -> AdbConnection:
+        """Returns a connection switched over to the device, the caller must close it"""
+        conn = self.connect(timeout)
+        try:
+            conn.send_request(f"host:transport:{serial}")
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    def shell(self, serial: str, cmd: str, timeout: float | None = None) -> str:
+        """Output of the command, raises TimeoutError when it takes longer than timeout"""
+        conn = self.transport(serial, timeout)
+        try:
+            conn.send_request(f"shell:{cmd}")
+            return conn.read_all(timeout).decode("utf-8", "replace")
+        finally:
+            conn.close()
+
+    def _sync(self, serial: str) -> AdbConnection:
+        conn = self.transport(serial)
+        try:
+            conn.send_request("sync:")
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    @staticmethod
+    def _sync_request(conn: AdbConnection, cmd: bytes, payload: bytes) -> None:
+        conn.sock.sendall(cmd + struct.pack("<I", len(payload)) + payload)
+
+    def stat(self, serial: str, path: str) -> tuple[int, int, int]:
+        """Returns (mode, size, mtime), all zero if the path does not exist"""
+        conn = self._sync(serial)
+        try:
+            self._sync_request(conn, b"STAT", path.encode("utf-8"))
+            header = conn.read_exact(16)
+            if header[:4] != b"STAT":
+                raise AdbError(f"sync STAT: unexpected reply {header[:4]!r}")
+            mode, size, mtime = struct.unpack("<III", header[4:])
+            self._sync_request(conn, b"QUIT", b"")
+            return mode, size, mtime
+        finally:
+            conn.close()
+
+    def pull(self, serial: str, path: str) -> bytes:
+        conn = self._sync(serial)
+        try:
+            self._sync_request(conn, b"RECV", path.encode("utf-8"))
+            chunks = []
+            while True:
+                header = conn.read_exact(8)
+                cmd, size = header[:4], struct.unpack("<I", header[4:])[0]
+                if cmd == b"DONE":
+                    break
+                if cmd == b"FAIL":
+                    raise AdbError(
+                        f"pull {path}: {conn.read_exact(size).decode('utf-8', 'replace')}"
+                    )
+                if cmd != b"DATA":
+                    raise AdbError(f"pull {path}: unexpected reply {cmd!r}")
+                chunks.append(conn.read_exact(size))
+            self._sync_request(conn, b"QUIT", b"")
+            return b"".join(chunks)
+        finally:
+            conn.close()
+
+    def push(
+        self,
+        serial: str,
+        data: bytes,
+        path: str,
+        mode: int = 0o644,
+        mtime: int | None = None,
+    ) -> None:
+        conn = self._sync(serial)
+        try:
+            self._sync_request(conn, b"SEND", f"{path},{0o100000 | mode}".encode())
+            for offset in range(0, len(data), SYNC_DATA_MAX):
+                self._sync_request(conn, b"DATA", data[offset : offset + SYNC_DATA_MAX])
+            stamp = int(time.time()) if mtime is None else mtime
+            conn.sock.sendall(b"DONE" + struct.pack("<I", stamp))
+            header = conn.read_exact(8)
+            if header[:4] == b"FAIL":
+                size = struct.unpack("<I", header[4:])[0]
+                raise AdbError(
+                    f"push {path}: {conn.read_exact(size).decode('utf-8', 'replace')}"
+                )
+            if header[:4] != b"OKAY":
+                raise AdbError(f"push {path}: unexpected reply {header[:4]!r}")
+            self._sync_request(conn, b"QUIT", b"")
+        finally:
+            conn.close()
+
+
+_CLIENT: AdbClient | None = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def get_client() -> AdbClient | None:
+    """Returns the shared client, or None if the adb server can't be reached (callers then
+    fall back to the adb executable, which also starts the server)"""
+    global _CLIENT  # pylint: disable=global-statement
+    if os.environ.get(CLIENT_ENV) == "subprocess":
+        return None
+    with _CLIENT_LOCK:
+        if _CLIENT is not None and _CLIENT.port == server_port():
+            return _CLIENT
+        client = AdbClient()
+        try:
+            client.version()
+        except (OSError, AdbError):
+            return None
+        _CLIENT = client
+        return _CLIENT
+
+
+def drop_client(client: AdbClient) -> None:
+    """The server stopped answering (restarted or killed): the next get_client() probes it again"""
+    global _CLIENT  # pylint: disable=global-statement
+    with _CLIENT_LOCK:
+        if _CLIENT is client:
+            _CLIENT = None
@@ -0,0 +1,334 @@
+"""
+asyncio-native versions of the common helpers. Commands are argv lists started with
+asyncio.create_subprocess_exec (no shell) in their own process group, so a timeout or a
+cancellation kills the whole child process tree. Input that used to be piped in by the shell
+(`yes | sdkmanager --licenses`) is fed to stdin instead. The blocking helpers in common.py
+are thin wrappers over these via run_sync(), which runs them on one long-lived event loop in
+a background thread, so the limit on child processes holds across all blocking callers.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import io
+import os
+import shlex
+import signal
+import subprocess
+import sys
+import threading
+import weakref
+from asyncio.subprocess import Process
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import IO, Any, Callable, Coroutine, Sequence, TypeVar
+
+from android_tester.adb_client import AdbError, drop_client, get_client
+from android_tester.env import PROJECT_ROOT
+
+T = TypeVar("T")
+
+POSIX = os.name == "posix"
+MAX_PROCESSES = (
+    32  # concurrent child processes per event loop, run_sync() callers share one
+)
+MAX_DEVICES = 16  # concurrent per-device operations in the multi-device helpers
+
+_SEMAPHORES: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore] = (
+    weakref.WeakKeyDictionary()
+)
+_LOOP: asyncio.AbstractEventLoop | None = None
+# Called with the serial after every install/uninstall, the package index registers here.
+PACKAGE_LISTENERS: list[Callable[[str], None]] = []
+_LOOP_LOCK = threading.Lock()
+
+
+@dataclass
+class CommandResult:
+    """Exit code and captured output (stdout and stderr) of a command"""
+
+    argv: list[str]
+    returncode: int
+    stdout: str
+
+
+def split_cmd(cmd: str | Sequence[str]) -> list[str]:
+    """argv of a command, a string is split like a shell would but never run by one"""
+    return shlex.split(cmd, posix=POSIX) if isinstance(cmd, str) else list(cmd)
+
+
+def process_semaphore() -> asyncio.Semaphore:
+    """Bounds the number of child processes started from the running loop"""
+    loop = asyncio.get_running_loop()
+    semaphore = _SEMAPHORES.get(loop)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(MAX_PROCESSES)
+        _SEMAPHORES[loop] = semaphore
+    return semaphore
+
+
+def kill_process_tree(proc: Process | subprocess.Popen) -> None:
+    """Kills the process and everything it started"""
+    if proc.returncode is not None:
+        return
+    try:
+        if POSIX:
+            os.killpg(proc.pid, signal.SIGKILL)
+        else:
+            subprocess.run(
+                ["taskkill", "/T", "/F", "/PID", str(proc.pid)],
+                capture_output=True,
+                check=False,
+            )
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def has_fd(stream: IO) -> bool:
+    """False for a replaced sys.stdout (the daemon's, redirect_stdout) a child can't inherit"""
+    try:
+        stream.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return False
+    return True
+
+
+async def run(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    argv: Sequence[str],
+    cwd: str | None = None,
+    env: dict[str, str] | None = None,
+    timeout: float | None = None,
+    capture: bool = True,
+    stdout: IO | None = None,
+    input: bytes | None = None,  # pylint: disable=redefined-builtin
+    merge_stderr: bool = True,
+) -> CommandResult:
+    """Runs argv, raises subprocess.TimeoutExpired (after killing the tree) on timeout.
+
+    The captured output includes stderr unless merge_stderr is False (then it is inherited).
+    Output that would be inherited while sys.stdout has no file descriptor is written to it
+    when the command is done. A missing executable gives returncode 127, like a shell would.
+    """
+    argv = list(argv)
+    forward = not capture and stdout is None and not has_fd(sys.stdout)
+    out_target: Any = subprocess.PIPE if capture or forward else stdout
+    err_target: Any = (
+        subprocess.STDOUT if out_target is not None and merge_stderr else None
+    )
+    async with process_semaphore():
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *argv,
+                cwd=cwd,
+                env=env,
+                stdin=subprocess.PIPE if input is not None else None,
+                stdout=out_target,
+                stderr=err_target,
+                start_new_session=POSIX,
+            )
+        except FileNotFoundError:
+            return CommandResult(
+                argv=argv, returncode=127, stdout=f"{argv[0]}: command not found\n"
+            )
+        try:
+            output, _ = await asyncio.wait_for(proc.communicate(input), timeout)
+        except asyncio.TimeoutError as e:
+            kill_process_tree(proc)
+            await proc.wait()
+            raise subprocess.TimeoutExpired(argv, timeout or 0) from e
+        except asyncio.CancelledError:
+            kill_process_tree(proc)
+            raise
+    text = output.decode("utf-8", "replace") if output is not None else ""
+    if forward:
+        sys.stdout.write(text)
+        text = ""
+    return CommandResult(argv=argv, returncode=proc.returncode or 0, stdout=text)
+
+
+async def exec_cmd(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    argv: Sequence[str],
+    cwd: str | None = None,
+    ignore_errors: bool = False,
+    timeout: float | None = None,
+    env: dict[str, str] | None = None,
+    stdout: IO | None = None,
+    input: bytes | None = None,  # pylint: disable=redefined-builtin
+) -> int:
+    """Executes a command with inherited (or redirected) output, input is fed to its stdin.
+
+    Raises subprocess.CalledProcessError on failure unless ignore_errors."""
+    cwd = cwd or PROJECT_ROOT or None
+    print(f"Executing:\n  {shlex.join(argv)}\n  with cwd={cwd}")
+    result = await run(
+        argv,
+        cwd=cwd,
+        env=env,
+        timeout=timeout,
+        capture=False,
+        stdout=stdout,
+        input=input,
+    )
+    if result.returncode != 0 and not ignore_errors:
+        raise subprocess.CalledProcessError(result.returncode, list(argv))
+    return result.returncode
+
+
+async def adb_shell(serial: str, cmd: str, timeout: float | None = 60) -> str:
+    """Output of a device shell command, over the adb server socket when possible"""
+    client = get_client()
+    if client is not None:
+        try:
+            # The socket times out, so the thread never outlives the call.
+            return await asyncio.to_thread(client.shell, serial, cmd, timeout)
+        except TimeoutError:
+            raise
+        except OSError as e:
+            drop_client(client)
+            print(
+                f"adb server connection failed ({e}), falling back to the adb executable"
+            )
+    result = await run(["adb", "-s", serial, "shell", cmd], timeout=timeout)
+    return result.stdout
+
+
+async def query_adb_devices() -> list[str]:
+    """`adb devices -l` lines without the header"""
+    client = get_client()
+    if client is not None:
+        try:
+            return await asyncio.to_thread(client.devices_l)
+        except OSError as e:
+            drop_client(client)
+            print(
+                f"adb server connection failed ({e}), falling back to the adb executable"
+            )
+    result = await run(["adb", "devices", "-l"], timeout=60)
+    lines = [line.strip() for line in result.stdout.splitlines()]
+    return [line for line in lines if line and "List of devices attached" not in line]
+
+
+def invalidate_packages(serial: str) -> None:
+    """Our own install/uninstall changed the packages of the device"""
+    for listener in PACKAGE_LISTENERS:
+        listener(serial)
+
+
+async def uninstall(
+    serial: str, package_name: str, ignore_errors: bool = False
+) -> bool:
+    """Uninstalls the package.
+
+    Raises subprocess.CalledProcessError on failure unless ignore_errors."""
+    print(f"Running: adb -s {serial} uninstall {package_name}")
+    try:
+        if get_client() is not None:
+            output = (await adb_shell(serial, f"pm uninstall {package_name}")).strip()
+            ok = "Success" in output
+        else:
+            result = await run(
+                ["adb", "-s", serial, "uninstall", package_name], timeout=60
+            )
+            output = result.stdout.strip()
+            ok = result.returncode == 0
+    finally:
+        invalidate_packages(serial)
+    print(output)
+    if not ok and not ignore_errors:
+        raise subprocess.CalledProcessError(
+            1, ["adb", "-s", serial, "uninstall", package_name], output
+        )
+    return ok
+
+
+async def install(
+    serial: str, apk: str, streaming: bool = True, timeout: float | None = 300
+) -> bool:
+    """Installs (or replaces) an apk, test-only apks included.
+
+    Raises subprocess.CalledProcessError on failure. --streaming writes the apk straight to
+    the package manager instead of pushing it to /data/local/tmp first."""
+    argv = (
+        ["adb", "-s", serial, "install", "-r", "-t"]
+        + (["--streaming"] if streaming else [])
+        + [apk]
+    )
+    print(f"Running: {shlex.join(argv)}")
+    try:
+        result = await run(argv, timeout=timeout)
+    finally:
+        invalidate_packages(serial)
+    output = result.stdout.strip()
+    if result.returncode != 0 or "Success" not in output:
+        raise subprocess.CalledProcessError(result.returncode or 1, argv, output)
+    return True
+
+
+async def uninstall_apk(
+    package_name: str, device_serial: str, ignore_errors: bool = False
+) -> bool:
+    """Uninstalls the apk"""
+    return await uninstall(device_serial, package_name, ignore_errors=ignore_errors)
+
+
+async def wait_for_boot(
+    serial: str,
+    timeout: float = 60,
+    poll_interval: float = 0.5,
+    boot_signal: threading.Event | None = None,
+) -> bool:
+    """Polls sys.boot_completed until it is 1, returns False on timeout.
+
+    boot_signal (e.g. a log pump trigger) cuts the wait between two polls short."""
+    print(f"Running: adb -s {serial} shell getprop sys.boot_completed")
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while loop.time() < deadline:
+        try:
+            output = await adb_shell(
+                serial,
+                "getprop sys.boot_completed",
+                timeout=max(deadline - loop.time(), 0.1),
+            )
+            if output.strip() == "1":
+                return True
+        except (OSError, subprocess.SubprocessError, asyncio.TimeoutError, AdbError):
+            pass  # the device is not reachable yet (offline, unauthorized)
+        print("Waiting for device to boot up...")
+        wait = min(poll_interval, max(deadline - loop.time(), 0))
+        if boot_signal is not None:
+            await asyncio.to_thread(boot_signal.wait, wait)
+        else:
+            await asyncio.sleep(wait)
+    return False
+
+
+def background_loop() -> asyncio.AbstractEventLoop:
+    """The event loop of run_sync(), started on first use and kept for the life of the process"""
+    global _LOOP  # pylint: disable=global-statement
+    with _LOOP_LOCK:
+        if _LOOP is None or _LOOP.is_closed():
+            _LOOP = asyncio.new_event_loop()
+            threading.Thread(
+                target=_LOOP.run_forever, name="aio-loop", daemon=True
+            ).start()
+        return _LOOP
+
+
+def run_sync(coro: Coroutine[Any, Any, T]) -> T:
+    """Runs a coroutine to completion from blocking code, on the shared background loop"""
+    loop = background_loop()
+    try:
+        running: asyncio.AbstractEventLoop | None = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        # Called from a coroutine of the background loop itself, waiting on it would deadlock.
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            return pool.submit(asyncio.run, coro).result()
+    future = asyncio.run_coroutine_threadsafe(coro, loop)
+    try:
+        return future.result()
+    except BaseException:
+        future.cancel()  # e.g. KeyboardInterrupt, don't leave the command running
+        raise
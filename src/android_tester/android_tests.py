@@ -2,25 +2,52 @@
 # ruff: noqa: E501
 # flake8: noqa: E501
 
+from __future__ import annotations
+
 import argparse
 import atexit
 import os
+import queue
 import subprocess
 import sys
 import time
 import warnings
-from dataclasses import dataclass
+from concurrent.futures import Future, ThreadPoolExecutor
 from subprocess import PIPE, STDOUT, Popen
-from typing import Optional
 
+from android_tester import aio, snapshot
 from android_tester.common import (
     Device,
-    exec_cmd,
     get_all_emulators,
-    get_live_devices,
+    run_cmd,
     shutdown_all_running_emulators,
 )
-from android_tester.env import APP_PACKAGE_NAME, APP_PACKAGE_TEST_NAME, PROJECT_ROOT
+from android_tester.device_watcher import get_registry
+from android_tester.emulator import EMULATOR_TYPE, RunningDevice, ensure_installed
+from android_tester.emulator_pool import EmulatorPool, shard_args
+from android_tester.env import (
+    APP_PACKAGE_NAME,
+    APP_PACKAGE_TEST_NAME,
+    PROJECT_ROOT,
+    device_output_root,
+)
+from android_tester.gradle import GradleRun, build_once, run_gradle
+from android_tester.host import plan_emulators
+from android_tester.junit import clear_junit_xml, find_junit_xml, merge_junit_xml
+from android_tester.logcat import LogcatCapture
+from android_tester.logpump import LogPump
+from android_tester.options import create_argparser
+from android_tester.packages import PACKAGES, uninstall_all, uninstall_matching
+from android_tester.report import RUN, Phase, get_report, phase, start_report
+from android_tester.reuse import try_reuse
+from android_tester.scheduler import (
+    DeviceResult,
+    device_output_dir,
+    print_results,
+    run_on_devices,
+)
+from android_tester.sdk import find_adb
+from android_tester.session import run_batches
 
 os.environ["ANDROID_EMULATOR_WAIT_TIME_BEFORE_KILL"] = "0"
 
@@ -39,197 +66,243 @@ r"""
 
   """
 
-# Untested new stuff
-# EMULATOR_TYPE = "system-images;android-33;google_apis;x86_64"  # "sdkmanager --list | grep system-images"
-#EMULATOR_TYPE = "system-images;android-31;google_apis;x86_64"  # "sdkmanager --list | grep system-images"
-EMULATOR_TYPE = "system-images;android-30;google_apis_playstore;x86_64"  # "sdkmanager --list | grep system-images"
 # LAUNCH_CMD = f"echo no | emulator -avd test -no-window -gpu swiftshader_indirect -no-snapshot -noaudio -no-boot-anim -accel off"
+# bringup_emulator() sizes -cores, -memory, -gpu and -accel to the host, see host.plan_emulators
 LAUNCH_CMD = "echo no | emulator -avd test -no-window -gpu swiftshader_indirect -no-snapshot -noaudio -no-boot-anim"
 
 
-@dataclass
-class RunningDevice:
-    """Represents a fully booted emulator device ready for testing"""
-
-    def __init__(self, device, process: subprocess.Popen):
-        self.device = device
-        self.process = process
-
-    def __repr__(self):
-        return f"RunningDevice(device={self.device}, process={self.process})"
-
-    def kill(self):
-        if self.process is not None:
-            self.process.kill()
-            self.process = None
-            exec_cmd(f"adb -s {self.device.serial} emu kill")
-
-            timeout = 60  # Timeout value in seconds
-            elapsed_time = 0
-
-            while self.is_emulator_running() and elapsed_time < timeout:
-                print("Waiting for emulator to shut down...")
-                time.sleep(1)
-                elapsed_time += 1
-
-            if elapsed_time >= timeout:
-                print("Timeout reached, emulator may still be running.")
-            else:
-                print("Emulator is shut down")
-
-    def is_emulator_running(self):
-        result = os.system(f"adb -s {self.device.serial} shell true 2>/dev/null")
-        return result == 0
-
-    def wait_for_device_bootup(self, timeout=60) -> None:
-        """Waits for the device to complete its booting process, or until timeout"""
-
-        boot_completed = False
-        timeout_time = time.time() + timeout
-        while not boot_completed and time.time() < timeout_time:
-            cmd = f"adb -s {self.device.serial} shell getprop sys.boot_completed"
-            print(f"Running: {cmd}")
-            completed_process: subprocess.CompletedProcess = subprocess.run(
-                cmd,
-                shell=True,
-                timeout=60,
-                universal_newlines=True,
-                capture_output=True,
-                check=False,
-            )
-            output = completed_process.stdout.strip()
-            boot_completed = output == "1"
-
-            if not boot_completed:
-                print("Waiting for device to boot up...")
-                time.sleep(0.5)  # wait for 1/2 a second before the next check
-
-        if boot_completed:
-            wait_time_after_boot = 5
-            print(
-                f"Device has booted up, waiting {wait_time_after_boot} seconds before allow commands to be sent."
-            )
-            time.sleep(wait_time_after_boot)
-        else:
-            print("Timeout reached, device may still be booting.")
+def first_avd(api: int | None = None) -> str:
+    emulators = get_all_emulators(api=api)
+    assert len(emulators) > 0
+    print(f"Found {len(emulators)} emulators")
+    return emulators[0]
 
-    def __enter__(self):
-        return self
 
-    def __exit__(self, exc_type, exc_value, traceback):
-        self.kill()
+def spawn_emulator(
+    argv: list[str], avd_name: str, keep: bool
+) -> tuple[Popen | None, LogPump | None]:
+    """Bring up an Android emulator, its output pumped into a log file unless it is kept"""
+    log_path = os.path.join(device_output_root(), "logs", f"emulator-{avd_name}.log")
+    try:
+        if keep:
+            os.makedirs(os.path.dirname(log_path), exist_ok=True)
+            with open(log_path, mode="wb") as log:
+                kept = Popen(  # pylint: disable=consider-using-with
+                    argv,
+                    stdin=subprocess.DEVNULL,
+                    stdout=log,
+                    stderr=STDOUT,
+                    start_new_session=True,
+                )
+                return kept, None
+        # process = Popen(["emulator", "-avd", AVD_NAME, "-no-snapshot-load", "-no-snapshot-save"], stdout=PIPE, stderr=STDOUT)
+        # pylint: disable-next=consider-using-with
+        process = Popen(argv, stdout=PIPE, stderr=STDOUT)
+        # Nothing else reads the pipe, the emulator stalls once it is full.
+        return process, LogPump.attach(
+            process, f"emulator-{avd_name}", log_path=log_path
+        )
+    except Exception as e:
+        print(f"Error starting emulator: {e}")
+        return None, None
 
-    @property
-    def serial(self) -> str:
-        return self.device.serial
 
-def ensure_installed() -> None:
-    """Ensure the emulator is installed"""
-    exec_cmd("yes | sdkmanager --licenses")
-    exec_cmd('sdkmanager --install "build-tools;33.0.2" platform-tools')
-    exec_cmd("sdkmanager --install emulator --channel=0")
-    exec_cmd(f'sdkmanager --install "{EMULATOR_TYPE}" --channel=0')
+def bringup_emulator(
+    api: int | None = None, use_snapshot: bool = True, keep: bool = False
+) -> RunningDevice:
+    """Install emulator.
 
-def bringup_emulator(api: Optional[int] = None) -> RunningDevice:
-    """Install emulator"""
+    With use_snapshot the emulator boots from the clean quickboot snapshot when it is valid,
+    otherwise it cold boots and the clean snapshot is saved once the device is ready. A kept
+    emulator (keep) outlives this process: it runs in its own session and logs to a file
+    instead of a pipe, the next run reuses it (see reuse)."""
     ensure_installed()
-    def bringup(avd_name: str) -> Optional[Popen]:
-        """Bring up an Android emulator"""
-        try:
-            # process = Popen(["emulator", "-avd", AVD_NAME, "-no-snapshot-load", "-no-snapshot-save"], stdout=PIPE, stderr=STDOUT)
-            process = Popen(  # pylint: disable=consider-using-with
-                [
-                    "emulator",
-                    "-avd",
-                    avd_name,
-                    "-no-snapshot-load",
-                    "-no-snapshot-save",
-                ],
-                stdout=PIPE,
-                stderr=STDOUT,
-            )
-            return process
-        except Exception as e:
-            print(f"Error starting emulator: {e}")
-            return None
-
-    def get_first_live_device() -> Optional[Device]:
-        """Get the first live device"""
-        for _ in range(20):
-            for device in get_live_devices():
-                print(device)
-                if device.emulator:
-                    return device
-        return None
-
-    found_device: Optional[Device] = get_first_live_device()
-
-    if found_device is None:
-        emulators = get_all_emulators(api=api)
-        assert len(emulators) > 0
-        print(f"Found {len(emulators)} emulators")
-        emu = emulators[0]
-        proc = bringup(emu)
-        time.sleep(10)
-        print(proc)
-        timeout_time = time.time() + 60
-        while time.time() < timeout_time:
-            found_device = get_first_live_device()
-            if found_device is not None:
-                break
-            time.sleep(1)
+    registry = get_registry()
+    # Emulators already running are not ours (reuse decides about those), wait for the new one.
+    running = {device.serial for device in registry.devices() if device.emulator}
+
+    def is_new_emulator(device: Device) -> bool:
+        return device.emulator and device.serial not in running
+
+    avd_name = first_avd(api)
+    warm = use_snapshot and snapshot.has_valid_snapshot(avd_name, EMULATOR_TYPE)
+    # Cores, memory, gpu and acceleration sized to the host.
+    plan = plan_emulators(1)
+    get_report().set_host(plan.to_dict())
+    print(f"{'Warm' if warm else 'Cold'} booting {avd_name} ({plan.summary()})")
+    launch_time = time.monotonic()
+    proc, log_pump = spawn_emulator(
+        ["emulator", "-avd", avd_name]
+        + snapshot.emulator_args(warm)
+        + plan.emulator_args(),
+        avd_name,
+        keep,
+    )
+    print(proc)
+    # Reacts as soon as adb reports the emulator instead of polling.
+    found_device: Device | None = registry.wait_for(is_new_emulator, timeout=70)
+    get_report().add(
+        Phase(
+            "avd_boot",
+            found_device.serial if found_device is not None else avd_name,
+            launch_time,
+            time.monotonic(),
+            ok=found_device is not None,
+            detail="warm" if warm else "cold",
+        )
+    )
 
     assert found_device is not None
-    serial = found_device.serial if found_device is not None else ""
-    atexit.register(lambda: os.system(f"adb -s {serial} emu kill"))
-
     print("-------> Waiting for device....")
-    result = subprocess.run(  # ruff: noqa: F841
-        f"adb -s {found_device.serial} wait-for-device",
-        shell=True,
-        timeout=60,
-        universal_newlines=True,
-        check=False,
-    )
     assert proc is not None
-    running_device = RunningDevice(found_device, proc)
-    atexit.register(running_device.kill)
-    running_device.wait_for_device_bootup()
-    if result.returncode != 0:
-        warnings.warn(f"Error: {result.stderr}")
+    running_device = RunningDevice(found_device, proc, log_pump, keep=keep)
+    if not keep:
+        atexit.register(
+            lambda: run_cmd(
+                ["adb", "-s", running_device.serial, "emu", "kill"], timeout=30
+            )
+        )
+        atexit.register(running_device.kill)
+    if not running_device.wait_for_device_bootup():
+        warnings.warn(f"{running_device.serial} did not become ready")
+    snapshot.record_boot_time(avd_name, warm, time.monotonic() - launch_time)
+    if use_snapshot and not warm:
+        # Bake the stay awake settings into the clean snapshot.
+        stay_awake([found_device])
+        snapshot.save_snapshot(found_device.serial, avd_name, EMULATOR_TYPE)
     return running_device
 
 
-def create_argparser() -> argparse.ArgumentParser:
-    parser = argparse.ArgumentParser(description="Run Android tests")
-    parser.add_argument(
-        "-a",
-        "--api",
-        help="API Level",
-        type=int,
-        default=33,
-        choices=[28, 29, 30, 31, 32, 33],
-    )
-    return parser
+def acquire_emulator(
+    api: int,
+    use_snapshot: bool = True,
+    reuse: bool = False,
+    reset_snapshot: bool = False,
+    prefer: str | None = None,
+) -> RunningDevice:
+    """A clean emulator for the run: the running emulators are shut down and one is booted that
+    dies with the run.
+
+    With reuse a healthy running emulator (prefer first) is reset (see reuse) and used instead,
+    and a newly booted one is kept running after the run for the next one."""
+    if reuse:
+        device = try_reuse(
+            api, EMULATOR_TYPE, reset_snapshot=reset_snapshot, prefer=prefer
+        )
+        if device is not None:
+            return RunningDevice(device, None, keep=True)
+    shutdown_all_running_emulators()
+    if not get_registry().wait_gone(lambda device: device.emulator, timeout=60):
+        print("Emulators are still shutting down")
+    return bringup_emulator(api=api, use_snapshot=use_snapshot, keep=reuse)
+
+
+class EmulatorKeeper:
+    """Keeps the emulator of bringup_emulator() booted between runs (the daemon's), so the
+    next run reuses it instead of booting again"""
+
+    def __init__(self) -> None:
+        self.running: RunningDevice | None = None
+        self.api: int | None = None
+        self.boots = 0
+        self.reuses = 0
+
+    def alive(self, api: int) -> bool:
+        """True when the kept emulator runs this API level and still answers, otherwise it is killed"""
+        if self.running is None:
+            return False
+        process = self.running.process
+        if (
+            self.api == api
+            and not self.running.stopped
+            and (process is None or process.poll() is None)
+            and self.running.is_emulator_running()
+        ):
+            return True
+        self.release()
+        return False
+
+    def get(
+        self, api: int, use_snapshot: bool = True, reset_snapshot: bool = False
+    ) -> RunningDevice:
+        """The kept emulator goes through the health check and reset of reuse like any other"""
+        kept = self.running if self.alive(api) else None
+        self.running = None
+        running = acquire_emulator(
+            api,
+            use_snapshot=use_snapshot,
+            reuse=True,
+            reset_snapshot=reset_snapshot,
+            prefer=kept.serial if kept else None,
+        )
+        if kept is not None and running.process is None:
+            if running.serial == kept.serial:
+                print(f"Reusing emulator {kept.serial}")
+                self.running = kept
+                self.reuses += 1
+                return kept
+            kept.kill()  # failed the health check, another emulator was reused
+        # Otherwise booting shut the kept emulator down with all the others.
+        self.running = running
+        self.running.keep = True  # until release()
+        self.api = api
+        if self.running.process is None:
+            self.reuses += 1  # a healthy emulator was already running
+        else:
+            self.boots += 1
+        return self.running
+
+    def release(self) -> None:
+        if self.running is not None:
+            self.running.kill()
+            self.running = None
 
 
 def has_physical_device() -> bool:
     """Check if there is a physical device connected"""
-    result = os.system("adb shell true 2>/dev/null")
-    return result == 0
+    try:
+        return run_cmd(["adb", "shell", "true"], timeout=10).returncode == 0
+    except subprocess.TimeoutExpired:
+        return False
 
 
 def get_physical_devices() -> list[Device]:
     """Get the list of physical devices"""
     devices = []
-    for device in get_live_devices():
+    for device in get_registry().devices():
         if not device.emulator:
             devices.append(device)
     return devices
 
 
-def run_connected_test(running_device: RunningDevice | Device) -> None:
-    """Run connected tests"""
+GRADLE_INIT_SCRIPT = """
+// Generated by android_tester: isolates the build dir so devices can build concurrently.
+allprojects {{
+    layout.buildDirectory.set(new File("{build_dir}", project.name))
+}}
+"""
+
+
+def write_gradle_init_script(output_dir: str) -> str:
+    """Writes an init script redirecting every project's build dir into output_dir"""
+    build_dir = os.path.join(output_dir, "build").replace("\\", "/")
+    path = os.path.join(output_dir, "init.gradle")
+    with open(path, encoding="utf-8", mode="w") as file:
+        file.write(GRADLE_INIT_SCRIPT.format(build_dir=build_dir))
+    return path
+
+
+def run_connected_test(
+    running_device: RunningDevice | Device,
+    output_dir: str | None = None,
+    gradle_args: list[str] | None = None,
+    gradle_runs: list[GradleRun] | None = None,
+) -> int:
+    """Run connected tests, returns the gradle exit code.
+
+    When output_dir is given the gradle build dir and log are isolated there so several
+    devices can be tested at the same time, the project cache dir stays shared. The timing of the gradle
+    invocation is appended to gradle_runs."""
     # note that RunningDevice means we have a live emulator running.
     # 80 columns of #
     print()
@@ -239,9 +312,8 @@ def run_connected_test(running_device: RunningDevice | Device) -> None:
         print(f'# Running on "{running_device.device.serial}"')
         print("#" * 80)
         print()
-        install_packages = running_device.device.list_packages(APP_PACKAGE_NAME)
-        for package in install_packages:
-            running_device.device.uninstall(package)
+        with phase("uninstall", running_device.serial):
+            uninstall_matching([running_device.serial], APP_PACKAGE_NAME)
     if isinstance(running_device, Device):
         print("#" * 80)
         # fill # around the text
@@ -255,82 +327,305 @@ def run_connected_test(running_device: RunningDevice | Device) -> None:
     env = os.environ.copy()
     env["ANDROID_SERIAL"] = running_device.serial
     task = "connectedCheck"
-    exec_cmd(f"gradle {task}", ignore_errors=True, cwd=PROJECT_ROOT, env=env)
+    # The app log of every test ends up in <output dir>/logcat.
+    with LogcatCapture(
+        running_device.serial, output_dir or device_output_dir(running_device.serial)
+    ):
+        if output_dir is None:
+            gradle_run = run_gradle(
+                [task], cwd=PROJECT_ROOT, env=env, extra_args=gradle_args, echo=True
+            )
+        else:
+            gradle_run = run_gradle(
+                [task],
+                cwd=PROJECT_ROOT,
+                env=env,
+                log_path=os.path.join(output_dir, "gradle.log"),
+                name=f"gradle-{running_device.serial}",
+                init_script=write_gradle_init_script(output_dir),
+                extra_args=gradle_args,
+            )
+    PACKAGES.invalidate(
+        running_device.serial
+    )  # connectedCheck installed and uninstalled the APKs
+    get_report().add(
+        Phase(
+            "test",
+            running_device.serial,
+            gradle_run.start,
+            gradle_run.end,
+            ok=gradle_run.ok,
+            detail=gradle_run.summary(),
+        )
+    )
+    if gradle_runs is not None:
+        gradle_runs.append(gradle_run)
+    return gradle_run.returncode
 
 
 def bringup_emulator_and_run(api: int) -> None:
     running_device: RunningDevice = bringup_emulator(api=api)
     with running_device:
         print("Listing all devices: emulator -list-avds")
-        os.system("emulator -list-avds")
+        print("\n".join(get_all_emulators()))
         run_connected_test(running_device)
 
 
-def physical_device_run(device: Device) -> None:
+def physical_device_run(
+    device: Device,
+    output_dir: str | None = None,
+    gradle_runs: list[GradleRun] | None = None,
+) -> int:
     # remove previous tests
-    device.uninstall(APP_PACKAGE_NAME, ignore_errors=True)
-    device.uninstall(APP_PACKAGE_TEST_NAME, ignore_errors=True)
-    run_connected_test(device)
+    with phase("uninstall", device.serial):
+        # Not installed is fine, both go in a single round trip.
+        aio.run_sync(
+            uninstall_all(device.serial, [APP_PACKAGE_NAME, APP_PACKAGE_TEST_NAME])
+        )
+    return run_connected_test(device, output_dir=output_dir, gradle_runs=gradle_runs)
+
+
+def run_all_devices(
+    devices: list[RunningDevice | Device],
+    max_parallel: int | None = None,
+    output_root: str | None = None,
+) -> list[DeviceResult]:
+    """Runs the connected tests on all devices concurrently, each with its own build dir and log"""
+    gradle_runs: dict[str, list[GradleRun]] = {device.serial: [] for device in devices}
+
+    def job(device: RunningDevice | Device) -> int:
+        output_dir = device_output_dir(device.serial, root=output_root)
+        clear_junit_xml(output_dir)
+        if isinstance(device, Device):
+            return physical_device_run(
+                device, output_dir=output_dir, gradle_runs=gradle_runs[device.serial]
+            )
+        return run_connected_test(
+            device, output_dir=output_dir, gradle_runs=gradle_runs[device.serial]
+        )
 
+    results = run_on_devices(devices, job, max_parallel=max_parallel)
+    for result in results:
+        output_dir = device_output_dir(result.serial, root=output_root)
+        result.log_path = os.path.join(output_dir, "gradle.log")
+        add_gradle_timing(result, gradle_runs[result.serial])
+    print_results(results)
+    return results
 
-def stay_awake(devices: list[Device]) -> None:
-    """Stay awake"""
-    for device in devices:
-        cmd_stay_awake_while_plugged_in = f"adb -s {device.serial} shell settings put global stay_on_while_plugged_in 3"
-        cmd_screen_timeout = f"adb -s {device.serial} shell settings put system screen_off_timeout 2147483647"
-        cmd_disable_lockscreen = (
-            f"adb -s {device.serial} shell settings put secure lockscreen.disabled 1"
+
+def add_gradle_timing(result: DeviceResult, gradle_runs: list[GradleRun]) -> None:
+    """Records the configuration and execution time of the device's gradle run"""
+    if gradle_runs:
+        result.extra["configuration_time"] = sum(
+            gradle_run.configuration_time for gradle_run in gradle_runs
+        )
+        result.extra["execution_time"] = sum(
+            gradle_run.execution_time for gradle_run in gradle_runs
+        )
+
+
+def start_build() -> Future[GradleRun]:
+    """Builds the APKs once in the background, while the devices are being prepared"""
+    log_path = os.path.join(device_output_root(), "gradle-build.log")
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="build")
+    try:
+        return executor.submit(build_once, log_path=log_path)
+    finally:
+        executor.shutdown(
+            wait=False
+        )  # the build still runs, the thread exits once it is done
+
+
+def wait_for_build(build: Future[GradleRun]) -> None:
+    build_run = build.result()
+    get_report().add(
+        Phase(
+            "build",
+            RUN,
+            build_run.start,
+            build_run.end,
+            ok=build_run.ok,
+            detail=build_run.summary(),
         )
-        for cmd in [
-            cmd_stay_awake_while_plugged_in,
-            cmd_screen_timeout,
-            cmd_disable_lockscreen,
-        ]:
-            print(f"Running: {cmd}")
-            completed_process: subprocess.CompletedProcess = subprocess.run(
-                cmd,
-                shell=True,
-                timeout=60,
-                universal_newlines=True,
-                capture_output=True,
-                check=False,
+    )
+    if not build_run.ok:
+        raise RuntimeError(f"Build failed, see {build_run.log_path}")
+
+
+STAY_AWAKE_SETTINGS = [
+    "settings put global stay_on_while_plugged_in 3",
+    "settings put system screen_off_timeout 2147483647",
+    "settings put secure lockscreen.disabled 1",
+]
+
+
+def stay_awake(devices: list[Device]) -> None:
+    """Stay awake, all devices are configured at the same time in one shell round trip each"""
+    results = run_batches({device.serial: STAY_AWAKE_SETTINGS for device in devices})
+    for serial, outputs in results.items():
+        for cmd, (rtn, output) in zip(STAY_AWAKE_SETTINGS, outputs):
+            print(f"{serial}: {cmd}")
+            if 0 != rtn:
+                print(f"Error: {output.strip()}")
+
+
+def run_sharded_tests(
+    running_devices: list[RunningDevice],
+    output_root: str | None = None,
+    merged_xml: str | None = None,
+    num_shards: int | None = None,
+) -> list[DeviceResult]:
+    """Runs num_shards shards of connectedCheck (default: one per device) and merges the JUnit XML.
+
+    With more shards than devices a device takes the next waiting shard when it is done.
+    """
+    num_shards = num_shards or len(running_devices)
+    shards: queue.Queue[int] = queue.Queue()
+    for index in range(num_shards):
+        shards.put(index)
+    gradle_runs: dict[str, list[GradleRun]] = {
+        device.serial: [] for device in running_devices
+    }
+
+    def job(device: RunningDevice) -> int:
+        returncode = 0
+        clear_junit_xml(device_output_dir(device.serial, root=output_root))
+        while True:
+            try:
+                index = shards.get_nowait()
+            except queue.Empty:
+                return returncode
+            output_dir = device_output_dir(device.serial, root=output_root)
+            if num_shards > len(running_devices):
+                output_dir = device_output_dir(f"shard-{index}", root=output_dir)
+            args = shard_args(num_shards, index)
+            returncode = (
+                run_connected_test(
+                    device,
+                    output_dir=output_dir,
+                    gradle_args=args,
+                    gradle_runs=gradle_runs[device.serial],
+                )
+                or returncode
             )
-            if 0 != completed_process.returncode:
-                print(f"Error: {completed_process.stderr}")
-            output = completed_process.stdout.strip()
-            print(output)
+
+    results = run_on_devices(running_devices, job)
+    xml_files: list[str] = []
+    for result in results:
+        output_dir = device_output_dir(result.serial, root=output_root)
+        # Queued shards each have their own directory (and gradle.log) below the device's.
+        result.log_path = (
+            os.path.join(output_dir, "gradle.log")
+            if num_shards <= len(running_devices)
+            else output_dir
+        )
+        add_gradle_timing(result, gradle_runs[result.serial])
+        xml_files.extend(find_junit_xml(output_dir))
+    print_results(results)
+    merged_xml = merged_xml or os.path.join(
+        output_root or device_output_root(), "TEST-merged.xml"
+    )
+    merged = merge_junit_xml(xml_files, merged_xml)
+    print(
+        f"Merged {len(xml_files)} JUnit files ({merged.get('tests')} tests, "
+        f"{merged.get('failures')} failures) into {merged_xml}"
+    )
+    return results
 
 
-def run() -> None:
+def run(
+    args: argparse.Namespace | None = None, keeper: EmulatorKeeper | None = None
+) -> list[DeviceResult]:
+    """Runs the tests. With a keeper the emulator stays up after the run and is reused by the next one."""
     os.chdir(PROJECT_ROOT)
-    args = create_argparser().parse_args()
-    shutdown_all_running_emulators()
+    args = args or create_argparser().parse_args()
+    # Emulators are only reused (see reuse) when asked for or by the daemon, never by a pool.
+    if not (args.reuse_emulator or keeper is not None) or args.emulators > 1:
+        if keeper is not None:
+            keeper.release()
+        shutdown_all_running_emulators()
+    build = start_build()
+
+    def run_tests(
+        devices: list[RunningDevice | Device],
+        shard: bool = False,
+        num_shards: int | None = None,
+    ) -> list[DeviceResult]:
+        wait_for_build(build)
+        # pylint: disable=import-outside-toplevel
+        from android_tester.retry import retry_failures
+
+        if args.direct:
+            from android_tester.instrument import run_direct
+
+            results = run_direct(devices, max_parallel=args.max_parallel, shard=shard)
+        elif shard:
+            results = run_sharded_tests(devices, num_shards=num_shards)  # type: ignore
+        else:
+            results = run_all_devices(devices, max_parallel=args.max_parallel)
+        # Only the failed tests run again, on the devices still at hand.
+        retry_failures(results, devices, retries=args.retries)
+        return results
+
     physical_devices = get_physical_devices()
     if not physical_devices:
+        if args.emulators > 1:
+            print(
+                f"No physical devices found, running on a pool of {args.emulators} emulators"
+            )
+            with EmulatorPool(
+                args.emulators, api=args.api, use_snapshot=not args.no_snapshot
+            ) as pool:
+                return run_tests(
+                    list(pool.running_devices), shard=True, num_shards=args.emulators
+                )
         print("No physical devices found, running on emulator")
-        bringup_emulator_and_run(api=args.api)
-    else:
-        print("Physical devices found, running on physical device(s)")
-        stay_awake(
-            physical_devices,
+        if keeper is not None:
+            return run_tests(
+                [
+                    keeper.get(
+                        args.api,
+                        use_snapshot=not args.no_snapshot,
+                        reset_snapshot=args.reset_snapshot,
+                    )
+                ]
+            )
+        running_device = acquire_emulator(
+            args.api,
+            use_snapshot=not args.no_snapshot,
+            reuse=args.reuse_emulator,
+            reset_snapshot=args.reset_snapshot,
         )
-        for device in physical_devices:
-            physical_device_run(device)
+        with running_device:
+            return run_tests([running_device])
+    print("Physical devices found, running on physical device(s)")
+    stay_awake(
+        physical_devices,
+    )
+    return run_tests(list(physical_devices))
 
 
-def main() -> int:
+def main(
+    args: argparse.Namespace | None = None, keeper: EmulatorKeeper | None = None
+) -> int:
+    args = args or create_argparser().parse_args()
+    find_adb()
+    report = start_report()
     try:
-        start = time.time()
-        run()
-        end = time.time()
-        print(f"Total time: {end - start:.2f} seconds")
-        return 0
+        results = run(args, keeper=keeper)
+        report.add_results(results)
+        return 0 if all(result.ok for result in results) else 1
     except KeyboardInterrupt:
         print("\nExiting...")
         return 1
     except Exception as e:
         print(f"Error: {e}")
         return 1
+    finally:
+        report.finish()
+        print(report.summary_table())
+        paths = report.write(args.report_dir or device_output_root())
+        print(f"Report: {paths['json']}, JUnit: {paths['junit']}")
 
 
 if __name__ == "__main__":
@@ -1,14 +1,16 @@
 import os
+import sys
 
-from android_tester.common import exec_cmd
 from android_tester.env import PROJECT_ROOT
+from android_tester.gradle import run_gradle
 
 
-def main():
+def main() -> int:
     os.chdir(PROJECT_ROOT)
-    exec_cmd("gradle assembleDebugUnitTest")
-    exec_cmd("gradle assembleDebug")
+    # One invocation: the daemon, configuration and build caches are shared by both tasks.
+    run = run_gradle(["assembleDebugUnitTest", "assembleDebug"], echo=True)
+    return run.returncode
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -1,31 +1,190 @@
 """
 Main entry point.
+
+Only argparse and env are imported at startup so `--help` stays fast; a command imports
+what it runs once its arguments are parsed, and only then looks for the Android SDK
+(sdk.find_adb, cached on disk).
+
+When the resident daemon is running (`android-tester daemon start`, see daemon.py) the
+test, build, install and uninstall commands run in it, reusing its devices and emulator.
 """
 
+from __future__ import annotations
+
 import argparse
-import shutil
+import os
 import sys
 
-from android_tester.android_tests import main
+# collections.abc, not typing: typing costs more to import than the rest.
+from collections.abc import Callable
+
+from android_tester.env import APP_PACKAGE_NAME, NO_DAEMON_ENV, daemon_socket_path
+from android_tester.options import create_argparser
+
+
+def forward(command: str, argv: list[str]) -> int | None:
+    """Runs the command in the daemon when one is running, returns its exit code (None otherwise)"""
+    if os.environ.get(NO_DAEMON_ENV) or not os.path.exists(daemon_socket_path()):
+        return None
+    # pylint: disable=import-outside-toplevel
+    from android_tester import daemon
+
+    return daemon.request(command, argv)
+
+
+def run_tests(argv: list[str]) -> int:
+    args = create_argparser().parse_args(argv)
+    returncode = forward("test", argv)
+    if returncode is not None:
+        return returncode
+    # pylint: disable=import-outside-toplevel
+    from android_tester.android_tests import main as tests_main
+
+    return tests_main(args)
+
+
+def run_build(argv: list[str]) -> int:
+    argparse.ArgumentParser(
+        prog="android-tester build", description="Build the debug APKs and unit tests"
+    ).parse_args(argv)
+    returncode = forward("build", argv)
+    if returncode is not None:
+        return returncode
+    # pylint: disable=import-outside-toplevel
+    from android_tester.build import main as build_main
+
+    return build_main()
+
+
+def run_install(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="android-tester install",
+        description="Install the release APK and start it",
+    )
+    parser.add_argument(
+        "--serial",
+        default=None,
+        help="Device to install on, required when several are connected",
+    )
+    args = parser.parse_args(argv)
+    returncode = forward("install", argv)
+    if returncode is not None:
+        return returncode
+    # pylint: disable=import-outside-toplevel
+    from android_tester.installrelease import install_release
+    from android_tester.sdk import find_adb
+
+    find_adb()
+    return install_release(args.serial)
+
+
+def run_uninstall(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="android-tester uninstall",
+        description="Uninstall the matching packages from every device",
+    )
+    parser.add_argument(
+        "pattern",
+        nargs="?",
+        default=APP_PACKAGE_NAME,
+        help=f"Package prefix or glob pattern (default: {APP_PACKAGE_NAME})",
+    )
+    args = parser.parse_args(argv)
+    returncode = forward("uninstall", argv)
+    if returncode is not None:
+        return returncode
+    # pylint: disable=import-outside-toplevel
+    from android_tester.device_watcher import get_registry
+    from android_tester.packages import uninstall_matching
+    from android_tester.sdk import find_adb
+
+    find_adb()
+    serials = [device.serial for device in get_registry().devices(online_only=True)]
+    if not serials:
+        print("No devices found.")
+        return 1
+    removed = uninstall_matching(serials, args.pattern)
+    return 0 if any(removed.values()) else 1
+
+
+def run_devices(argv: list[str]) -> int:
+    # pylint: disable=import-outside-toplevel
+    from android_tester.show_devices import main as devices_main
+
+    return devices_main(argv, prog="android-tester devices")
+
+
+def run_flakes(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="android-tester flakes", description="Flaky test history and quarantine"
+    )
+    parser.add_argument(
+        "--all",
+        action="store_true",
+        help="List every test, not only those that failed or were flaky",
+    )
+    parser.add_argument(
+        "--release",
+        metavar="TEST",
+        action="append",
+        default=[],
+        help="Take Class#method out of quarantine",
+    )
+    args = parser.parse_args(argv)
+    # pylint: disable=import-outside-toplevel
+    from android_tester.flakes import FlakeStore
+
+    with FlakeStore() as store:
+        for test in args.release:
+            print(
+                f"Released {test}"
+                if store.release(test)
+                else f"{test} is not quarantined"
+            )
+        if args.release:
+            return 0
+        histories = store.histories(flaky_only=not args.all)
+        for history in histories:
+            print(history.format())
+        if not histories:
+            print("No flaky tests")
+        quarantined = store.quarantined()
+        for test, reason in quarantined.items():
+            print(f"Quarantined: {test} ({reason})")
+    return 0
+
+
+def run_daemon(argv: list[str]) -> int:
+    # pylint: disable=import-outside-toplevel
+    from android_tester.daemon import main as daemon_main
+
+    return daemon_main(argv, prog="android-tester daemon", commands=COMMANDS)
+
+
+COMMANDS: dict[str, Callable[[list[str]], int]] = {
+    "test": run_tests,
+    "build": run_build,
+    "install": run_install,
+    "uninstall": run_uninstall,
+    "devices": run_devices,
+    "flakes": run_flakes,
+    "daemon": run_daemon,
+}
 
-if shutil.which("adb") is None:
-    try:
-        # Attempt to reload the environment.
-        from setenvironment import reload_environment
 
-        reload_environment()
-        if shutil.which("adb") is None:
-            raise RuntimeError("Android SDK not found.")
-    except ImportError:
-        pass
+def main(argv: list[str] | None = None) -> int:
+    """Main entry point, `android-tester [options]` without a command runs the tests."""
+    argv = sys.argv[1:] if argv is None else argv
+    if "--no-daemon" in argv:
+        argv = [arg for arg in argv if arg != "--no-daemon"]
+        os.environ[NO_DAEMON_ENV] = "1"
+    if argv and argv[0] in COMMANDS:
+        return COMMANDS[argv[0]](argv[1:])
+    return run_tests(argv)
 
 
-def this_main() -> int:
-    """Main entry point."""
-    parser = argparse.ArgumentParser()
-    _ = parser.parse_args()
-    return main()
+this_main = main
 
 
 if __name__ == "__main__":
-    sys.exit(this_main())
+    sys.exit(main())
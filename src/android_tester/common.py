@@ -4,24 +4,38 @@ Common functions shared between scripts. Linted.
 
 # flake8: noqa: E501
 
+from __future__ import annotations
 
+import asyncio
 import sys
 from dataclasses import dataclass
-from subprocess import call, check_output
-from typing import Optional
+from subprocess import CalledProcessError
+from typing import IO, Sequence
 
-from android_tester.env import PROJECT_ROOT
+from android_tester import aio, packages
+from android_tester.props import PROPS, DeviceProps, read_props
 
 
 def uninstall_apk(
     package_name: str, device_serial: str, ignore_errors: bool = False
 ) -> None:
     """Uninstalls the apk"""
-    exec_cmd(
-        f"adb -s {device_serial} uninstall {package_name}",
-        ignore_errors=ignore_errors,
-        timeout=60,
-    )
+    try:
+        aio.run_sync(
+            aio.uninstall_apk(package_name, device_serial, ignore_errors=ignore_errors)
+        )
+    except CalledProcessError as e:
+        print(f"Error uninstalling {package_name}")
+        sys.exit(e.returncode)
+
+
+def install_apk(apk: str, device_serial: str, streaming: bool = True) -> None:
+    """Installs (or replaces) the apk"""
+    try:
+        aio.run_sync(aio.install(device_serial, apk, streaming=streaming))
+    except CalledProcessError as e:
+        print(f"Error installing {apk}: {e.output}")
+        sys.exit(e.returncode)
 
 
 @dataclass
@@ -36,81 +50,94 @@ class Device:
     model: str
     device: str
     transport_id: str
+    api_level: int | None = None
+    abi: str = ""
+    boot_completed: bool = False
 
-    def list_packages(self, match_str: Optional[str] = None) -> list[str]:
+    def list_packages(self, match_str: str | None = None) -> list[str]:
         """Lists the packages on the device"""
-        cmd = f"adb -s {self.serial} shell pm list packages"
-        print(f"Running: {cmd}")
         try:
-            packages = check_output(cmd, universal_newlines=True, shell=True).strip()
-            package_list = packages.splitlines()
-
-            def remove_package_prefix(val):
-                if val.startswith("package:"):
-                    return val[8:]
-                return val
-
-            package_list = [remove_package_prefix(package) for package in package_list]
-            if match_str:
-                package_list = [
-                    package for package in package_list if match_str in package
-                ]
-            return package_list
+            return aio.run_sync(packages.list_packages(self.serial, match_str))
         except Exception as exc:
             print(f"Error listing packages: {exc}")
             return []
 
+    def find_packages(self, pattern: str) -> list[packages.PackageInfo]:
+        """Installed packages matching a prefix or glob pattern, from the package index"""
+        return aio.run_sync(packages.PACKAGES.find(self.serial, pattern))
+
     def uninstall(self, package_name: str, ignore_errors: bool = False) -> None:
         """Uninstalls the apk"""
-        exec_cmd(
-            f"adb -s {self.serial} uninstall {package_name}",
-            ignore_errors=ignore_errors,
-            timeout=60,
-        )
+        uninstall_apk(package_name, self.serial, ignore_errors=ignore_errors)
+
+    def install(self, apk: str) -> None:
+        """Installs the apk"""
+        install_apk(apk, self.serial)
 
 
-def exec_cmd(
-    cmd: str,
-    cwd: Optional[str] = None,
+def exec_cmd(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    cmd: str | Sequence[str],
+    cwd: str | None = None,
     ignore_errors=False,
-    timeout: Optional[float] = None,
+    timeout: float | None = None,
     env=None,
+    stdout: IO | None = None,
+    input: bytes | None = None,  # pylint: disable=redefined-builtin
 ) -> int:
-    """Executes a command"""
-    cwd = cwd or PROJECT_ROOT or None
-    print(f"Executing:\n  {cmd}\n  with cwd={cwd}")
-    rtn = call(cmd, cwd=cwd, shell=True, timeout=timeout, env=env)
-    if ignore_errors:
-        return rtn
-    if rtn != 0:
+    """Executes a command, stdout (if given) receives both stdout and stderr.
+
+    Never goes through a shell: a string is split into argv, pipes and redirections are not
+    interpreted. Feed input instead of piping into the command."""
+    argv = aio.split_cmd(cmd)
+    try:
+        return aio.run_sync(
+            aio.exec_cmd(
+                argv,
+                cwd=cwd,
+                ignore_errors=ignore_errors,
+                timeout=timeout,
+                env=env,
+                stdout=stdout,
+                input=input,
+            )
+        )
+    except CalledProcessError as e:
         print(f"Error executing command: {cmd}")
-        sys.exit(rtn)
-    return rtn
+        sys.exit(e.returncode)
 
 
-def get_emulator_name(serial_no: str) -> Optional[str]:
-    cmd = f"adb -s {serial_no} shell getprop ro.boot.qemu.avd_name"
-    print(f"Running: {cmd}")
-    try:
-        avd_name = check_output(cmd, universal_newlines=True, shell=True).strip()
-        return avd_name
-    except Exception:
+def run_cmd(
+    argv: Sequence[str],
+    timeout: float | None = 60,
+    input: bytes | None = None,  # pylint: disable=redefined-builtin
+    merge_stderr: bool = True,
+) -> aio.CommandResult:
+    """Runs argv and captures its output.
+
+    Raises subprocess.TimeoutExpired after killing it on timeout."""
+    return aio.run_sync(
+        aio.run(argv, timeout=timeout, input=input, merge_stderr=merge_stderr)
+    )
+
+
+def get_emulator_name(serial_no: str) -> str | None:
+    """AVD name from the cached property snapshot of the device"""
+    props = PROPS.get(serial_no)
+    if props is None:
         return None
+    return props.avd_name
 
 
 def query_adb_devices() -> list[str]:
     """Query adb devices, remove the header and empty lines"""
-    device_out = check_output("adb devices -l", universal_newlines=True, shell=True)
-    lines = device_out.splitlines()[1:]
-    lines = [line.strip() for line in lines]
-    lines = [line for line in lines if "List of devices attached" not in line]
-    lines = [line for line in lines if line]
-    return lines
+    return aio.run_sync(aio.query_adb_devices())
 
 
 def query_emulator_kill(serial_no: str) -> None:
-    """Query adb devices, remove the header and empty lines"""
-    check_output(f"adb -s {serial_no} emu kill", universal_newlines=True, shell=True)
+    """Asks the emulator to shut down, raises CalledProcessError on failure"""
+    result = run_cmd(["adb", "-s", serial_no, "emu", "kill"])
+    if result.returncode != 0:
+        raise CalledProcessError(result.returncode, result.argv, result.stdout)
 
 
 # def bringup_emulator() -> Optional[Popen]:
@@ -128,53 +155,82 @@ def query_emulator_kill(serial_no: str) -> None:
 #         return None
 
 
-def get_all_emulators(api: Optional[int] = None) -> list[str]:
-    data = check_output(
-        "emulator -list-avds", universal_newlines=True, shell=True
-    ).strip()
+def get_all_emulators(api: int | None = None) -> list[str]:
+    result = run_cmd(["emulator", "-list-avds"], merge_stderr=False)
+    if result.returncode != 0:
+        raise CalledProcessError(result.returncode, result.argv, result.stdout)
+    data = result.stdout.strip()
     lines = data.splitlines()
     if api is not None:
         lines = [line for line in lines if f"{api}" in line]
     return lines
 
 
-def get_live_devices() -> list[Device]:
-    """Get the active devices"""
-    device_infos: list[str] = query_adb_devices()
-    out: list[Device] = []
+def parse_device_line(
+    dinfo: str, avd_name: str = "unknown", props: DeviceProps | None = None
+) -> Device:
+    """Builds a Device from an `adb devices -l` line and optionally its properties"""
+    parts = dinfo.split()
+    is_emulator = "emulator" in dinfo
+    while len(parts) < 6:
+        parts.append("")
+
+    def val(part: str) -> str:
+        if ":" in part:
+            return part.split(":")[1]
+        return part
+
+    return Device(
+        name=avd_name,
+        online=parts[1],
+        serial=parts[0],
+        emulator=is_emulator,
+        product=val(parts[2]),
+        model=val(parts[3]),
+        device=val(parts[4]),
+        transport_id=val(parts[5]),
+        api_level=props.api_level if props is not None else None,
+        abi=props.abi if props is not None else "",
+        boot_completed=props.boot_completed if props is not None else False,
+    )
+
+
+async def query_live_devices(max_parallel: int = aio.MAX_DEVICES) -> list[Device]:
+    """Get the active devices, properties are fetched for all devices concurrently"""
+    device_infos = await aio.query_adb_devices()
+    semaphore = asyncio.Semaphore(max_parallel)
+
+    async def props_for(serial: str) -> DeviceProps | None:
+        cached = PROPS.cached(serial)
+        if cached is not None:
+            return cached
+        async with semaphore:
+            try:
+                return await read_props(serial)
+            except Exception as e:
+                print(f"Error reading properties of {serial}: {e}")
+                return None
+
+    online = [
+        parts[0] for parts in map(str.split, device_infos) if parts[1:2] == ["device"]
+    ]
+    all_props = dict(
+        zip(online, await asyncio.gather(*(props_for(serial) for serial in online)))
+    )
+    out = []
     for dinfo in device_infos:
         print(f"Device info: {dinfo}")
-        parts = dinfo.split()
-        print(f"Parts: {parts}")
-        is_emulator = "emulator" in dinfo
-        while len(parts) < 6:
-            parts.append("")
-
-        def val(part: str) -> str:
-            if ":" in part:
-                return part.split(":")[1]
-            return part
-
-        product = val(parts[2])
-        model = val(parts[3])
-        dev = val(parts[4])
-        tid = val(parts[5])
-        serial_no = parts[0]
-        avd_name = get_emulator_name(serial_no) or "unknown"
-        device = Device(
-            name=avd_name,
-            online=parts[1],
-            serial=serial_no,
-            emulator=is_emulator,
-            product=product,
-            model=model,
-            device=dev,
-            transport_id=tid,
-        )
-        out.append(device)
+        props = all_props.get(dinfo.split()[0])
+        avd_name = (props.avd_name if props is not None else "") or "unknown"
+        out.append(parse_device_line(dinfo, avd_name, props))
     return out
 
 
+def get_live_devices() -> list[Device]:
+    """Get the active devices"""
+    return aio.run_sync(query_live_devices())
+
+
 def shutdown_all_running_emulators():
     """Shut down all running emulators"""
     for device in get_live_devices():
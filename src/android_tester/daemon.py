@@ -0,0 +1,381 @@
+"""
+Resident daemon. `android-tester daemon start` runs it in the background on a Unix socket
+(<cache dir>/daemon.sock). While it runs, the commands are executed inside it instead of in
+a fresh process, so the device registry (adb track-devices), the property and package
+caches and the emulator booted by a test run stay warm across invocations: the next
+`android-tester test` reuses the emulator instead of shutting it down and booting again.
+
+Requests and replies are JSON lines: {"command": ..., "argv": [...], "env": {...}, "cwd": ...}
+in, {"output": text} while the command runs, then {"returncode": n}. Commands run one at a
+time, with the environment and working directory of the client that sent them.
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+from typing import IO, Any, Callable, Iterator, TextIO, cast
+
+from android_tester.env import NO_DAEMON_ENV, cache_dir, daemon_socket_path
+
+# Commands the daemon runs, `devices` stays in the client (it is a live view).
+COMMANDS = ["test", "build", "install", "uninstall"]
+
+Command = Callable[[list[str]], int]  # argv -> exit code
+
+
+def supported() -> bool:
+    return hasattr(socket, "AF_UNIX")
+
+
+def connect(path: str | None = None) -> socket.socket | None:
+    """Socket connected to the daemon, None when none is running"""
+    path = path or daemon_socket_path()
+    if not supported() or not os.path.exists(path):
+        return None
+    sock = socket.socket(
+        socket.AF_UNIX, socket.SOCK_STREAM
+    )  # pylint: disable=no-member
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+def request(
+    command: str,
+    argv: list[str] | None = None,
+    path: str | None = None,
+    out: IO[str] | None = None,
+) -> int | None:
+    """Runs the command in the daemon with its output written to out, returns the exit code.
+
+    None when no daemon is running."""
+    sock = connect(path)
+    if sock is None:
+        return None
+    out = out or sys.stdout
+    with sock, sock.makefile("rwb") as file:
+        message = {
+            "command": command,
+            "argv": argv or [],
+            "env": dict(os.environ),
+            "cwd": os.getcwd(),
+        }
+        file.write(json.dumps(message).encode("utf-8") + b"\n")
+        file.flush()
+        for line in file:
+            message = json.loads(line)
+            if "output" in message:
+                out.write(message["output"])
+                out.flush()
+            elif "returncode" in message:
+                return message["returncode"]
+    print("The daemon went away before the command finished")
+    return 1
+
+
+class ReplyWriter(io.TextIOBase):
+    """stdout of a command run by the daemon, forwarded to the client"""
+
+    def __init__(self, handler: RequestHandler) -> None:
+        super().__init__()
+        self.handler = handler
+        self.lock = threading.Lock()  # the test threads print concurrently
+
+    def write(self, text: str) -> int:  # type: ignore[override]
+        if text:
+            with self.lock:
+                self.handler.reply({"output": text})
+        return len(text)
+
+
+class CommandOutput(io.TextIOBase):
+    """sys.stdout and sys.stderr of the daemon, installed once by serve(). While a command runs
+    everything printed goes to its client (commands run one at a time, so whatever the test
+    threads print belongs to it), in between to the daemon log."""
+
+    def __init__(self, log: TextIO) -> None:
+        super().__init__()
+        self.log = log
+        self.target: io.TextIOBase | None = None
+
+    def write(self, text: str) -> int:  # type: ignore[override]
+        target = self.target
+        if target is not None:
+            return target.write(text)
+        return self.log.write(text)
+
+    def flush(self) -> None:
+        self.log.flush()
+
+    @contextlib.contextmanager
+    def to(self, out: io.TextIOBase) -> Iterator[None]:
+        self.target = out
+        try:
+            yield
+        finally:
+            self.target = None
+
+
+@contextlib.contextmanager
+def client_environment(env: dict[str, str] | None, cwd: str | None) -> Iterator[None]:
+    """os.environ and the working directory of the client while its command runs"""
+    saved_env, saved_cwd = dict(os.environ), os.getcwd()
+    try:
+        if env is not None:
+            os.environ.clear()
+            os.environ.update(env)
+            os.environ[NO_DAEMON_ENV] = (
+                "1"  # the command runs here, not forwarded back to us
+            )
+        if cwd is not None:
+            os.chdir(cwd)
+        yield
+    finally:
+        os.chdir(saved_cwd)
+        os.environ.clear()
+        os.environ.update(saved_env)
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """One client connection: a command in, its output and exit code out"""
+
+    server: DaemonServer
+
+    def handle(self) -> None:
+        try:
+            message = json.loads(self.rfile.readline())
+            command, argv = message["command"], list(message.get("argv", []))
+            env, cwd = message.get("env"), message.get("cwd")
+        except (ValueError, KeyError, TypeError):
+            return
+        if command == "status":
+            self.reply({"output": json.dumps(self.server.status(), indent=2) + "\n"})
+            self.reply({"returncode": 0})
+        elif command == "stop":
+            self.reply({"returncode": 0})
+            # shutdown() waits for serve_forever(), which is waiting for this handler.
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+        else:
+            self.reply(
+                {
+                    "returncode": self.server.execute(
+                        command, argv, ReplyWriter(self), env=env, cwd=cwd
+                    )
+                }
+            )
+
+    def reply(self, message: dict[str, Any]) -> None:
+        try:
+            self.wfile.write(json.dumps(message).encode("utf-8") + b"\n")
+            self.wfile.flush()
+        except OSError:
+            pass  # the client went away, the command still runs to the end
+
+
+class DaemonServer(
+    socketserver.ThreadingMixIn, socketserver.UnixStreamServer
+):  # pylint: disable=no-member
+    """Runs the commands of the clients, keeping devices, caches and the emulator between them"""
+
+    daemon_threads = True
+
+    def __init__(self, path: str, commands: dict[str, Command] | None = None) -> None:
+        # pylint: disable=import-outside-toplevel
+        from android_tester.android_tests import EmulatorKeeper
+
+        self.path = path
+        self.commands = commands or {}  # the cli's, it starts the daemon
+        self.keeper = EmulatorKeeper()
+        self.run_lock = threading.Lock()
+        self.started = time.time()
+        self.runs = 0
+        self.output = CommandOutput(sys.stdout)
+        super().__init__(path, RequestHandler)
+
+    def execute(
+        self,
+        command: str,
+        argv: list[str],
+        out: io.TextIOBase,
+        env: dict[str, str] | None = None,
+        cwd: str | None = None,
+    ) -> int:
+        """Runs the command in the client's environment and directory.
+
+        Its output is written to out."""
+        with self.run_lock, self.output.to(out):
+            self.runs += 1
+            try:
+                with client_environment(env, cwd):
+                    return self.dispatch(command, argv)
+            except SystemExit as e:  # argparse errors, exec_cmd failures
+                return e.code if isinstance(e.code, int) else int(e.code is not None)
+            except Exception as e:  # pylint: disable=broad-except
+                print(f"Error: {e}")
+                return 1
+
+    def dispatch(self, command: str, argv: list[str]) -> int:
+        if command == "test":
+            # pylint: disable=import-outside-toplevel
+            from android_tester.android_tests import main as tests_main
+            from android_tester.options import create_argparser
+
+            return tests_main(create_argparser().parse_args(argv), keeper=self.keeper)
+        if command in COMMANDS and command in self.commands:
+            return self.commands[command](argv)
+        print(f"Unknown command: {command}")
+        return 2
+
+    def status(self) -> dict[str, Any]:
+        # pylint: disable=import-outside-toplevel
+        from android_tester.device_watcher import get_registry
+
+        emulator = self.keeper.running
+        return {
+            "pid": os.getpid(),
+            "uptime": round(time.time() - self.started, 1),
+            "runs": self.runs,
+            "busy": self.run_lock.locked(),
+            "emulator": emulator.serial if emulator is not None else None,
+            "emulator_boots": self.keeper.boots,
+            "emulator_reuses": self.keeper.reuses,
+            "devices": [device.serial for device in get_registry().devices()],
+        }
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.keeper.release()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def serve(path: str | None = None, commands: dict[str, Command] | None = None) -> int:
+    """Runs the daemon in this process until stopped"""
+    path = path or daemon_socket_path()
+    sock = connect(path)
+    if sock is not None:
+        sock.close()
+        print(f"A daemon is already listening on {path}")
+        return 1
+    if os.path.exists(path):
+        os.remove(path)  # left over by a daemon that was killed
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    os.environ[NO_DAEMON_ENV] = "1"  # the commands run here, not forwarded back to us
+    server = DaemonServer(path, commands)
+    signal.signal(
+        signal.SIGTERM,
+        lambda *_: threading.Thread(target=server.shutdown, daemon=True).start(),
+    )
+    print(f"android-tester daemon {os.getpid()} listening on {path}")
+    stdout, stderr = sys.stdout, sys.stderr
+    sys.stdout = sys.stderr = cast(TextIO, server.output)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sys.stdout, sys.stderr = stdout, stderr
+        server.server_close()
+    print("android-tester daemon stopped")
+    return 0
+
+
+def start(path: str | None = None, timeout: float = 30.0) -> int:
+    """Starts the daemon in the background, returns once it accepts connections"""
+    path = path or daemon_socket_path()
+    sock = connect(path)
+    if sock is not None:
+        sock.close()
+        print(f"The daemon is already running ({path})")
+        return 0
+    log_path = os.path.join(cache_dir(), "daemon.log")
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    with open(log_path, mode="ab") as log:
+        process = subprocess.Popen(  # pylint: disable=consider-using-with
+            [
+                sys.executable,
+                "-m",
+                "android_tester.cli",
+                "daemon",
+                "run",
+                "--socket",
+                path,
+            ],
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and process.poll() is None:
+        sock = connect(path)
+        if sock is not None:
+            sock.close()
+            print(f"Daemon {process.pid} started ({path}, log: {log_path})")
+            return 0
+        time.sleep(0.05)
+    print(f"The daemon did not start, see {log_path}")
+    return 1
+
+
+def stop(path: str | None = None, timeout: float = 60.0) -> int:
+    """Stops the daemon (killing the emulator it kept), returns once it is gone"""
+    path = path or daemon_socket_path()
+    if request("stop", path=path) is None:
+        print("The daemon is not running")
+        return 1
+    deadline = time.monotonic() + timeout
+    while os.path.exists(path) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    print("Daemon stopped")
+    return 0
+
+
+def main(
+    argv: list[str] | None = None,
+    prog: str | None = None,
+    commands: dict[str, Command] | None = None,
+) -> int:
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description="Resident daemon keeping devices and the emulator warm between runs",
+    )
+    parser.add_argument(
+        "action",
+        choices=["start", "stop", "status", "run"],
+        help="run: in the foreground",
+    )
+    parser.add_argument(
+        "--socket", default=None, help=f"Socket path (default: {daemon_socket_path()})"
+    )
+    args = parser.parse_args(argv)
+    if not supported():
+        print("The daemon needs Unix domain sockets, commands run in the foreground")
+        return 1
+    if args.action == "start":
+        return start(args.socket)
+    if args.action == "stop":
+        return stop(args.socket)
+    if args.action == "run":
+        return serve(args.socket, commands)
+    returncode = request("status", path=args.socket)
+    if returncode is None:
+        print("The daemon is not running")
+        return 1
+    return returncode
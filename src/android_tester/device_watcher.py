@@ -0,0 +1,290 @@
+"""
+Event driven device tracking. Subscribes once to the adb server's host:track-devices-l
+stream and turns the device list snapshots into added/removed/state change events, with a
+cached Device registry on top. Falls back to polling `adb devices -l` when the adb server
+can't be reached with the socket client.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import socket
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+from android_tester.adb_client import AdbClient, AdbConnection, AdbError, get_client
+from android_tester.common import Device, parse_device_line, query_adb_devices
+from android_tester.props import PROPS, DeviceProps
+
+ADDED = "added"
+REMOVED = "removed"
+STATE_CHANGED = "state_changed"
+
+
+@dataclass
+class DeviceEvent:
+    """A device appeared, disappeared or changed state (device, offline, unauthorized...)"""
+
+    kind: str
+    serial: str
+    state: str
+    previous_state: str | None
+    line: str
+
+
+def parse_device_list(lines: list[str]) -> dict[str, str]:
+    """Maps serial -> `adb devices -l` line"""
+    out = {}
+    for line in lines:
+        line = line.strip()
+        if line and "List of devices attached" not in line:
+            out[line.split()[0]] = line
+    return out
+
+
+def line_state(line: str) -> str:
+    parts = line.split()
+    return parts[1] if len(parts) > 1 else ""
+
+
+def diff_device_lists(old: dict[str, str], new: dict[str, str]) -> list[DeviceEvent]:
+    events = []
+    for serial, line in new.items():
+        if serial not in old:
+            events.append(DeviceEvent(ADDED, serial, line_state(line), None, line))
+        elif line_state(old[serial]) != line_state(line):
+            events.append(
+                DeviceEvent(
+                    STATE_CHANGED,
+                    serial,
+                    line_state(line),
+                    line_state(old[serial]),
+                    line,
+                )
+            )
+    for serial, line in old.items():
+        if serial not in new:
+            events.append(DeviceEvent(REMOVED, serial, "", line_state(line), line))
+    return events
+
+
+class DeviceWatcher:
+    """Background thread emitting DeviceEvents to callbacks and asyncio queues"""
+
+    def __init__(
+        self, client: AdbClient | None = None, poll_interval: float = 1.0
+    ) -> None:
+        self.client = client
+        self.poll_interval = poll_interval
+        self.callbacks: list[Callable[[DeviceEvent], None]] = []
+        self.queues: list[tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = []
+        self.current: dict[str, str] = {}
+        self.ready = threading.Event()
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+        self.conn: AdbConnection | None = None
+        self.thread: threading.Thread | None = None
+
+    def add_callback(self, callback: Callable[[DeviceEvent], None]) -> None:
+        self.callbacks.append(callback)
+
+    def queue(self, loop: asyncio.AbstractEventLoop | None = None) -> asyncio.Queue:
+        """Returns an asyncio queue receiving every event.
+
+        Must be called from (or given) the loop."""
+        queue: asyncio.Queue = asyncio.Queue()
+        self.queues.append((loop or asyncio.get_running_loop(), queue))
+        return queue
+
+    def start(self, timeout: float = 10) -> DeviceWatcher:
+        """Starts watching and waits for the first device list"""
+        self.thread = threading.Thread(
+            target=self._run, name="device-watcher", daemon=True
+        )
+        self.thread.start()
+        self.ready.wait(timeout)
+        return self
+
+    def stop(self) -> None:
+        self.stopped.set()
+        conn = self.conn
+        if conn is not None:
+            try:
+                # close() alone does not wake up a recv() blocked in the watcher thread.
+                conn.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            conn.close()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+
+    def _emit(self, events: list[DeviceEvent]) -> None:
+        for event in events:
+            for callback in list(self.callbacks):
+                try:
+                    callback(event)
+                except Exception as e:
+                    print(f"Device watcher callback failed: {e}")
+            for loop, queue in list(self.queues):
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+
+    def _update(self, lines: list[str]) -> None:
+        new = parse_device_list(lines)
+        with self.lock:
+            events = diff_device_lists(self.current, new)
+            self.current = new
+        self._emit(events)
+        self.ready.set()
+
+    def _run(self) -> None:
+        backoff = 0.1
+        while not self.stopped.is_set():
+            client = self.client or get_client()
+            if client is None:
+                self._poll_once()
+                self.stopped.wait(self.poll_interval)
+                continue
+            try:
+                self.conn = client.connect()
+                self.conn.sock.settimeout(
+                    None
+                )  # the stream is silent until something changes
+                self.conn.send_request("host:track-devices-l")
+                backoff = 0.1
+                for message in self.conn.iter_length_prefixed():
+                    self._update(message.decode("utf-8", "replace").splitlines())
+                    if self.stopped.is_set():
+                        break
+            except (OSError, AdbError) as e:
+                if not self.stopped.is_set():
+                    print(f"Device tracking interrupted ({e}), reconnecting")
+            finally:
+                if self.conn is not None:
+                    self.conn.close()
+                    self.conn = None
+            self.stopped.wait(backoff)
+            backoff = min(backoff * 2, 5.0)
+
+    def _poll_once(self) -> None:
+        try:
+            self._update(query_adb_devices())
+        except Exception as e:
+            print(f"Error polling devices: {e}")
+
+
+class DeviceRegistry:
+    """Cached Device objects kept current by a DeviceWatcher.
+
+    The properties of a device that comes online are read off the watcher thread, the device
+    shows up as online once they are in, so a slow getprop never holds up other events.
+    """
+
+    def __init__(self, watcher: DeviceWatcher | None = None) -> None:
+        self.watcher = watcher or DeviceWatcher()
+        self.by_serial: dict[str, Device] = {}
+        self.generation: dict[str, int] = (
+            {}
+        )  # bumped per event, a stale property read is dropped
+        self.fetching: set[str] = set()
+        self.changed = threading.Condition()
+        self.watcher.add_callback(self._on_event)
+
+    def start(self, timeout: float = 10) -> DeviceRegistry:
+        """Starts watching, returns once the devices of the first list are in"""
+        self.watcher.start(timeout)
+        with self.changed:
+            self.changed.wait_for(lambda: not self.fetching, timeout)
+        return self
+
+    def stop(self) -> None:
+        self.watcher.stop()
+
+    def _on_event(self, event: DeviceEvent) -> None:
+        # A device coming back (reboot, reconnect) may have new properties.
+        PROPS.invalidate(event.serial)
+        with self.changed:
+            generation = self.generation[event.serial] = (
+                self.generation.get(event.serial, 0) + 1
+            )
+            if event.state == "device":
+                self.fetching.add(event.serial)
+        if event.state == "device":
+            threading.Thread(
+                target=self._fetch,
+                args=(event, generation),
+                name=f"props-{event.serial}",
+                daemon=True,
+            ).start()
+        else:
+            self._apply(event, generation, None)
+
+    def _fetch(self, event: DeviceEvent, generation: int) -> None:
+        # One getprop per device appearance gives name, model, api level and abi.
+        self._apply(event, generation, PROPS.get(event.serial))
+
+    def _apply(
+        self, event: DeviceEvent, generation: int, props: DeviceProps | None
+    ) -> None:
+        name = (props.avd_name if props is not None else "") or "unknown"
+        with self.changed:
+            if self.generation.get(event.serial) == generation:
+                self.fetching.discard(event.serial)
+                if event.kind == REMOVED:
+                    self.by_serial.pop(event.serial, None)
+                else:
+                    self.by_serial[event.serial] = parse_device_line(
+                        event.line, name, props
+                    )
+                self.changed.notify_all()
+
+    def devices(self, online_only: bool = False) -> list[Device]:
+        with self.changed:
+            devices = list(self.by_serial.values())
+        if online_only:
+            devices = [device for device in devices if device.online == "device"]
+        return devices
+
+    def get(self, serial: str) -> Device | None:
+        with self.changed:
+            return self.by_serial.get(serial)
+
+    def wait_for(
+        self, predicate: Callable[[Device], bool], timeout: float
+    ) -> Device | None:
+        """Returns the first device matching predicate, waiting up to timeout for one to show up"""
+        deadline = time.monotonic() + timeout
+        with self.changed:
+            while True:
+                for device in self.by_serial.values():
+                    if predicate(device):
+                        return device
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.changed.wait(remaining)
+
+    def wait_gone(self, predicate: Callable[[Device], bool], timeout: float) -> bool:
+        """Waits up to timeout until no device matches predicate, returns whether none does"""
+        deadline = time.monotonic() + timeout
+        with self.changed:
+            while any(predicate(device) for device in self.by_serial.values()):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.changed.wait(remaining)
+            return True
+
+
+_REGISTRY: DeviceRegistry | None = None
+_REGISTRY_LOCK = threading.Lock()
+
+
+def get_registry() -> DeviceRegistry:
+    """Returns the shared registry, started on first use"""
+    global _REGISTRY  # pylint: disable=global-statement
+    with _REGISTRY_LOCK:
+        if _REGISTRY is None:
+            _REGISTRY = DeviceRegistry().start()
+        return _REGISTRY
@@ -0,0 +1,146 @@
+"""
+The emulator under test: the system image and SDK packages it needs, and RunningDevice, a
+booted emulator that is shut down at the end of a with block. Shared by the single emulator
+run (android_tests) and the emulator pool.
+"""
+
+from __future__ import annotations
+
+import subprocess
+import time
+from dataclasses import dataclass
+
+from android_tester.common import exec_cmd, run_cmd
+from android_tester.logpump import BOOT_COMPLETED, LogPump
+from android_tester.props import PROPS
+from android_tester.readiness import wait_until_ready
+from android_tester.report import phase
+from android_tester.sdk import SdkResolver
+
+# "sdkmanager --list | grep system-images"
+# Untested new stuff
+# EMULATOR_TYPE = "system-images;android-33;google_apis;x86_64"
+# EMULATOR_TYPE = "system-images;android-31;google_apis;x86_64"
+EMULATOR_TYPE = "system-images;android-30;google_apis_playstore;x86_64"
+
+
+@dataclass
+class RunningDevice:
+    """Represents a fully booted emulator device ready for testing"""
+
+    def __init__(
+        self,
+        device,
+        process: subprocess.Popen | None,
+        log_pump: LogPump | None = None,
+        keep: bool = False,
+    ):
+        self.device = device
+        self.process = process  # None for a reused emulator started by an earlier run
+        self.log_pump = log_pump
+        self.keep = (
+            keep  # left running at the end of the with block, for the next run to reuse
+        )
+        self.stopped = False
+
+    def __repr__(self):
+        return f"RunningDevice(device={self.device}, process={self.process})"
+
+    def kill(self):
+        if not self.stopped:
+            with phase("teardown", self.serial):
+                self.send_kill()
+                self.wait_shut_down()
+
+    def send_kill(self):
+        """Tells the emulator to shut down without waiting for it, see wait_shut_down"""
+        if not self.stopped:
+            self.stopped = True
+            if self.process is not None:
+                self.process.kill()
+                self.process = None
+            exec_cmd(
+                ["adb", "-s", self.device.serial, "emu", "kill"], ignore_errors=True
+            )
+
+    def wait_shut_down(self, timeout: int = 60):
+        """Waits up to timeout seconds for the emulator to go away"""
+        elapsed_time = 0
+
+        while self.is_emulator_running() and elapsed_time < timeout:
+            print("Waiting for emulator to shut down...")
+            time.sleep(1)
+            elapsed_time += 1
+
+        if elapsed_time >= timeout:
+            print("Timeout reached, emulator may still be running.")
+        else:
+            print("Emulator is shut down")
+
+    def is_emulator_running(self) -> bool:
+        try:
+            return (
+                run_cmd(
+                    ["adb", "-s", self.device.serial, "shell", "true"], timeout=10
+                ).returncode
+                == 0
+            )
+        except subprocess.TimeoutExpired:
+            return False
+
+    def wait_for_device_bootup(self, timeout: float = 300) -> bool:
+        """Waits until the device is actually usable (see readiness), or until timeout"""
+        boot_signal = None
+        if self.log_pump is not None:
+            # The emulator logs the end of the boot, which wakes up the boot_completed poll.
+            boot_signal = self.log_pump.add_trigger(BOOT_COMPLETED).event
+        console_port = None
+        if self.process is not None and self.serial.startswith("emulator-"):
+            console_port = int(self.serial.split("-")[1])
+        readiness = wait_until_ready(
+            self.serial,
+            timeout=timeout,
+            console_port=console_port,
+            boot_signal=boot_signal,
+        )
+        # Drop the snapshot taken while booting (sys.boot_completed etc. changed).
+        PROPS.invalidate(self.serial)
+        if not readiness.ready:
+            print("Timeout reached, device may still be booting.")
+            if self.log_pump is not None:
+                self.log_pump.print_tail()
+        return readiness.ready
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if not self.keep:
+            self.kill()
+        elif not self.stopped:
+            print(
+                f"Emulator {self.serial} left running for the next run, "
+                f"`adb -s {self.serial} emu kill` shuts it down"
+            )
+
+    @property
+    def serial(self) -> str:
+        return self.device.serial
+
+
+SDK_PACKAGES = ["build-tools;33.0.2", "platform-tools", "emulator", EMULATOR_TYPE]
+LICENSE_ANSWERS = b"y\n" * 64  # what `yes | sdkmanager --licenses` used to pipe in
+
+
+def ensure_installed() -> None:
+    """Ensure the emulator is installed, sdkmanager only runs when a package is missing"""
+    with phase("sdk_install"):
+        resolver = SdkResolver()
+        missing = resolver.missing(SDK_PACKAGES)
+        if not missing:
+            print(f"SDK packages already installed in {resolver.root}")
+            return
+        print(f"Installing missing SDK packages: {', '.join(missing)}")
+        exec_cmd(["sdkmanager", "--licenses"], input=LICENSE_ANSWERS)
+        exec_cmd(["sdkmanager", "--install", *missing, "--channel=0"])
+        resolver.invalidate()
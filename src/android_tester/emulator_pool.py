@@ -0,0 +1,222 @@
+"""
+Emulator pool: boots several read-only instances of the same AVD for
+android_tests.run_sharded_tests to shard the instrumentation suite across. Only as many
+instances as the host sustains are booted (see host), the shards of the others queue on them.
+"""
+
+from __future__ import annotations
+
+import os
+import socket
+import subprocess
+from dataclasses import dataclass
+from subprocess import PIPE, STDOUT, Popen
+
+from android_tester import snapshot
+from android_tester.common import Device, get_all_emulators
+from android_tester.device_watcher import get_registry
+from android_tester.emulator import EMULATOR_TYPE, RunningDevice, ensure_installed
+from android_tester.host import EmulatorPlan, plan_emulators
+from android_tester.logpump import LogPump
+from android_tester.report import get_report, phase
+from android_tester.scheduler import device_output_dir, print_results, run_on_devices
+
+FIRST_CONSOLE_PORT = 5554
+LAST_CONSOLE_PORT = 5682
+RUNNER_ARG = "-Pandroid.testInstrumentationRunnerArguments"
+
+
+@dataclass
+class PoolSlot:
+    """One emulator instance of the pool"""
+
+    port: int
+    process: Popen | None
+    running_device: RunningDevice | None = None
+    log_pump: LogPump | None = None
+
+    @property
+    def serial(self) -> str:
+        return f"emulator-{self.port}"
+
+
+def is_port_in_use(port: int) -> bool:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.settimeout(0.2)
+        return sock.connect_ex(("127.0.0.1", port)) == 0
+
+
+def find_free_console_ports(count: int) -> list[int]:
+    """Finds count free even console ports (adb uses port + 1)"""
+    ports: list[int] = []
+    for port in range(FIRST_CONSOLE_PORT, LAST_CONSOLE_PORT + 1, 2):
+        if not is_port_in_use(port) and not is_port_in_use(port + 1):
+            ports.append(port)
+            if len(ports) == count:
+                return ports
+    raise RuntimeError(
+        f"Only {len(ports)} free emulator console ports, {count} requested"
+    )
+
+
+def launch_emulator(
+    avd_name: str,
+    port: int,
+    read_only: bool = True,
+    warm: bool = False,
+    extra_args: list[str] | None = None,
+) -> Popen | None:
+    """Starts an emulator instance on the given console port, warm boots from the clean snapshot"""
+    cmd = (
+        ["emulator", "-avd", avd_name, "-port", str(port)]
+        + snapshot.emulator_args(warm)
+        + (extra_args or [])
+    )
+    if read_only:
+        cmd.append("-read-only")
+    print(f"Running: {subprocess.list2cmdline(cmd)}")
+    try:
+        return Popen(
+            cmd, stdout=PIPE, stderr=STDOUT
+        )  # pylint: disable=consider-using-with
+    except Exception as e:
+        print(f"Error starting emulator: {e}")
+        return None
+
+
+def wait_for_serial(serial: str, timeout: float) -> Device | None:
+    """Waits until adb lists the serial"""
+    return get_registry().wait_for(
+        lambda device: device.serial == serial, timeout=timeout
+    )
+
+
+class EmulatorPool:
+    """Boots up to size emulators of the same AVD concurrently, use as a context manager.
+
+    The plan (host.plan_emulators by default) limits how many are booted and sets their flags.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        api: int | None = None,
+        boot_timeout: float = 300,
+        use_snapshot: bool = True,
+        plan: EmulatorPlan | None = None,
+    ) -> None:
+        self.size = size
+        self.api = api
+        self.boot_timeout = boot_timeout
+        self.use_snapshot = use_snapshot
+        self.plan = plan
+        self.warm = False
+        self.slots: list[PoolSlot] = []
+
+    def start(self) -> list[RunningDevice]:
+        ensure_installed()
+        emulators = get_all_emulators(api=self.api)
+        assert len(emulators) > 0
+        avd_name = emulators[0]
+        plan = self.plan = self.plan or plan_emulators(self.size)
+        get_report().set_host(plan.to_dict())
+        print(f"Host: {plan.summary()}")
+        if plan.queued:
+            print(
+                f"{plan.queued} of {plan.requested} shards wait for a free emulator "
+                "instead of overloading the host"
+            )
+        # Read-only instances can restore the clean snapshot but never save it.
+        self.warm = self.use_snapshot and snapshot.has_valid_snapshot(
+            avd_name, EMULATOR_TYPE
+        )
+        print(
+            f"{'Warm' if self.warm else 'Cold'} booting {plan.slots} instances of {avd_name}"
+        )
+        for port in find_free_console_ports(plan.slots):
+            slot = PoolSlot(
+                port=port,
+                process=launch_emulator(
+                    avd_name, port, warm=self.warm, extra_args=plan.emulator_args()
+                ),
+            )
+            if slot.process is not None:
+                log_path = os.path.join(device_output_dir(slot.serial), "emulator.log")
+                slot.log_pump = LogPump.attach(
+                    slot.process, slot.serial, log_path=log_path
+                )
+            self.slots.append(slot)
+        results = run_on_devices(self.slots, self._wait_for_slot)
+        failed = [result for result in results if not result.ok]
+        if failed:
+            print_results(results)
+            raise RuntimeError(
+                f"{len(failed)} of {len(self.slots)} emulators failed to boot"
+            )
+        return self.running_devices
+
+    def _wait_for_slot(self, slot: PoolSlot) -> int:
+        if slot.process is None:
+            return 1
+        with phase("avd_boot", slot.serial, detail="warm" if self.warm else "cold"):
+            device = wait_for_serial(slot.serial, timeout=self.boot_timeout)
+        if device is None:
+            print(f"Timeout waiting for {slot.serial} to appear")
+            if slot.log_pump is not None:
+                slot.log_pump.print_tail()
+            return 1
+        slot.running_device = RunningDevice(device, slot.process, slot.log_pump)
+        if not slot.running_device.wait_for_device_bootup(timeout=self.boot_timeout):
+            return 1
+        # Re-read the registry, the avd name is only known once the device is online.
+        device = get_registry().wait_for(
+            lambda device: device.serial == slot.serial and device.online == "device",
+            timeout=10,
+        )
+        if device is not None:
+            slot.running_device.device = device
+        return 0
+
+    @property
+    def running_devices(self) -> list[RunningDevice]:
+        return [
+            slot.running_device
+            for slot in self.slots
+            if slot.running_device is not None
+        ]
+
+    def shutdown(self) -> None:
+        """Sends the kill to every instance first, then waits for them together"""
+        stopping = [
+            slot.running_device
+            for slot in self.slots
+            if slot.running_device is not None and not slot.running_device.stopped
+        ]
+        for slot in self.slots:
+            if slot.running_device is not None:
+                slot.running_device.send_kill()
+            elif slot.process is not None:
+                slot.process.kill()
+        run_on_devices(stopping, self._wait_shut_down)
+        self.slots = []
+
+    @staticmethod
+    def _wait_shut_down(running_device: RunningDevice) -> int:
+        with phase("teardown", running_device.serial):
+            running_device.wait_shut_down()
+        return 0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.shutdown()
+
+
+def shard_args(num_shards: int, shard_index: int) -> list[str]:
+    """Gradle properties forwarded to AndroidJUnitRunner to select a shard"""
+    return [
+        f"{RUNNER_ARG}.numShards={num_shards}",
+        f"{RUNNER_ARG}.shardIndex={shard_index}",
+    ]
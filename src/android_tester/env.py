@@ -9,3 +9,47 @@ APP_PACKAGE_TEST_NAME = "org.internetwatchdogs.androidmonitor.test"
 MAIN_ACTIVITY = "MainActivity"
 
 RELEASE_APK = os.path.join(PROJECT_ROOT, "app", "release", "app-release.apk")
+
+# Per-device logs and results, report.json and TEST-report.xml.
+DEVICE_OUTPUT_ROOT = os.path.join(PROJECT_ROOT, "build", "android-tester")
+
+CACHE_DIR_ENV = "ANDROID_TESTER_CACHE_DIR"
+OUTPUT_DIR_ENV = "ANDROID_TESTER_OUTPUT_DIR"
+# Set: commands run in this process even if a daemon is running.
+NO_DAEMON_ENV = "ANDROID_TESTER_NO_DAEMON"
+
+
+def cache_dir() -> str:
+    """Per-user cache directory, ~/.android_tester unless set with ANDROID_TESTER_CACHE_DIR"""
+    return os.environ.get(CACHE_DIR_ENV) or os.path.join(
+        os.path.expanduser("~"), ".android_tester"
+    )
+
+
+def device_output_root() -> str:
+    """Where the logs and results of a run go.
+
+    DEVICE_OUTPUT_ROOT unless overridden with ANDROID_TESTER_OUTPUT_DIR."""
+    return os.environ.get(OUTPUT_DIR_ENV) or DEVICE_OUTPUT_ROOT
+
+
+def daemon_socket_path() -> str:
+    """Unix socket of the resident daemon (see daemon.py)"""
+    return os.path.join(cache_dir(), "daemon.sock")
+
+
+# Outputs of the debug build, installed directly in --direct mode.
+DEBUG_APK = os.path.join(
+    PROJECT_ROOT, "app", "build", "outputs", "apk", "debug", "app-debug.apk"
+)
+TEST_APK = os.path.join(
+    PROJECT_ROOT,
+    "app",
+    "build",
+    "outputs",
+    "apk",
+    "androidTest",
+    "debug",
+    "app-debug-androidTest.apk",
+)
+TEST_RUNNER = "androidx.test.runner.AndroidJUnitRunner"
@@ -0,0 +1,190 @@
+"""
+Flake history. The outcome of every test of every run is kept in a SQLite database
+(<cache dir>/flakes.sqlite) keyed by test id (Class#method): passed, flaky (failed, then
+passed when retried) or failed. A test that was flaky QUARANTINE_FLAKES times within its last
+WINDOW runs is quarantined: it still runs and is reported, but its failures no longer fail
+the run. It is released after RELEASE_AFTER runs in a row that passed on the first attempt,
+or by hand (`android-tester flakes --release`). Only the flakes after its release count
+towards quarantining it again.
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+
+from android_tester.env import cache_dir
+
+WINDOW = 20  # runs kept per test
+QUARANTINE_FLAKES = 3
+RELEASE_AFTER = 10
+OUTCOMES = ("passed", "flaky", "failed")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (test_id TEXT NOT NULL, run_at REAL NOT NULL, serial TEXT NOT NULL, outcome TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS results_by_test ON results (test_id, run_at);
+CREATE TABLE IF NOT EXISTS quarantine (test_id TEXT PRIMARY KEY, since REAL NOT NULL, reason TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS released (test_id TEXT PRIMARY KEY, at REAL NOT NULL);
+"""
+
+
+@dataclass
+class TestHistory:
+    """Outcome counts of one test over the runs kept for it"""
+
+    test_id: str
+    runs: int
+    flaky: int
+    failed: int
+    quarantined: bool
+
+    def format(self) -> str:
+        quarantined = "  QUARANTINED" if self.quarantined else ""
+        return (
+            f"{self.test_id:<60} {self.runs:>4} runs {self.flaky:>3} flaky "
+            f"{self.failed:>3} failed{quarantined}"
+        )
+
+
+def store_path() -> str:
+    return os.path.join(cache_dir(), "flakes.sqlite")
+
+
+class FlakeStore:
+    """Outcomes of the last WINDOW runs per test and the quarantine, thread safe"""
+
+    def __init__(self, path: str | None = None) -> None:
+        self.path = path or store_path()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        with self.lock, self.db:
+            self.db.executescript(SCHEMA)
+
+    def close(self) -> None:
+        with self.lock:
+            self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def record(
+        self, outcomes: dict[str, tuple[str, str]]
+    ) -> tuple[list[str], list[str]]:
+        """Adds one run, test id -> (serial, outcome).
+
+        Returns the tests (quarantined, released) by it."""
+        now = time.time()
+        with self.lock, self.db:
+            self.db.executemany(
+                "INSERT INTO results (test_id, run_at, serial, outcome) VALUES (?, ?, ?, ?)",
+                [
+                    (test_id, now, serial, outcome)
+                    for test_id, (serial, outcome) in outcomes.items()
+                ],
+            )
+            self.db.executemany(
+                "DELETE FROM results WHERE test_id = ? AND rowid NOT IN "
+                "(SELECT rowid FROM results WHERE test_id = ? "
+                "ORDER BY run_at DESC, rowid DESC LIMIT ?)",
+                [(test_id, test_id, WINDOW) for test_id in outcomes],
+            )
+            quarantined = {
+                row[0] for row in self.db.execute("SELECT test_id FROM quarantine")
+            }
+            released_at = dict(self.db.execute("SELECT test_id, at FROM released"))
+            added, released = [], []
+            for test_id in outcomes:
+                rows = self.db.execute(
+                    "SELECT outcome, run_at FROM results WHERE test_id = ? "
+                    "ORDER BY run_at DESC, rowid DESC",
+                    (test_id,),
+                ).fetchall()
+                history = [outcome for outcome, _ in rows]
+                # The flakes that got a released test quarantined before do not count again.
+                since_release = [
+                    outcome
+                    for outcome, run_at in rows
+                    if run_at > released_at.get(test_id, 0.0)
+                ]
+                flaky = since_release.count("flaky")
+                if test_id not in quarantined and flaky >= QUARANTINE_FLAKES:
+                    reason = f"flaky in {flaky} of the last {len(since_release)} runs"
+                    self.db.execute(
+                        "INSERT INTO quarantine (test_id, since, reason) VALUES (?, ?, ?)",
+                        (test_id, now, reason),
+                    )
+                    added.append(test_id)
+                elif (
+                    test_id in quarantined
+                    and len(history) >= RELEASE_AFTER
+                    and all(outcome == "passed" for outcome in history[:RELEASE_AFTER])
+                ):
+                    self._release(test_id, now)
+                    released.append(test_id)
+        return added, released
+
+    def quarantined(self) -> dict[str, str]:
+        """test id -> why it is quarantined"""
+        with self.lock:
+            return dict(
+                self.db.execute(
+                    "SELECT test_id, reason FROM quarantine ORDER BY test_id"
+                )
+            )
+
+    def release(self, test_id: str) -> bool:
+        with self.lock, self.db:
+            return self._release(test_id, time.time())
+
+    def _release(self, test_id: str, now: float) -> bool:
+        if (
+            self.db.execute(
+                "DELETE FROM quarantine WHERE test_id = ?", (test_id,)
+            ).rowcount
+            == 0
+        ):
+            return False
+        self.db.execute(
+            "INSERT OR REPLACE INTO released (test_id, at) VALUES (?, ?)",
+            (test_id, now),
+        )
+        return True
+
+    def outcomes(self, test_id: str) -> list[str]:
+        """Recorded outcomes of the test, newest first"""
+        with self.lock:
+            return [
+                row[0]
+                for row in self.db.execute(
+                    "SELECT outcome FROM results WHERE test_id = ? "
+                    "ORDER BY run_at DESC, rowid DESC",
+                    (test_id,),
+                )
+            ]
+
+    def histories(self, flaky_only: bool = True) -> list[TestHistory]:
+        """Per test counts, the flakiest first"""
+        with self.lock:
+            quarantined = {
+                row[0] for row in self.db.execute("SELECT test_id FROM quarantine")
+            }
+            rows = self.db.execute(
+                "SELECT test_id, COUNT(*), SUM(outcome = 'flaky'), SUM(outcome = 'failed') "
+                "FROM results GROUP BY test_id ORDER BY 3 DESC, 4 DESC, test_id"
+            ).fetchall()
+        out = [
+            TestHistory(test_id, runs, flaky, failed, test_id in quarantined)
+            for test_id, runs, flaky, failed in rows
+        ]
+        return [
+            history
+            for history in out
+            if history.flaky or history.failed or history.quarantined or not flaky_only
+        ]
@@ -0,0 +1,129 @@
+"""
+Gradle orchestration. Every invocation runs against the shared daemon with the build cache
+and configuration cache enabled, and all the tasks of a step go into a single invocation.
+The APKs are built once before the per-device runs. Each per-device connectedCheck still
+configures the project and runs its tasks in its own build dir, but the task outputs come
+from the build cache and the project cache dir is shared. Only --direct installs the
+prebuilt APKs without running gradle per device. Each run reports how long configuration
+and task execution took.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from dataclasses import dataclass, field
+
+from android_tester.env import PROJECT_ROOT
+from android_tester.logpump import Trigger, run_logged
+
+GRADLE_FLAGS = [
+    "--daemon",
+    "--build-cache",
+    "--configuration-cache",
+    "--configuration-cache-problems=warn",
+    "--console=plain",
+]
+# Everything the connected tests need, built once to fill the build cache for all devices.
+BUILD_TASKS = ["assembleDebug", "assembleDebugUnitTest", "assembleDebugAndroidTest"]
+# With --console=plain the first executed task marks the end of the configuration phase.
+TASK_LINE = r"^> Task :"
+
+
+@dataclass
+class GradleRun:
+    """Timing of one gradle invocation, times are time.monotonic()"""
+
+    tasks: list[str]
+    returncode: int
+    start: float
+    end: float
+    configured: float | None = None
+    log_path: str | None = None
+    args: list[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0
+
+    @property
+    def configuration_time(self) -> float:
+        return (self.configured or self.end) - self.start
+
+    @property
+    def execution_time(self) -> float:
+        return self.end - self.configured if self.configured is not None else 0.0
+
+    def summary(self) -> str:
+        return f"configuration {self.configuration_time:.2f}s, execution {self.execution_time:.2f}s"
+
+
+def gradle_argv(
+    tasks: list[str],
+    init_script: str | None = None,
+    project_cache_dir: str | None = None,
+    extra_args: list[str] | None = None,
+) -> list[str]:
+    argv = ["gradle"] + GRADLE_FLAGS
+    if init_script:
+        argv += ["--init-script", init_script]
+    if project_cache_dir:
+        argv += ["--project-cache-dir", project_cache_dir]
+    return argv + (extra_args or []) + tasks
+
+
+def run_gradle(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    tasks: list[str],
+    cwd: str | None = None,
+    env: dict[str, str] | None = None,
+    log_path: str | None = None,
+    name: str = "gradle",
+    init_script: str | None = None,
+    project_cache_dir: str | None = None,
+    extra_args: list[str] | None = None,
+    echo: bool = False,
+) -> GradleRun:
+    """Runs all tasks in one gradle invocation and times its configuration and execution phases"""
+    argv = gradle_argv(
+        tasks,
+        init_script=init_script,
+        project_cache_dir=project_cache_dir,
+        extra_args=extra_args,
+    )
+    configured = Trigger(TASK_LINE)
+    start = time.monotonic()
+    rtn, _ = run_logged(
+        argv,
+        name=name,
+        log_path=log_path,
+        cwd=cwd or PROJECT_ROOT,
+        env=env,
+        triggers=[configured],
+        echo=echo,
+    )
+    run = GradleRun(
+        tasks=tasks,
+        returncode=rtn,
+        start=start,
+        end=time.monotonic(),
+        configured=configured.at,
+        log_path=log_path,
+        args=argv,
+    )
+    print(f"{name} {' '.join(tasks)}: {'OK' if run.ok else 'FAILED'} ({run.summary()})")
+    return run
+
+
+def build_once(cwd: str | None = None, log_path: str | None = None) -> GradleRun:
+    """Builds the app and test APKs.
+
+    The per-device runs restore their outputs from the build cache."""
+    if log_path:
+        os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+    return run_gradle(
+        BUILD_TASKS,
+        cwd=cwd,
+        log_path=log_path,
+        name="gradle-build",
+        echo=log_path is None,
+    )
@@ -0,0 +1,169 @@
+"""
+Host resources for emulators. Reads the CPU count (/proc/cpuinfo), the available memory
+(/proc/meminfo), the load (/proc/loadavg) and whether /dev/kvm can be used, then decides how
+many emulators the host sustains at once and the -cores, -memory, -gpu and -accel flags of
+each. Asking for more emulators than fit boots only what fits, the extra shards queue on them.
+Without KVM the emulator falls back to software emulation: -accel off, one instance.
+
+The /proc and /dev/kvm paths are arguments so the planning can be tested with fixtures.
+"""
+
+from __future__ import annotations
+
+import os
+from dataclasses import asdict, dataclass
+from typing import Any
+
+# Left to the host for adb, gradle and the test runner.
+RESERVED_CORES = 1
+RESERVED_MEMORY_MB = 2048
+DEFAULT_CORES = 2
+MAX_CORES = 4
+DEFAULT_MEMORY_MB = 2048
+MIN_MEMORY_MB = 1536
+HEADLESS_GPU = "swiftshader_indirect"
+
+
+@dataclass
+class HostResources:
+    """What the host has for emulators, read by read_host()"""
+
+    cpus: int
+    memory_available_mb: int | None  # None when /proc/meminfo cannot be read
+    load: float  # 1 minute load average
+    kvm: bool | None  # None when the host has no /dev (not Linux)
+    display: bool = False
+
+
+@dataclass
+class EmulatorPlan:
+    """How many emulators run at once and the resources of each"""
+
+    requested: int
+    slots: int
+    cores: int
+    memory_mb: int | None
+    gpu: str
+    accel: str | None  # "on", "off", None: the emulator decides
+    reason: str = ""  # what limited the slots, empty when all requested fit
+    host: HostResources | None = None
+
+    @property
+    def queued(self) -> int:
+        return self.requested - self.slots
+
+    def emulator_args(self) -> list[str]:
+        args = ["-cores", str(self.cores)]
+        if self.memory_mb is not None:
+            args += ["-memory", str(self.memory_mb)]
+        args += ["-gpu", self.gpu]
+        if self.accel is not None:
+            args += ["-accel", self.accel]
+        return args
+
+    def summary(self) -> str:
+        out = f"{self.slots} of {self.requested} emulators at once, {self.cores} cores"
+        if self.memory_mb is not None:
+            out += f", {self.memory_mb} MB"
+        out += f", gpu {self.gpu}"
+        if self.accel is not None:
+            out += f", accel {self.accel}"
+        if self.reason:
+            out += f" (limited by {self.reason})"
+        return out
+
+    def to_dict(self) -> dict[str, Any]:
+        out = asdict(self)
+        out.update(
+            queued=self.queued,
+            emulator_args=self.emulator_args(),
+            summary=self.summary(),
+        )
+        return out
+
+
+def parse_cpuinfo(text: str) -> int:
+    """Number of logical CPUs in /proc/cpuinfo"""
+    return sum(
+        1 for line in text.splitlines() if line.split(":")[0].strip() == "processor"
+    )
+
+
+def parse_meminfo(text: str) -> dict[str, int]:
+    """/proc/meminfo fields in kB"""
+    out: dict[str, int] = {}
+    for line in text.splitlines():
+        key, _, value = line.partition(":")
+        fields = value.split()
+        if fields and fields[0].isdigit():
+            out[key.strip()] = int(fields[0])
+    return out
+
+
+def parse_loadavg(text: str) -> float:
+    fields = text.split()
+    return float(fields[0]) if fields else 0.0
+
+
+def read_text(path: str) -> str | None:
+    try:
+        with open(path, encoding="utf-8", mode="r") as file:
+            return file.read()
+    except OSError:
+        return None
+
+
+def kvm_usable(path: str = "/dev/kvm") -> bool | None:
+    """Whether the emulator can use KVM, None when there is no /dev to look in"""
+    if not os.path.isdir(os.path.dirname(path)):
+        return None
+    return os.path.exists(path) and os.access(path, os.R_OK | os.W_OK)
+
+
+def read_host(proc: str = "/proc", kvm_path: str = "/dev/kvm") -> HostResources:
+    cpuinfo = read_text(os.path.join(proc, "cpuinfo"))
+    cpus = (parse_cpuinfo(cpuinfo) if cpuinfo else 0) or os.cpu_count() or 1
+    meminfo = parse_meminfo(read_text(os.path.join(proc, "meminfo")) or "")
+    available = meminfo.get("MemAvailable", meminfo.get("MemFree"))
+    return HostResources(
+        cpus=cpus,
+        memory_available_mb=available // 1024 if available is not None else None,
+        load=parse_loadavg(read_text(os.path.join(proc, "loadavg")) or ""),
+        kvm=kvm_usable(kvm_path),
+        display=bool(os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY")),
+    )
+
+
+def plan_emulators(requested: int, host: HostResources | None = None) -> EmulatorPlan:
+    """How many of the requested emulators to run at once and with what, never fewer than one"""
+    host = host or read_host()
+    requested = max(1, requested)
+    # Cores already busy (the load) are not available to the emulators.
+    free_cores = max(1.0, host.cpus - RESERVED_CORES - host.load)
+    limits = {"cpu": max(1, int(free_cores // DEFAULT_CORES))}
+    free_memory = (
+        None
+        if host.memory_available_mb is None
+        else host.memory_available_mb - RESERVED_MEMORY_MB
+    )
+    if free_memory is not None:
+        limits["memory"] = max(1, free_memory // MIN_MEMORY_MB)
+    if host.kvm is False:
+        limits["kvm"] = 1  # software emulation, one instance takes the whole host
+    slots = min([requested] + list(limits.values()))
+    reason = ", ".join(
+        name for name, limit in limits.items() if limit == slots and slots < requested
+    )
+    memory = None
+    if free_memory is not None:
+        memory = max(MIN_MEMORY_MB, min(DEFAULT_MEMORY_MB, free_memory // slots))
+    return EmulatorPlan(
+        requested=requested,
+        slots=slots,
+        cores=max(1, min(MAX_CORES, int(free_cores // slots))),
+        memory_mb=memory,
+        gpu="auto" if host.display and host.kvm else HEADLESS_GPU,
+        accel=None if host.kvm is None else ("on" if host.kvm else "off"),
+        reason=reason,
+        host=host,
+    )
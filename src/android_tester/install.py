@@ -1,18 +1,21 @@
 # flake8: noqa: E501
 
 import os
+import subprocess
 import sys
 
-from android_tester.common import PROJECT_ROOT
+from android_tester.env import PROJECT_ROOT
 
 os.chdir(PROJECT_ROOT)
 
-os.system("python -m pip install -U pip")
-os.system("python -m pip install -U pyflutterinstall")
-os.system("pyflutterinstall --skip-ant")
+subprocess.run([sys.executable, "-m", "pip", "install", "-U", "pip"], check=False)
+subprocess.run(
+    [sys.executable, "-m", "pip", "install", "-U", "pyflutterinstall"], check=False
+)
+subprocess.run(["pyflutterinstall", "--skip-ant"], check=False)
 
 if sys.platform == "linux":
-    os.system("sudo apt-get install -y ninja-build")
+    subprocess.run(["sudo", "apt-get", "install", "-y", "ninja-build"], check=False)
 
 print(
     "Done installing dependencies. Try running test. "
@@ -0,0 +1,191 @@
+"""
+APK install cache. Records the SHA-256 of every APK installed per device serial together
+with what the package manager reported right after the install (code path, versionCode,
+lastUpdateTime). An install is skipped when the APK is unchanged and the device still
+reports the same package state, so unchanged APKs are not pushed again on every run.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import subprocess
+import threading
+from dataclasses import asdict, dataclass
+
+from android_tester import aio
+from android_tester.env import cache_dir
+
+VERSION_CODE = re.compile(r"versionCode=(\d+)")
+LAST_UPDATE_TIME = re.compile(r"lastUpdateTime=(.+)")
+
+_HASHES: dict[tuple[str, int, int], str] = {}
+_HASHES_LOCK = threading.Lock()
+
+
+def sha256_file(path: str) -> str:
+    """SHA-256 of the file, memoized on (path, size, mtime) so each APK is hashed once"""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _HASHES_LOCK:
+        if key in _HASHES:
+            return _HASHES[key]
+    digest = hashlib.sha256()
+    with open(path, mode="rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    with _HASHES_LOCK:
+        _HASHES[key] = digest.hexdigest()
+    return _HASHES[key]
+
+
+@dataclass
+class PackageState:
+    """What the package manager reports about an installed package"""
+
+    code_path: str
+    version_code: int
+    last_update_time: str
+
+
+@dataclass
+class InstalledApk:
+    """The APK we installed (its hash) and the package state right after, while the state
+    still matches the device has that APK"""
+
+    sha256: str
+    state: PackageState
+
+
+def parse_pm_path(output: str) -> str:
+    """Directory of the base APK from `pm path`, empty when the package is not installed"""
+    for line in output.splitlines():
+        if line.startswith("package:"):
+            return os.path.dirname(line[len("package:") :].strip())
+    return ""
+
+
+def parse_dumpsys_package(output: str) -> tuple[int | None, str]:
+    """(versionCode, lastUpdateTime) from `dumpsys package <package>`"""
+    version = VERSION_CODE.search(output)
+    update = LAST_UPDATE_TIME.search(output)
+    return (
+        int(version.group(1)) if version else None,
+        update.group(1).strip() if update else "",
+    )
+
+
+async def read_package_state(serial: str, package: str) -> PackageState | None:
+    """Current state of the package on the device, None if it is not installed"""
+    pm_path, dumpsys = await asyncio.gather(
+        aio.adb_shell(serial, f"pm path {package}"),
+        aio.adb_shell(serial, f"dumpsys package {package}"),
+    )
+    code_path = parse_pm_path(pm_path)
+    version_code, last_update_time = parse_dumpsys_package(dumpsys)
+    if not code_path or version_code is None:
+        return None
+    return PackageState(
+        code_path=code_path,
+        version_code=version_code,
+        last_update_time=last_update_time,
+    )
+
+
+class InstallCache:
+    """serial -> package -> InstalledApk, persisted as JSON"""
+
+    def __init__(self, path: str | None = None) -> None:
+        self.path = path or os.path.join(cache_dir(), "install_cache.json")
+        self.lock = threading.Lock()
+        self.entries: dict[str, dict[str, InstalledApk]] = {}
+        self.load()
+
+    def load(self) -> None:
+        try:
+            with open(self.path, encoding="utf-8", mode="r") as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return
+        for serial, packages in data.items():
+            for package, entry in packages.items():
+                try:
+                    installed = InstalledApk(
+                        sha256=entry["sha256"], state=PackageState(**entry["state"])
+                    )
+                except (KeyError, TypeError):
+                    continue  # written by an older version
+                self.entries.setdefault(serial, {})[package] = installed
+
+    def save(self) -> None:
+        with self.lock:
+            data = {
+                serial: {package: asdict(entry) for package, entry in packages.items()}
+                for serial, packages in self.entries.items()
+            }
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, encoding="utf-8", mode="w") as file:
+            json.dump(data, file, indent=2)
+        os.replace(tmp, self.path)
+
+    def get(self, serial: str, package: str) -> InstalledApk | None:
+        with self.lock:
+            return self.entries.get(serial, {}).get(package)
+
+    def put(self, serial: str, package: str, entry: InstalledApk) -> None:
+        with self.lock:
+            self.entries.setdefault(serial, {})[package] = entry
+        self.save()
+
+    def forget(self, serial: str, package: str | None = None) -> None:
+        with self.lock:
+            if package is None:
+                self.entries.pop(serial, None)
+            else:
+                self.entries.get(serial, {}).pop(package, None)
+        self.save()
+
+
+_CACHE: InstallCache | None = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_install_cache() -> InstallCache:
+    """Returns the shared cache, loaded on first use"""
+    global _CACHE  # pylint: disable=global-statement
+    with _CACHE_LOCK:
+        if _CACHE is None or _CACHE.path != os.path.join(
+            cache_dir(), "install_cache.json"
+        ):
+            _CACHE = InstallCache()
+        return _CACHE
+
+
+async def install_if_changed(
+    serial: str, apk: str, package: str, cache: InstallCache | None = None
+) -> bool:
+    """Installs the apk unless the device already has this exact build.
+
+    Returns True if it was pushed. Raises subprocess.CalledProcessError when the install fails.
+    """
+    cache = cache or get_install_cache()
+    sha256, state = await asyncio.gather(
+        asyncio.to_thread(sha256_file, apk), read_package_state(serial, package)
+    )
+    cached = cache.get(serial, package)
+    if cached is not None and cached.sha256 == sha256 and cached.state == state:
+        print(f"{serial}: {package} is up to date, skipping install")
+        return False
+    try:
+        await aio.install(serial, apk)
+    except subprocess.CalledProcessError:
+        cache.forget(serial, package)
+        raise
+    state = await read_package_state(serial, package)
+    if state is not None:
+        cache.put(serial, package, InstalledApk(sha256=sha256, state=state))
+    return True
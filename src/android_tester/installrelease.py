@@ -5,22 +5,34 @@ Installs the release APK on the emulator and launches it.
 # flake8: noqa: E501
 # pylint: disable=wrong-import-position
 
+from __future__ import annotations
+
 import os
 import sys
+from subprocess import CalledProcessError
 
+from android_tester import aio, common
 from android_tester.common import Device, exec_cmd, get_live_devices
+from android_tester.device_watcher import get_registry
 from android_tester.env import APP_PACKAGE_NAME, PROJECT_ROOT, RELEASE_APK
+from android_tester.install_cache import install_if_changed
 
 os.chdir(PROJECT_ROOT)
 
 
 def install_apk(apk: str, package_nam: str, device_serial: str) -> None:
-    """Installs the apk"""
-    exec_cmd(f"adb -s {device_serial} uninstall {package_nam}", ignore_errors=True)
-    exec_cmd(f"adb -s {device_serial} install -r {apk}")
+    """Installs the apk, skipped when the device already has this exact build"""
+    try:
+        aio.run_sync(install_if_changed(device_serial, apk, package_nam))
+    except CalledProcessError:
+        # An update can be refused (e.g. signed with another key), install from scratch.
+        exec_cmd(
+            ["adb", "-s", device_serial, "uninstall", package_nam], ignore_errors=True
+        )
+        common.install_apk(apk, device_serial)
     # check that it's installed
     exec_cmd(
-        f"adb -s {device_serial} shell pm list packages {package_nam}",
+        ["adb", "-s", device_serial, "shell", "pm", "list", "packages", package_nam],
         ignore_errors=False,
     )
 
@@ -28,10 +40,32 @@ def install_apk(apk: str, package_nam: str, device_serial: str) -> None:
 def start_app(package_name: str, device: Device) -> None:
     """Starts the app"""
     exec_cmd(
-        f"adb -s {device.name} shell am force-stop {package_name}",
+        ["adb", "-s", device.name, "shell", "am", "force-stop", package_name],
         ignore_errors=True,
     )
-    exec_cmd(f"adb -s {device.serial} shell monkey -p {package_name} 1")
+    exec_cmd(["adb", "-s", device.serial, "shell", "monkey", "-p", package_name, "1"])
+
+
+def install_release(serial: str | None = None) -> int:
+    """Installs and starts the release APK without asking, serial picks one of several devices"""
+    devices = [
+        device
+        for device in get_registry().devices(online_only=True)
+        if serial in (None, device.serial)
+    ]
+    if not devices:
+        print("No devices found." if serial is None else f"{serial} is not connected.")
+        return 1
+    if len(devices) > 1:
+        print(
+            "Several devices found, pass --serial with one of: "
+            + ", ".join(device.serial for device in devices)
+        )
+        return 1
+    install_apk(RELEASE_APK, APP_PACKAGE_NAME, devices[0].serial)
+    start_app(APP_PACKAGE_NAME, devices[0])
+    print("Done")
+    return 0
 
 
 def main() -> int:
@@ -0,0 +1,345 @@
+"""
+Build once, install many: the app and test APKs built by gradle are installed on every
+device in parallel and the tests run with `am instrument -r` directly, without a per-device
+`gradle connectedCheck`. The raw instrumentation output is parsed while it streams in.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import os
+import subprocess
+import threading
+import time
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+from typing import Callable
+
+from android_tester import aio
+from android_tester.env import (
+    APP_PACKAGE_NAME,
+    APP_PACKAGE_TEST_NAME,
+    DEBUG_APK,
+    TEST_APK,
+    TEST_RUNNER,
+)
+from android_tester.install_cache import install_if_changed
+from android_tester.junit import clear_junit_xml, merge_junit_xml
+from android_tester.logcat import LogcatCapture
+from android_tester.report import Phase, get_report
+from android_tester.scheduler import (
+    DeviceResult,
+    device_output_dir,
+    device_output_root,
+    print_results,
+    run_on_devices,
+    safe_name,
+)
+
+STATUS_PREFIX = "INSTRUMENTATION_STATUS: "
+STATUS_CODE_PREFIX = "INSTRUMENTATION_STATUS_CODE: "
+RESULT_PREFIX = "INSTRUMENTATION_RESULT: "
+CODE_PREFIX = "INSTRUMENTATION_CODE: "
+FAILED_PREFIXES = ("INSTRUMENTATION_FAILED: ", "INSTRUMENTATION_ABORTED: ")
+
+# AndroidJUnitRunner status codes
+STATUS_START = 1
+STATUSES = {0: "passed", -1: "error", -2: "failed", -3: "skipped", -4: "skipped"}
+RESULT_OK = -1  # Activity.RESULT_OK
+
+
+@dataclass
+class InstrumentedTest:
+    """One test reported by the instrumentation, times are time.monotonic()"""
+
+    class_name: str
+    name: str
+    status: str = "running"
+    stack: str = ""
+    start: float = 0.0
+    end: float = 0.0
+
+    @property
+    def duration(self) -> float:
+        return max(self.end - self.start, 0.0)
+
+
+@dataclass
+class InstrumentationResult:
+    """Parsed `am instrument -r` output of one device"""
+
+    serial: str
+    tests: list[InstrumentedTest] = field(default_factory=list)
+    code: int | None = None
+    result: dict[str, str] = field(default_factory=dict)
+    error: str = ""
+
+    def count(self, status: str) -> int:
+        return sum(1 for test in self.tests if test.status == status)
+
+    @property
+    def ok(self) -> bool:
+        """The run completed and nothing failed"""
+        return (
+            self.code == RESULT_OK
+            and not self.error
+            and "shortMsg" not in self.result
+            and all(test.status in ("passed", "skipped") for test in self.tests)
+        )
+
+    def summary(self) -> str:
+        failed = self.count("failed") + self.count("error")
+        text = (
+            f"{len(self.tests)} tests, {failed} failed, {self.count('skipped')} skipped"
+        )
+        if self.error or "shortMsg" in self.result:
+            text += f" ({self.error or self.result['shortMsg']})"
+        return text
+
+
+class InstrumentationParser:
+    """Incremental parser, feed() it the output lines as they arrive"""
+
+    def __init__(
+        self, serial: str, clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        self.out = InstrumentationResult(serial=serial)
+        self.clock = clock
+        self.bundle: dict[str, str] = {}
+        self.key: str | None = None
+        self.current: InstrumentedTest | None = None
+
+    def feed(self, line: str) -> None:
+        line = line.rstrip("\r\n")
+        if line.startswith((STATUS_PREFIX, RESULT_PREFIX)):
+            if line.startswith(RESULT_PREFIX):
+                self.bundle = self.out.result
+            key, _, value = line.split(": ", 1)[1].partition("=")
+            self.bundle[key] = value
+            self.key = key
+        elif line.startswith(STATUS_CODE_PREFIX):
+            self._status(int(line[len(STATUS_CODE_PREFIX) :].strip()))
+            self.bundle = {}
+            self.key = None
+        elif line.startswith(CODE_PREFIX):
+            self.out.code = int(line[len(CODE_PREFIX) :].strip())
+            self.key = None
+        elif line.startswith(FAILED_PREFIXES):
+            self.out.error = line.split(": ", 1)[1].strip()
+            self.key = None
+        elif self.key is not None:
+            # Multi-line values (stack traces, stream) continue on the following lines.
+            self.bundle[self.key] += "\n" + line
+
+    def _status(self, code: int) -> None:
+        class_name = self.bundle.get("class", "")
+        name = self.bundle.get("test", "")
+        if not class_name and not name:
+            return  # status bundles of other instrumentations
+        if code == STATUS_START:
+            self.current = InstrumentedTest(class_name, name, start=self.clock())
+            self.out.tests.append(self.current)
+            return
+        test = self.current
+        if test is None or (test.class_name, test.name) != (class_name, name):
+            # Ignored tests are reported without a start.
+            test = InstrumentedTest(class_name, name, start=self.clock())
+            self.out.tests.append(test)
+        test.status = STATUSES.get(code, "error")
+        test.stack = self.bundle.get("stack", "")
+        test.end = self.clock()
+        self.current = None
+
+    def close(self) -> InstrumentationResult:
+        if self.current is not None:
+            # The process died in the middle of a test.
+            self.current.status = "error"
+            self.current.end = self.clock()
+            self.current = None
+        return self.out
+
+
+def instrument_argv(
+    serial: str, extras: dict[str, str] | None = None, runner: str = TEST_RUNNER
+) -> list[str]:
+    argv = ["adb", "-s", serial, "shell", "am", "instrument", "-r", "-w"]
+    for key, value in (extras or {}).items():
+        argv += ["-e", key, value]
+    return argv + [f"{APP_PACKAGE_TEST_NAME}/{runner}"]
+
+
+def run_instrumentation(
+    serial: str,
+    extras: dict[str, str] | None = None,
+    log_path: str | None = None,
+    timeout: float | None = 3600,
+) -> InstrumentationResult:
+    """Runs the instrumentation and parses its output as it streams in"""
+    argv = instrument_argv(serial, extras)
+    print(f"Running: {subprocess.list2cmdline(argv)}")
+    parser = InstrumentationParser(serial)
+    process = subprocess.Popen(  # pylint: disable=consider-using-with
+        argv,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        start_new_session=aio.POSIX,
+    )
+    timer = (
+        threading.Timer(timeout, aio.kill_process_tree, args=(process,))
+        if timeout
+        else None
+    )
+    if timer is not None:
+        timer.start()
+    with contextlib.ExitStack() as stack:
+        log = (
+            stack.enter_context(open(log_path, encoding="utf-8", mode="w"))
+            if log_path
+            else None
+        )
+        try:
+            assert process.stdout is not None
+            for raw in iter(process.stdout.readline, b""):
+                line = raw.decode("utf-8", "replace")
+                parser.feed(line)
+                if log is not None:
+                    log.write(line)
+            process.wait()
+        except BaseException:
+            aio.kill_process_tree(process)
+            process.wait()
+            raise
+        finally:
+            if timer is not None:
+                timer.cancel()
+    result = parser.close()
+    if result.code is None and not result.error:
+        result.error = f"instrumentation exited with {process.returncode} before reporting a result"
+    return result
+
+
+def write_junit_xml(result: InstrumentationResult, path: str) -> None:
+    """Writes the result as a JUnit testsuite"""
+    suite = ET.Element("testsuite", name=f"{APP_PACKAGE_TEST_NAME} on {result.serial}")
+    for test in result.tests:
+        case = ET.SubElement(
+            suite,
+            "testcase",
+            classname=test.class_name,
+            name=test.name,
+            time=f"{test.duration:.3f}",
+        )
+        if test.status == "failed":
+            ET.SubElement(
+                case,
+                "failure",
+                message=test.stack.splitlines()[0] if test.stack else "",
+            ).text = test.stack
+        elif test.status == "error":
+            ET.SubElement(
+                case, "error", message=test.stack.splitlines()[0] if test.stack else ""
+            ).text = test.stack
+        elif test.status == "skipped":
+            ET.SubElement(case, "skipped")
+    suite.set("tests", str(len(result.tests)))
+    suite.set("failures", str(result.count("failed")))
+    suite.set("errors", str(result.count("error")))
+    suite.set("skipped", str(result.count("skipped")))
+    suite.set("time", f"{sum(test.duration for test in result.tests):.3f}")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    ET.ElementTree(suite).write(path, encoding="utf-8", xml_declaration=True)
+
+
+TEST_APKS = ((DEBUG_APK, APP_PACKAGE_NAME), (TEST_APK, APP_PACKAGE_TEST_NAME))
+
+
+async def install_test_apks(
+    serial: str, apks: tuple[tuple[str, str], ...] = TEST_APKS
+) -> None:
+    """Installs the (apk, package) pairs that changed since the last install.
+
+    The transfers overlap."""
+    await asyncio.gather(
+        *(install_if_changed(serial, apk, package) for apk, package in apks)
+    )
+
+
+def junit_xml_path(output_dir: str, serial: str) -> str:
+    """Where the report of one device goes, next to the ones Gradle writes"""
+    return os.path.join(
+        output_dir, "androidTest-results", "connected", f"TEST-{safe_name(serial)}.xml"
+    )
+
+
+def run_direct(
+    devices: list,
+    max_parallel: int | None = None,
+    output_root: str | None = None,
+    shard: bool = False,
+    apks: tuple[tuple[str, str], ...] = TEST_APKS,
+) -> list[DeviceResult]:
+    """Installs the prebuilt APKs and runs the instrumentation on all devices in parallel.
+
+    With shard every device runs a slice of the suite, otherwise every device runs all of it.
+    """
+    missing = [apk for apk, _ in apks if not os.path.exists(apk)]
+    if missing:
+        raise FileNotFoundError(f"Build the APKs first, missing: {', '.join(missing)}")
+    num_shards = len(devices)
+    shard_index = {device.serial: i for i, device in enumerate(devices)}
+    timings: dict[str, dict[str, float]] = {device.serial: {} for device in devices}
+
+    def job(device) -> int:
+        output_dir = device_output_dir(device.serial, root=output_root)
+        clear_junit_xml(output_dir)
+        start = time.monotonic()
+        aio.run_sync(install_test_apks(device.serial, apks))
+        installed = time.monotonic()
+        extras = (
+            {
+                "numShards": str(num_shards),
+                "shardIndex": str(shard_index[device.serial]),
+            }
+            if shard
+            else {}
+        )
+        with LogcatCapture(device.serial, output_dir):
+            result = run_instrumentation(
+                device.serial,
+                extras,
+                log_path=os.path.join(output_dir, "instrument.log"),
+            )
+        end = time.monotonic()
+        timings[device.serial].update(
+            install_time=installed - start, execute_time=end - installed
+        )
+        get_report().add(Phase("install", device.serial, start, installed))
+        get_report().add(
+            Phase(
+                "test",
+                device.serial,
+                installed,
+                end,
+                ok=result.ok,
+                detail=result.summary(),
+            )
+        )
+        write_junit_xml(result, junit_xml_path(output_dir, device.serial))
+        print(f"{device.serial}: {result.summary()}")
+        return 0 if result.ok else 1
+
+    results = run_on_devices(devices, job, max_parallel=max_parallel)
+    xml_files = []
+    for result in results:
+        output_dir = device_output_dir(result.serial, root=output_root)
+        result.log_path = os.path.join(output_dir, "instrument.log")
+        result.extra.update(timings[result.serial])
+        xml_path = junit_xml_path(output_dir, result.serial)
+        if os.path.exists(xml_path):
+            xml_files.append(xml_path)
+    print_results(results)
+    merge_junit_xml(
+        xml_files, os.path.join(output_root or device_output_root(), "TEST-merged.xml")
+    )
+    return results
@@ -0,0 +1,76 @@
+"""
+JUnit XML helpers.
+"""
+
+from __future__ import annotations
+
+import glob
+import os
+import shutil
+import warnings
+import xml.etree.ElementTree as ET
+from typing import Iterable
+
+COUNTERS = ["tests", "failures", "errors", "skipped"]
+
+
+def find_junit_xml(root: str) -> list[str]:
+    """Finds the connected test result files gradle wrote under root"""
+    pattern = os.path.join(
+        root, "**", "androidTest-results", "connected", "**", "*.xml"
+    )
+    return sorted(glob.glob(pattern, recursive=True))
+
+
+def clear_junit_xml(root: str) -> None:
+    """Deletes the results an earlier run left under root, the output dirs are kept between runs"""
+    for path in glob.glob(
+        os.path.join(root, "**", "androidTest-results"), recursive=True
+    ):
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def read_suites(path: str) -> list[ET.Element]:
+    root = ET.parse(path).getroot()
+    if root.tag == "testsuite":
+        return [root]
+    return list(root.iter("testsuite"))
+
+
+def merge_junit_xml(paths: Iterable[str], out_path: str) -> ET.Element:
+    """Merges the test suites of several JUnit XML files into a single <testsuites> file"""
+    merged = ET.Element("testsuites")
+    totals = {name: 0 for name in COUNTERS}
+    total_time = 0.0
+    for path in paths:
+        try:
+            suites = read_suites(path)
+        except (OSError, ET.ParseError) as e:
+            warnings.warn(f"Skipping {path}: {e}")
+            continue
+        for suite in suites:
+            merged.append(suite)
+            for name in COUNTERS:
+                totals[name] += int(suite.get(name, "0") or 0)
+            total_time += float(suite.get("time", "0") or 0)
+    for name, value in totals.items():
+        merged.set(name, str(value))
+    merged.set("time", f"{total_time:.3f}")
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    ET.ElementTree(merged).write(out_path, encoding="utf-8", xml_declaration=True)
+    return merged
+
+
+def read_testcases(path: str) -> list[tuple[str, str, str]]:
+    """(classname, name, status) of every testcase, status is passed, failed or skipped"""
+    out = []
+    for suite in read_suites(path):
+        for case in suite.iter("testcase"):
+            if case.find("failure") is not None or case.find("error") is not None:
+                status = "failed"
+            elif case.find("skipped") is not None:
+                status = "skipped"
+            else:
+                status = "passed"
+            out.append((case.get("classname", ""), case.get("name", ""), status))
+    return out
@@ -0,0 +1,301 @@
+"""
+Live logcat capture. `adb logcat -B` streams binary log entries while the tests run; they
+are parsed incrementally on a reader thread, filtered down to the app (the pids the
+ActivityManager starts for its packages, plus a tag set) and sliced per test case on the
+TestRunner "started:"/"finished:" markers. The captured lines live in a bounded ring
+buffer, older lines are spilled to gzip compressed segments on disk.
+"""
+
+from __future__ import annotations
+
+import collections
+import gzip
+import os
+import re
+import shutil
+import struct
+import subprocess
+import threading
+import time
+from dataclasses import dataclass
+from typing import Iterable, Iterator
+
+from android_tester.aio import POSIX, kill_process_tree
+from android_tester.env import APP_PACKAGE_NAME, APP_PACKAGE_TEST_NAME
+
+# struct logger_entry: len, hdr_size, pid, tid, sec, nsec (then lid and uid from v3/v4)
+ENTRY_HEADER = struct.Struct("<HHiIII")
+V1_HEADER_SIZE = 20  # v1 has no hdr_size (the field is padding)
+PRIORITIES = {2: "V", 3: "D", 4: "I", 5: "W", 6: "E", 7: "F", 8: "S"}
+
+TEST_RUNNER_TAG = "TestRunner"
+START_PROC = re.compile(r"Start proc (\d+):([^/\s]+)")
+TEST_STARTED = re.compile(r"^started: (\S+)\((\S+)\)")
+TEST_FINISHED = re.compile(r"^finished: (\S+)\((\S+)\)")
+
+
+@dataclass
+class LogEntry:
+    """One entry of the binary logcat stream"""
+
+    pid: int
+    tid: int
+    sec: int
+    nsec: int
+    priority: int
+    tag: str
+    message: str
+
+    def format(self) -> str:
+        """threadtime-like line: time pid tid priority tag: message"""
+        stamp = time.strftime("%m-%d %H:%M:%S", time.gmtime(self.sec))
+        level = PRIORITIES.get(self.priority, "?")
+        return (
+            f"{stamp}.{self.nsec // 1_000_000:03d} {self.pid:5d} {self.tid:5d} "
+            f"{level} {self.tag}: {self.message}"
+        )
+
+
+def parse_payload(payload: bytes) -> tuple[int, str, str]:
+    """(priority, tag, message) of a text log payload: priority byte, tag\\0, message\\0"""
+    if not payload:
+        return 0, "", ""
+    tag, _, rest = payload[1:].partition(b"\0")
+    message = rest.split(b"\0", 1)[0]
+    return (
+        payload[0],
+        tag.decode("utf-8", "replace"),
+        message.decode("utf-8", "replace").rstrip("\n"),
+    )
+
+
+class LogcatParser:  # pylint: disable=too-few-public-methods
+    """Incremental parser of the `logcat -B` byte stream, partial entries wait for more data"""
+
+    def __init__(self) -> None:
+        self.pending = b""
+
+    def feed(self, data: bytes) -> list[LogEntry]:
+        buffer = self.pending + data
+        out = []
+        offset = 0
+        while len(buffer) - offset >= ENTRY_HEADER.size:
+            length, hdr_size, pid, tid, sec, nsec = ENTRY_HEADER.unpack_from(
+                buffer, offset
+            )
+            hdr_size = hdr_size or V1_HEADER_SIZE
+            end = offset + hdr_size + length
+            if end > len(buffer):
+                break
+            priority, tag, message = parse_payload(buffer[offset + hdr_size : end])
+            out.append(LogEntry(pid, tid, sec, nsec, priority, tag, message))
+            offset = end
+        self.pending = buffer[offset:]
+        return out
+
+
+class LogcatFilter:  # pylint: disable=too-few-public-methods
+    """Keeps the entries of the app processes and of the given tags.
+
+    App pids are learned from the ActivityManager "Start proc <pid>:<package>" lines."""
+
+    def __init__(
+        self, packages: Iterable[str], tags: Iterable[str] = (TEST_RUNNER_TAG,)
+    ) -> None:
+        self.packages = set(packages)
+        self.tags = set(tags)
+        self.pids: set[int] = set()
+
+    def matches(self, entry: LogEntry) -> bool:
+        if entry.tag == "ActivityManager":
+            match = START_PROC.search(entry.message)
+            if match and match.group(2).split(":")[0] in self.packages:
+                self.pids.add(int(match.group(1)))
+        return entry.pid in self.pids or entry.tag in self.tags
+
+
+class LogBuffer:
+    """Ring buffer of the most recent lines, older lines are spilled to gzip segments.
+
+    Lines are numbered in order, lines(start, end) reads back any range, from disk if needed.
+    """
+
+    def __init__(
+        self,
+        spill_dir: str,
+        max_lines: int = 10000,
+        segment_lines: int | None = None,
+    ) -> None:
+        self.spill_dir = spill_dir
+        self.max_lines = max_lines
+        self.segment_lines = segment_lines or max(max_lines // 2, 1)
+        self.memory: collections.deque[str] = collections.deque()
+        self.first = 0  # number of the oldest line in memory
+        self.segments: list[tuple[int, int, str]] = []  # (first, end, path)
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.first + len(self.memory)
+
+    def append(self, line: str) -> int:
+        """Adds a line, returns its number"""
+        with self.lock:
+            self.memory.append(line)
+            if len(self.memory) > self.max_lines:
+                self._spill()
+            return self.first + len(self.memory) - 1
+
+    def _spill(self) -> None:
+        os.makedirs(self.spill_dir, exist_ok=True)
+        count = min(self.segment_lines, len(self.memory))
+        path = os.path.join(self.spill_dir, f"segment-{self.first:09d}.log.gz")
+        with gzip.open(path, mode="wt", encoding="utf-8") as file:
+            for _ in range(count):
+                file.write(self.memory.popleft() + "\n")
+        self.segments.append((self.first, self.first + count, path))
+        self.first += count
+
+    def lines(self, start: int = 0, end: int | None = None) -> Iterator[str]:
+        """Lines start..end-1"""
+        with self.lock:
+            segments = list(self.segments)
+            first = self.first
+            memory = list(self.memory)
+        end = first + len(memory) if end is None else end
+        for seg_first, seg_end, path in segments:
+            if seg_end <= start or seg_first >= end:
+                continue
+            with gzip.open(path, mode="rt", encoding="utf-8") as file:
+                for number, line in enumerate(file, seg_first):
+                    if start <= number < end:
+                        yield line.rstrip("\n")
+        for number, line in enumerate(memory, first):
+            if start <= number < end:
+                yield line
+
+
+def log_file_name(key: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._#-]", "_", key) + ".log"
+
+
+class LogcatCapture:
+    """Streams the logcat of one device while the tests run, filtered and sliced per test.
+
+    The app log goes to output_dir/logcat/app.log and every test's slice to
+    output_dir/logcat/<class>#<name>.log when the capture stops."""
+
+    def __init__(
+        self,
+        serial: str,
+        output_dir: str,
+        packages: Iterable[str] = (APP_PACKAGE_NAME, APP_PACKAGE_TEST_NAME),
+        tags: Iterable[str] = (TEST_RUNNER_TAG,),
+        max_lines: int = 10000,
+    ) -> None:
+        self.serial = serial
+        self.log_dir = os.path.join(output_dir, "logcat")
+        self.filter = LogcatFilter(packages, tags)
+        self.buffer = LogBuffer(
+            os.path.join(self.log_dir, "segments"), max_lines=max_lines
+        )
+        self.tests: dict[str, list[int | None]] = (
+            {}
+        )  # "class#name" -> [first line, end line]
+        self.process: subprocess.Popen | None = None
+        self.thread: threading.Thread | None = None
+        self.streaming = threading.Event()
+        self.last_data = time.monotonic()
+
+    def start(self, timeout: float = 5.0) -> LogcatCapture:
+        """Starts logcat, returns once it streams (or after timeout)"""
+        shutil.rmtree(
+            self.buffer.spill_dir, ignore_errors=True
+        )  # left over from an earlier run
+        # -T 1: the last entry already logged, then everything new
+        self.process = subprocess.Popen(  # pylint: disable=consider-using-with
+            ["adb", "-s", self.serial, "logcat", "-B", "-T", "1"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            start_new_session=POSIX,
+        )
+        self.thread = threading.Thread(
+            target=self._read,
+            args=(self.process,),
+            name=f"logcat-{self.serial}",
+            daemon=True,
+        )
+        self.thread.start()
+        self.streaming.wait(timeout)
+        return self
+
+    def _read(self, process: subprocess.Popen) -> None:
+        assert process.stdout is not None
+        parser = LogcatParser()
+        while True:
+            data = process.stdout.read1(64 * 1024)  # type: ignore[attr-defined]
+            if not data:
+                break
+            self.last_data = time.monotonic()
+            self.streaming.set()
+            for entry in parser.feed(data):
+                self.handle(entry)
+
+    def handle(self, entry: LogEntry) -> None:
+        if not self.filter.matches(entry):
+            return
+        number = self.buffer.append(entry.format())
+        if entry.tag != TEST_RUNNER_TAG:
+            return
+        started = TEST_STARTED.match(entry.message)
+        if started:
+            self.tests[f"{started.group(2)}#{started.group(1)}"] = [number, None]
+            return
+        finished = TEST_FINISHED.match(entry.message)
+        key = f"{finished.group(2)}#{finished.group(1)}" if finished else ""
+        if key in self.tests:
+            self.tests[key][1] = number + 1
+
+    def test_log(self, key: str) -> list[str]:
+        """The lines logged while the test ran, up to its finished marker"""
+        first, end = self.tests[key]
+        return list(self.buffer.lines(first or 0, end))
+
+    def stop(self, settle: float = 0.3, timeout: float = 3.0) -> None:
+        """Stops logcat once the stream has been quiet for settle seconds (the tail lags behind)"""
+        if self.process is None:
+            return
+        deadline = time.monotonic() + timeout
+        while (
+            self.process.poll() is None
+            and time.monotonic() < deadline
+            and time.monotonic() - self.last_data < settle
+        ):
+            time.sleep(0.05)
+        kill_process_tree(self.process)
+        self.process.wait()
+        if self.thread is not None:
+            self.thread.join(timeout)
+        self.process = None
+
+    def write(self) -> dict[str, str]:
+        """Writes app.log and the per-test logs, returns test -> path"""
+        os.makedirs(self.log_dir, exist_ok=True)
+        with open(
+            os.path.join(self.log_dir, "app.log"), encoding="utf-8", mode="w"
+        ) as file:
+            file.writelines(line + "\n" for line in self.buffer.lines())
+        out = {}
+        for key in self.tests:
+            path = os.path.join(self.log_dir, log_file_name(key))
+            with open(path, encoding="utf-8", mode="w") as file:
+                file.write("".join(line + "\n" for line in self.test_log(key)))
+            out[key] = path
+        return out
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.stop()
+        self.write()
@@ -0,0 +1,218 @@
+"""
+Log pumps drain the output pipe of long-running children (emulator, gradle, logcat) on a
+background thread. Without a reader the child blocks once the 64 KiB pipe buffer is full.
+Lines go to a bounded ring buffer and optionally a rotating file, and pattern triggers let
+callers wait for a line (e.g. boot completed) instead of polling adb.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import subprocess
+import threading
+import time
+from collections import deque
+from typing import IO, Pattern, Sequence
+
+from android_tester.aio import POSIX, kill_process_tree
+
+BOOT_COMPLETED = r"Boot completed|boot completed"
+ANR = r"ANR in "
+BUILD_FAILED = r"BUILD FAILED|FAILURE: Build failed"
+
+
+class RotatingFile:
+    """Append-only text file rotated to name.1 .. name.N when it grows past max_bytes"""
+
+    def __init__(
+        self, path: str, max_bytes: int = 10 * 1024 * 1024, backup_count: int = 3
+    ) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.file = self.open()
+
+    def open(self) -> IO[str]:
+        """The file is kept open until close(), it is written line by line"""
+        return open(self.path, encoding="utf-8", mode="w")
+
+    def write(self, line: str) -> None:
+        self.file.write(line)
+        if self.max_bytes and self.file.tell() >= self.max_bytes:
+            self.rotate()
+
+    def rotate(self) -> None:
+        self.file.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        self.file = self.open()
+
+    def flush(self) -> None:
+        self.file.flush()
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class Trigger:  # pylint: disable=too-few-public-methods
+    """Set once a line matches the pattern"""
+
+    def __init__(self, pattern: str | Pattern[str]) -> None:
+        self.regex = re.compile(pattern) if isinstance(pattern, str) else pattern
+        self.event = threading.Event()
+        self.line: str | None = None
+        self.at: float | None = None  # time.monotonic() of the match
+
+    def check(self, line: str) -> None:
+        if not self.event.is_set() and self.regex.search(line):
+            self.line = line
+            self.at = time.monotonic()
+            self.event.set()
+
+
+class LogPump:
+    """Reads a child's output stream until EOF on a daemon thread"""
+
+    def __init__(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self,
+        stream: IO[bytes],
+        name: str,
+        max_lines: int = 2000,
+        log_path: str | None = None,
+        max_bytes: int = 10 * 1024 * 1024,
+        echo: bool = False,
+    ) -> None:
+        self.stream = stream
+        self.name = name
+        self.lines: deque[str] = deque(maxlen=max_lines)
+        self.file = RotatingFile(log_path, max_bytes=max_bytes) if log_path else None
+        self.log_path = log_path
+        self.echo = echo
+        self.triggers: list[Trigger] = []
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        self.thread = threading.Thread(
+            target=self._run, name=f"logpump-{name}", daemon=True
+        )
+
+    @classmethod
+    def attach(
+        cls,
+        process: subprocess.Popen,
+        name: str,
+        triggers: Sequence[Trigger] = (),
+        **kwargs,
+    ) -> LogPump:
+        """Starts pumping the stdout of a process started with stdout=PIPE.
+
+        triggers are armed before the first line is read, so their match time is exact.
+        """
+        assert process.stdout is not None, "process must be started with stdout=PIPE"
+        pump = cls(process.stdout, name, **kwargs)
+        pump.triggers.extend(triggers)
+        return pump.start()
+
+    def start(self) -> LogPump:
+        self.thread.start()
+        return self
+
+    def _run(self) -> None:
+        try:
+            for raw in iter(self.stream.readline, b""):
+                line = raw.decode("utf-8", "replace")
+                with self.lock:
+                    self.lines.append(line.rstrip("\n"))
+                    triggers = list(self.triggers)
+                for trigger in triggers:
+                    trigger.check(line)
+                if self.file is not None:
+                    self.file.write(line)
+                if self.echo:
+                    print(f"[{self.name}] {line}", end="")
+        except (OSError, ValueError):
+            pass  # stream closed under us
+        finally:
+            if self.file is not None:
+                self.file.close()
+            self.done.set()
+
+    def add_trigger(self, pattern: str | Pattern[str]) -> Trigger:
+        """Returns a trigger that fires on the next (or an already buffered) matching line"""
+        trigger = Trigger(pattern)
+        with self.lock:
+            for line in self.lines:
+                trigger.check(line)
+            self.triggers.append(trigger)
+        return trigger
+
+    def wait_for(
+        self, pattern: str | Pattern[str], timeout: float | None = None
+    ) -> str | None:
+        """Waits for a matching line, returns it or None on timeout or end of stream"""
+        trigger = self.add_trigger(pattern)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not trigger.event.wait(0.1):
+            if self.done.is_set():
+                return trigger.line
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+        return trigger.line
+
+    def tail(self, count: int = 50) -> list[str]:
+        with self.lock:
+            return list(self.lines)[-count:]
+
+    def print_tail(self, count: int = 50) -> None:
+        """Prints the last lines, used when something failed"""
+        print(
+            f"----- last {count} lines of {self.name}"
+            + (f" (full log: {self.log_path})" if self.log_path else "")
+        )
+        for line in self.tail(count):
+            print(line)
+        print("-----")
+
+    def join(self, timeout: float | None = None) -> None:
+        self.thread.join(timeout)
+
+
+def run_logged(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    argv: list[str],
+    name: str,
+    log_path: str | None = None,
+    cwd: str | None = None,
+    env: dict[str, str] | None = None,
+    timeout: float | None = None,
+    tail_on_failure: int = 50,
+    triggers: Sequence[Trigger] = (),
+    echo: bool = False,
+) -> tuple[int, LogPump]:
+    """Runs a command with its output pumped, prints the tail of the output if it fails"""
+    print(f"Executing:\n  {subprocess.list2cmdline(argv)}\n  with cwd={cwd}")
+    process = subprocess.Popen(  # pylint: disable=consider-using-with
+        argv,
+        cwd=cwd,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        start_new_session=POSIX,
+    )
+    pump = LogPump.attach(
+        process, name, triggers=triggers, log_path=log_path, echo=echo
+    )
+    try:
+        rtn = process.wait(timeout=timeout)
+    except BaseException:
+        kill_process_tree(process)
+        process.wait()
+        raise
+    pump.join()
+    if rtn != 0 and tail_on_failure and not echo:
+        pump.print_tail(tail_on_failure)
+    return rtn, pump
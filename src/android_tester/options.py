@@ -0,0 +1,90 @@
+"""
+Options of the test command, shared by the cli, android_tests and the daemon. Like cli it
+only imports argparse and env.
+"""
+
+import argparse
+
+from android_tester.env import DEVICE_OUTPUT_ROOT, OUTPUT_DIR_ENV
+
+
+def create_argparser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="android-tester [test]",
+        description="Run Android tests",
+        epilog=(
+            "other commands: build, install [--serial S] (release APK), uninstall [pattern], "
+            "devices (live device list), "
+            "flakes [--all] [--release TEST] (flaky test history and quarantine), "
+            "daemon start|stop|status (keep devices and the emulator warm between runs). "
+            "--no-daemon runs a command in this process even when the daemon is running."
+        ),
+    )
+    parser.add_argument(
+        "-a",
+        "--api",
+        help="API Level",
+        type=int,
+        default=33,
+        choices=[28, 29, 30, 31, 32, 33],
+    )
+    parser.add_argument(
+        "--max-parallel",
+        help="Maximum number of devices to test at the same time (default: all)",
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        "--emulators",
+        help="Boot this many emulators and shard the tests across them (no physical devices only)",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--no-snapshot",
+        help="Always cold boot the emulator instead of using the clean quickboot snapshot",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--reuse-emulator",
+        help=(
+            "Reuse a healthy running emulator (reset to a clean state) instead of booting "
+            "a new one, and leave the emulator running after the run for the next one "
+            "(always on in the daemon)"
+        ),
+        action="store_true",
+    )
+    parser.add_argument(
+        "--reset-snapshot",
+        help=(
+            "When reusing an emulator, load its clean quickboot snapshot "
+            "instead of uninstalling the app in place"
+        ),
+        action="store_true",
+    )
+    parser.add_argument(
+        "--report-dir",
+        help=(
+            "Where to write report.json and TEST-report.xml "
+            f"(default: ${OUTPUT_DIR_ENV} or {DEVICE_OUTPUT_ROOT})"
+        ),
+        default=None,
+    )
+    parser.add_argument(
+        "--retries",
+        help=(
+            "Run each failed test again up to this many times on a free device, "
+            "a test that then passes is flaky (default: 2, 0: never)"
+        ),
+        type=int,
+        default=2,
+    )
+    parser.add_argument(
+        "--direct",
+        help=(
+            "Install the APKs built once and run am instrument directly "
+            "instead of gradle connectedCheck per device"
+        ),
+        action="store_true",
+    )
+    return parser
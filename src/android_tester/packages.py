@@ -0,0 +1,169 @@
+"""
+Package index. The packages of a device are read with a single
+`pm list packages -f -U --show-versioncode` (name, APK path, versionCode and uid) and kept
+until one of our own installs or uninstalls on that device invalidates them. Lookups by
+prefix use the sorted names, glob patterns are matched with fnmatch. Uninstalling many
+packages is one shell command.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import bisect
+import fnmatch
+import shlex
+import time
+from dataclasses import dataclass, field
+
+from android_tester import aio
+from android_tester.ttl_cache import TtlCache
+
+LIST_PACKAGES = "pm list packages -f -U --show-versioncode"
+LIST_PACKAGES_FALLBACK = (
+    "pm list packages -f"  # before Android 9 there is no --show-versioncode
+)
+GLOB_CHARS = "*?["
+
+
+@dataclass
+class PackageInfo:
+    """A package installed on the device, the fields pm list packages printed"""
+
+    name: str
+    path: str = ""
+    version_code: int | None = None
+    uid: int | None = None
+
+
+def parse_package_list(output: str) -> dict[str, PackageInfo]:
+    """Parses `package:<apk path>=<name> versionCode:<n> uid:<n>` lines.
+
+    The extra fields are optional."""
+    out: dict[str, PackageInfo] = {}
+    for line in output.splitlines():
+        line = line.strip()
+        if not line.startswith("package:"):
+            continue
+        first, *fields = line[len("package:") :].split()
+        path, _, name = first.rpartition("=")  # the path itself may contain '='
+        info = PackageInfo(name=name, path=path)
+        for item in fields:
+            key, _, value = item.partition(":")
+            if key == "versionCode" and value.isdigit():
+                info.version_code = int(value)
+            elif key == "uid" and value.isdigit():
+                info.uid = int(value)
+        out[name] = info
+    return out
+
+
+@dataclass
+class DevicePackages:
+    """The packages of one device, names sorted for prefix lookups"""
+
+    serial: str
+    packages: dict[str, PackageInfo]
+    fetched_at: float
+    names: list[str] = field(default_factory=list)
+
+    def __post_init__(self) -> None:
+        self.names = sorted(self.packages)
+
+    def with_prefix(self, prefix: str) -> list[PackageInfo]:
+        start = bisect.bisect_left(self.names, prefix)
+        out = []
+        for name in self.names[start:]:
+            if not name.startswith(prefix):
+                break
+            out.append(self.packages[name])
+        return out
+
+    def find(self, pattern: str) -> list[PackageInfo]:
+        """Packages matching a glob pattern (`com.example.*`), or starting with pattern"""
+        if any(char in pattern for char in GLOB_CHARS):
+            return [self.packages[name] for name in fnmatch.filter(self.names, pattern)]
+        return self.with_prefix(pattern)
+
+
+async def fetch_packages(serial: str) -> DevicePackages:
+    """One package listing of the device"""
+    output = await aio.adb_shell(serial, LIST_PACKAGES)
+    if "package:" not in output:
+        output = await aio.adb_shell(serial, LIST_PACKAGES_FALLBACK)
+    return DevicePackages(
+        serial=serial, packages=parse_package_list(output), fetched_at=time.monotonic()
+    )
+
+
+class PackageIndex(TtlCache[DevicePackages]):
+    """DevicePackages per serial, kept until invalidated (or older than ttl, for changes made
+    behind our back)"""
+
+    def __init__(self, ttl: float = 300.0) -> None:
+        super().__init__(ttl)
+
+    async def get(self, serial: str) -> DevicePackages:
+        entry = self.cached(serial)
+        if entry is None:
+            entry = await fetch_packages(serial)
+            self.put(entry)
+        return entry
+
+    async def find(self, serial: str, pattern: str) -> list[PackageInfo]:
+        return (await self.get(serial)).find(pattern)
+
+
+PACKAGES = PackageIndex()
+aio.PACKAGE_LISTENERS.append(PACKAGES.invalidate)
+
+
+async def list_packages(serial: str, match_str: str | None = None) -> list[str]:
+    """Lists the packages on the device, from the package index while it is valid"""
+    names = (await PACKAGES.get(serial)).names
+    if match_str:
+        names = [name for name in names if match_str in name]
+    return names
+
+
+async def uninstall_all(serial: str, names: list[str]) -> list[str]:
+    """Uninstalls the packages with one shell command, returns the ones that were removed"""
+    if not names:
+        return []
+    cmd = "; ".join(f"pm uninstall {shlex.quote(name)}" for name in names)
+    print(f"Running: adb -s {serial} shell {cmd}")
+    try:
+        output = await aio.adb_shell(serial, cmd)
+    finally:
+        PACKAGES.invalidate(serial)
+    # pm prints one Success or Failure [...] line per package, in order
+    results = [
+        line.strip()
+        for line in output.splitlines()
+        if line.strip().startswith(("Success", "Failure"))
+    ]
+    for name, result in zip(names, results):
+        print(f"{serial}: uninstall {name}: {result}")
+    return [
+        name for name, result in zip(names, results) if result.startswith("Success")
+    ]
+
+
+def uninstall_matching(serials: list[str], pattern: str) -> dict[str, list[str]]:
+    """Uninstalls the packages matching pattern (prefix or glob) from all the devices concurrently.
+
+    Returns serial -> uninstalled packages, a device that can't be reached gets an empty list.
+    """
+
+    async def each(serial: str) -> list[str]:
+        try:
+            return await uninstall_all(
+                serial, [info.name for info in await PACKAGES.find(serial, pattern)]
+            )
+        except Exception as e:  # pylint: disable=broad-except
+            print(f"{serial}: uninstall failed: {e}")
+            return []
+
+    async def run_all() -> list[list[str]]:
+        return await asyncio.gather(*(each(serial) for serial in serials))
+
+    return dict(zip(serials, aio.run_sync(run_all())))
@@ -0,0 +1,96 @@
+"""
+Device property snapshots: one `getprop` per device returns every property, which is parsed
+and cached with a TTL instead of asking for one property per adb call.
+"""
+
+from __future__ import annotations
+
+import re
+import time
+from dataclasses import dataclass, field
+
+from android_tester import aio
+from android_tester.ttl_cache import TtlCache
+
+GETPROP_LINE = re.compile(r"^\[(?P<key>[^\]]+)\]: \[(?P<value>.*)\]\s*$")
+
+
+def parse_getprop(text: str) -> dict[str, str]:
+    """Parses the `[key]: [value]` dump of getprop"""
+    props = {}
+    for line in text.splitlines():
+        match = GETPROP_LINE.match(line)
+        if match:
+            props[match.group("key")] = match.group("value")
+    return props
+
+
+@dataclass
+class DeviceProps:
+    """All properties of one device at fetched_at (time.monotonic())"""
+
+    serial: str
+    props: dict[str, str] = field(default_factory=dict)
+    fetched_at: float = 0.0
+
+    def get(self, key: str, default: str = "") -> str:
+        return self.props.get(key, default)
+
+    @property
+    def avd_name(self) -> str:
+        return self.get("ro.boot.qemu.avd_name") or self.get("ro.kernel.qemu.avd_name")
+
+    @property
+    def model(self) -> str:
+        return self.get("ro.product.model")
+
+    @property
+    def api_level(self) -> int | None:
+        value = self.get("ro.build.version.sdk")
+        return int(value) if value.isdigit() else None
+
+    @property
+    def abi(self) -> str:
+        return self.get("ro.product.cpu.abi")
+
+    @property
+    def boot_completed(self) -> bool:
+        return self.get("sys.boot_completed") == "1"
+
+
+async def read_props(serial: str) -> DeviceProps:
+    """One getprop for every property of the device, stored in the shared cache"""
+    text = await aio.adb_shell(serial, "getprop")
+    props = DeviceProps(
+        serial=serial, props=parse_getprop(text), fetched_at=time.monotonic()
+    )
+    PROPS.put(props)
+    return props
+
+
+def fetch_props(serial: str) -> DeviceProps:
+    """Runs a single getprop on the device"""
+    return aio.run_sync(read_props(serial))
+
+
+class PropertyCache(TtlCache[DeviceProps]):
+    """TTL cache of DeviceProps per serial"""
+
+    def __init__(self, ttl: float = 30.0) -> None:
+        super().__init__(ttl)
+
+    def get(self, serial: str, max_age: float | None = None) -> DeviceProps | None:
+        """Returns the properties of the device, None if they can't be read (offline device)"""
+        entry = self.cached(serial, max_age)
+        if entry is not None:
+            return entry
+        try:
+            entry = fetch_props(serial)
+        except Exception as e:
+            print(f"Error reading properties of {serial}: {e}")
+            return None
+        self.put(entry)
+        return entry
+
+
+PROPS = PropertyCache()
@@ -0,0 +1,188 @@
+"""
+Boot readiness engine. Instead of fixed sleeps the device is polled for the signals that
+make it usable, in order: emulator console port, adb device state, sys.boot_completed, boot
+animation stopped, package manager and settings provider answering. Polls back off
+exponentially and share one long-lived shell, and the latency of every signal is recorded.
+"""
+
+from __future__ import annotations
+
+import socket
+import subprocess
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable
+
+from android_tester import aio
+from android_tester.report import Phase, get_report
+from android_tester.session import ShellSession
+
+CONSOLE_PORT = "console_port"
+WAIT_FOR_DEVICE = "wait_for_device"
+BOOT_COMPLETED = "boot_completed"
+BOOTANIM = "bootanim"
+PACKAGE_MANAGER = "package_manager"
+SETTINGS = "settings"
+SIGNALS = [
+    CONSOLE_PORT,
+    WAIT_FOR_DEVICE,
+    BOOT_COMPLETED,
+    BOOTANIM,
+    PACKAGE_MANAGER,
+    SETTINGS,
+]
+
+FIRST_DELAY = 0.05
+MAX_DELAY = 2.0
+
+
+@dataclass
+class Readiness:
+    """Outcome of waiting for a device, latencies are seconds from the start of the wait"""
+
+    serial: str
+    ready: bool = False
+    failed_signal: str | None = None
+    latencies: dict[str, float] = field(default_factory=dict)
+    durations: dict[str, float] = field(default_factory=dict)
+
+    def summary(self) -> str:
+        signals = ", ".join(
+            f"{name} {latency:.2f}s" for name, latency in self.latencies.items()
+        )
+        if self.ready:
+            return f"{self.serial} ready ({signals})"
+        return f"{self.serial} not ready, waiting for {self.failed_signal} ({signals})"
+
+
+def backoff_poll(
+    check: Callable[[], bool], deadline: float, wake: threading.Event | None = None
+) -> bool:
+    """Calls check until it returns True, sleeping 50 ms doubling up to 2 s in between.
+
+    wake (e.g. a log pump trigger) cuts a sleep short. Returns False at the deadline."""
+    delay = FIRST_DELAY
+    while True:
+        try:
+            if check():
+                return True
+        except (OSError, TimeoutError, subprocess.SubprocessError):
+            pass  # not reachable yet
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        wait = min(delay, remaining)
+        if wake is not None and not wake.is_set():
+            if wake.wait(wait):
+                delay = FIRST_DELAY  # the awaited event happened, look closely again
+                continue
+        else:
+            time.sleep(wait)
+        delay = min(delay * 2, MAX_DELAY)
+
+
+def console_port_open(port: int) -> bool:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.settimeout(0.5)
+        return sock.connect_ex(("127.0.0.1", port)) == 0
+
+
+def settings_ready(output: str) -> bool:
+    return "Exception" not in output and "Can't find service" not in output
+
+
+class ReadinessEngine:
+    """Waits for one device to become usable"""
+
+    def __init__(
+        self,
+        serial: str,
+        console_port: int | None = None,
+        boot_signal: threading.Event | None = None,
+    ) -> None:
+        self.serial = serial
+        self.console_port = console_port
+        self.boot_signal = boot_signal
+
+    def checks(
+        self, shell: ShellSession, deadline: float
+    ) -> list[tuple[str, Callable[[], bool]]]:
+        def sh(cmd: str) -> tuple[int, str]:
+            return shell.run(
+                cmd, timeout=max(min(deadline - time.monotonic(), 10), 0.1)
+            )
+
+        def wait_for_device() -> bool:
+            timeout = max(deadline - time.monotonic(), 0.1)
+            return (
+                aio.run_sync(
+                    aio.run(
+                        ["adb", "-s", self.serial, "wait-for-device"], timeout=timeout
+                    )
+                ).returncode
+                == 0
+            )
+
+        def settings() -> bool:
+            rtn, output = sh("settings get global device_provisioned")
+            return rtn == 0 and settings_ready(output)
+
+        checks: list[tuple[str, Callable[[], bool]]] = []
+        if self.console_port is not None:
+            port = self.console_port
+            checks.append((CONSOLE_PORT, lambda: console_port_open(port)))
+        checks += [
+            (WAIT_FOR_DEVICE, wait_for_device),
+            (
+                BOOT_COMPLETED,
+                lambda: sh("getprop sys.boot_completed")[1].strip() == "1",
+            ),
+            # Devices without a boot animation service report nothing.
+            (
+                BOOTANIM,
+                lambda: sh("getprop init.svc.bootanim")[1].strip() in ("stopped", ""),
+            ),
+            (
+                PACKAGE_MANAGER,
+                lambda: sh("pm path android")[1].strip().startswith("package:"),
+            ),
+            (SETTINGS, settings),
+        ]
+        return checks
+
+    def wait(self, timeout: float = 300) -> Readiness:
+        """Returns as soon as every signal is up.
+
+        Or at the timeout, with the signal that was missing."""
+        start = time.monotonic()
+        deadline = start + timeout
+        out = Readiness(serial=self.serial)
+        with ShellSession(self.serial) as shell:
+            for name, check in self.checks(shell, deadline):
+                signal_start = time.monotonic()
+                wake = self.boot_signal if name == BOOT_COMPLETED else None
+                ok = backoff_poll(check, deadline, wake)
+                end = time.monotonic()
+                get_report().add(Phase(name, self.serial, signal_start, end, ok=ok))
+                out.durations[name] = end - signal_start
+                if not ok:
+                    out.failed_signal = name
+                    print(out.summary())
+                    return out
+                out.latencies[name] = end - start
+        out.ready = True
+        print(out.summary())
+        return out
+
+
+def wait_until_ready(
+    serial: str,
+    timeout: float = 300,
+    console_port: int | None = None,
+    boot_signal: threading.Event | None = None,
+) -> Readiness:
+    """Waits for the device to be usable, see ReadinessEngine"""
+    return ReadinessEngine(
+        serial, console_port=console_port, boot_signal=boot_signal
+    ).wait(timeout)
@@ -0,0 +1,255 @@
+"""
+Run report: every phase of a run (sdk install, emulator boot, uninstall, build, test
+execution, teardown) is recorded per device with monotonic timestamps, together with the
+device results and test outcomes, and written as JSON, JUnit XML and a summary table.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import json
+import os
+import threading
+import time
+import xml.etree.ElementTree as ET
+from dataclasses import asdict, dataclass
+from typing import Any, Iterator
+
+from android_tester.junit import COUNTERS, find_junit_xml, merge_junit_xml, read_suites
+from android_tester.scheduler import DeviceResult, device_output_dir
+
+# Canonical order of the phases in the summary table
+PHASES = [
+    "sdk_install",
+    "build",
+    "reuse",
+    "avd_boot",
+    "console_port",
+    "wait_for_device",
+    "boot_completed",
+    "bootanim",
+    "package_manager",
+    "settings",
+    "uninstall",
+    "install",
+    "test",
+    "retry",
+    "teardown",
+]
+RUN = "(run)"  # serial of the phases not tied to a device
+
+
+@dataclass
+class Phase:
+    """One timed step, start and end are time.monotonic()"""
+
+    name: str
+    serial: str
+    start: float
+    end: float
+    ok: bool = True
+    detail: str = ""
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+def count_tests(paths: list[str]) -> dict[str, int]:
+    """tests, failures, errors and skipped summed over JUnit XML files"""
+    totals = {name: 0 for name in COUNTERS}
+    for path in paths:
+        try:
+            suites = read_suites(path)
+        except (OSError, ET.ParseError):
+            continue
+        for suite in suites:
+            for name in COUNTERS:
+                totals[name] += int(suite.get(name, "0") or 0)
+    return totals
+
+
+class RunReport:
+    """Collects phases and results, thread safe"""
+
+    def __init__(self) -> None:
+        self.started = time.monotonic()
+        self.started_wall = time.time()
+        self.finished: float | None = None
+        self.phases: list[Phase] = []
+        self.results: list[DeviceResult] = []
+        self.tests: dict[str, dict[str, int]] = {}
+        self.junit_files: list[str] = []
+        self.host: dict[str, Any] | None = None  # the emulator plan, see host
+        self.lock = threading.Lock()
+
+    def add(self, timed: Phase) -> None:
+        with self.lock:
+            self.phases.append(timed)
+
+    @contextlib.contextmanager
+    def phase(
+        self, name: str, serial: str | None = None, detail: str = ""
+    ) -> Iterator[None]:
+        """Times the body of the with block, a raised exception marks the phase failed"""
+        start = time.monotonic()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self.add(Phase(name, serial or RUN, start, time.monotonic(), ok, detail))
+
+    def set_host(self, plan: dict[str, Any]) -> None:
+        """Records the host resources and how many emulators they allowed"""
+        with self.lock:
+            self.host = plan
+
+    def add_results(
+        self, results: list[DeviceResult], output_root: str | None = None
+    ) -> None:
+        """Adds the device results and the test outcomes found in their JUnit XML"""
+        with self.lock:
+            self.results.extend(results)
+        for result in results:
+            files = find_junit_xml(device_output_dir(result.serial, root=output_root))
+            with self.lock:
+                self.junit_files.extend(files)
+                self.tests[result.serial] = count_tests(files)
+
+    def finish(self) -> None:
+        self.finished = time.monotonic()
+
+    @property
+    def duration(self) -> float:
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def ok(self) -> bool:
+        return all(result.ok for result in self.results) and all(
+            phase.ok for phase in self.phases
+        )
+
+    def serials(self) -> list[str]:
+        out = [RUN] if any(phase.serial == RUN for phase in self.phases) else []
+        for serial in [phase.serial for phase in self.phases] + [
+            result.serial for result in self.results
+        ]:
+            if serial not in out:
+                out.append(serial)
+        return out
+
+    def phase_totals(self, serial: str) -> dict[str, float]:
+        totals: dict[str, float] = {}
+        for timed in self.phases:
+            if timed.serial == serial:
+                totals[timed.name] = totals.get(timed.name, 0.0) + timed.duration
+        return totals
+
+    def to_dict(self) -> dict[str, Any]:
+        with self.lock:
+            phases = list(self.phases)
+            results = list(self.results)
+        out: dict[str, Any] = {
+            "started": self.started_wall,
+            "duration": self.duration,
+            "ok": self.ok,
+            "phases": [
+                dict(
+                    asdict(phase),
+                    start=phase.start - self.started,
+                    end=phase.end - self.started,
+                    duration=phase.duration,
+                )
+                for phase in phases
+            ],
+            "devices": [
+                {
+                    "serial": result.serial,
+                    "ok": result.ok,
+                    "returncode": result.returncode,
+                    "duration": result.duration,
+                    "error": result.error,
+                    "log_path": result.log_path,
+                    "extra": result.extra,
+                    "tests": self.tests.get(result.serial, {}),
+                }
+                for result in results
+            ],
+        }
+        if self.host is not None:
+            out["host"] = self.host
+        return out
+
+    def summary_table(self) -> str:
+        """One row per device, one column per phase (seconds)"""
+        names = [
+            name for name in PHASES if any(phase.name == name for phase in self.phases)
+        ]
+        names += sorted({phase.name for phase in self.phases} - set(names))
+        results = {result.serial: result for result in self.results}
+        header = ["device"] + names + ["tests", "status"]
+        rows = [header]
+        for serial in self.serials():
+            totals = self.phase_totals(serial)
+            tests = self.tests.get(serial)
+            result = results.get(serial)
+            row = [serial] + [
+                f"{totals[name]:.1f}" if name in totals else "" for name in names
+            ]
+            if tests:
+                passed = (
+                    tests["tests"]
+                    - tests["failures"]
+                    - tests["errors"]
+                    - tests["skipped"]
+                )
+                row.append(f"{passed}/{tests['tests']}")
+            else:
+                row.append("")
+            row.append("" if result is None else ("PASSED" if result.ok else "FAILED"))
+            rows.append(row)
+        widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+        lines = [
+            "  ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip()
+            for row in rows
+        ]
+        lines.insert(1, "  ".join("-" * width for width in widths))
+        if self.host is not None:
+            lines.append(f"Host: {self.host['summary']}")
+        lines.append(
+            f"Total: {self.duration:.1f}s, {'PASSED' if self.ok else 'FAILED'}"
+        )
+        return "\n".join(lines)
+
+    def write(self, report_dir: str) -> dict[str, str]:
+        """Writes report.json and TEST-report.xml, returns their paths"""
+        os.makedirs(report_dir, exist_ok=True)
+        json_path = os.path.join(report_dir, "report.json")
+        with open(json_path, encoding="utf-8", mode="w") as file:
+            json.dump(self.to_dict(), file, indent=2)
+        xml_path = os.path.join(report_dir, "TEST-report.xml")
+        merge_junit_xml(self.junit_files, xml_path)
+        return {"json": json_path, "junit": xml_path}
+
+
+_REPORT = RunReport()
+
+
+def get_report() -> RunReport:
+    """The report of the current run"""
+    return _REPORT
+
+
+def start_report() -> RunReport:
+    """Starts a new report, phases recorded from now on go into it"""
+    global _REPORT  # pylint: disable=global-statement
+    _REPORT = RunReport()
+    return _REPORT
+
+
+def phase(
+    name: str, serial: str | None = None, detail: str = ""
+) -> contextlib.AbstractContextManager[None]:
+    """Times a phase of the current run"""
+    return get_report().phase(name, serial, detail)
@@ -0,0 +1,291 @@
+"""
+Test-level retry. After a run the failed tests are read from the JUnit XML of every device
+and only those run again, one `am instrument -e class Class#method` each, on whichever
+device of the run is free, up to retries times. A test that passes when retried is flaky,
+one that keeps failing is a real failure. The outcomes go into the flake history (see
+flakes). A device whose failures were all flaky or quarantined tests passes.
+"""
+
+from __future__ import annotations
+
+import functools
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Sequence
+
+from android_tester import aio
+from android_tester.flakes import FlakeStore
+from android_tester.instrument import TEST_APKS, install_test_apks, run_instrumentation
+from android_tester.junit import find_junit_xml, read_testcases
+from android_tester.report import Phase, get_report
+from android_tester.scheduler import (
+    DeviceResult,
+    device_output_dir,
+    run_on_devices,
+    safe_name,
+)
+
+
+def test_id(class_name: str, name: str) -> str:
+    """The id of a test in the flake history, also what `am instrument -e class` takes"""
+    return f"{class_name}#{name}"
+
+
+@dataclass
+class RetryResult:
+    """What the retries of a run found"""
+
+    failed: dict[str, str] = field(
+        default_factory=dict
+    )  # test id -> serial it failed on
+    attempts: dict[str, list[tuple[str, str]]] = field(
+        default_factory=dict
+    )  # test id -> (serial, status) per retry
+    quarantined: dict[str, str] = field(
+        default_factory=dict
+    )  # test id -> reason, all of them
+    newly_quarantined: list[str] = field(default_factory=list)
+    released: list[str] = field(default_factory=list)
+
+    @property
+    def flaky(self) -> list[str]:
+        """Failed, then passed when retried"""
+        return [
+            test
+            for test in self.failed
+            if any(status == "passed" for _, status in self.attempts.get(test, []))
+        ]
+
+    @property
+    def still_failing(self) -> list[str]:
+        flaky = self.flaky
+        return [test for test in self.failed if test not in flaky]
+
+    @property
+    def blocking(self) -> list[str]:
+        """The failures that fail the run"""
+        return [test for test in self.still_failing if test not in self.quarantined]
+
+    def summary(self) -> str:
+        still_failing = self.still_failing
+        ignored = len(still_failing) - len(self.blocking)
+        return (
+            f"{len(self.failed)} failed tests, {len(self.flaky)} passed when retried (flaky), "
+            f"{len(still_failing)} still failing{f' ({ignored} quarantined)' if ignored else ''}"
+        )
+
+
+def first_outcomes(
+    results: list[DeviceResult], output_root: str | None = None
+) -> dict[str, dict[str, str]]:
+    """serial -> test id -> passed, failed or skipped, from the JUnit XML of the run"""
+    out: dict[str, dict[str, str]] = {}
+    for result in results:
+        tests = out.setdefault(result.serial, {})
+        for path in find_junit_xml(device_output_dir(result.serial, root=output_root)):
+            for class_name, name, status in read_testcases(path):
+                if tests.get(test_id(class_name, name)) != "failed":
+                    tests[test_id(class_name, name)] = status
+    return out
+
+
+class Rerun:
+    """The retries of the failed tests, shared by the devices running them"""
+
+    def __init__(
+        self,
+        tests: list[str],
+        retries: int,
+        output_root: str | None,
+        apks: tuple[tuple[str, str], ...],
+        timeout: float,
+    ) -> None:
+        self.retries = retries
+        self.output_root = output_root
+        self.apks = apks
+        self.timeout = timeout
+        self.attempts: dict[str, list[tuple[str, str]]] = {test: [] for test in tests}
+        self.installed: set[str] = set()
+        self.lock = threading.Lock()
+
+    def install(self, serial: str) -> None:
+        """gradle connectedCheck uninstalls the APKs when it is done.
+
+        They go back once per device."""
+        with self.lock:
+            if serial in self.installed:
+                return
+        aio.run_sync(install_test_apks(serial, self.apks))
+        with self.lock:
+            self.installed.add(serial)
+
+    def job(self, device: Any, attempt: int, waiting: queue.Queue[str]) -> int:
+        """Runs the waiting tests on the device until the queue of the attempt is empty"""
+        self.install(device.serial)
+        log_dir = device_output_dir(
+            "retry", root=device_output_dir(device.serial, root=self.output_root)
+        )
+        while True:
+            try:
+                test = waiting.get_nowait()
+            except queue.Empty:
+                return 0
+            start = time.monotonic()
+            log_path = os.path.join(log_dir, f"{safe_name(test)}-{attempt}.log")
+            result = run_instrumentation(
+                device.serial, {"class": test}, log_path=log_path, timeout=self.timeout
+            )
+            status = "passed" if result.ok and result.count("passed") else "failed"
+            with self.lock:
+                self.attempts[test].append((device.serial, status))
+            get_report().add(
+                Phase(
+                    "retry",
+                    device.serial,
+                    start,
+                    time.monotonic(),
+                    ok=status == "passed",
+                    detail=f"{test} attempt {attempt}: {status}",
+                )
+            )
+            print(
+                f"{device.serial}: retry {attempt}/{self.retries} of {test}: {status.upper()}"
+            )
+
+    def pending(self) -> list[str]:
+        """The tests that did not pass yet"""
+        with self.lock:
+            return [
+                test
+                for test, attempts in self.attempts.items()
+                if not attempts or attempts[-1][1] != "passed"
+            ]
+
+
+def rerun(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    tests: list[str],
+    devices: Sequence[Any],
+    retries: int,
+    output_root: str | None = None,
+    apks: tuple[tuple[str, str], ...] = TEST_APKS,
+    timeout: float = 600,
+) -> dict[str, list[tuple[str, str]]]:
+    """Runs each test up to retries times until it passes, a free device takes the next test.
+
+    Returns test id -> (serial, passed or failed) per attempt."""
+    state = Rerun(tests, retries, output_root, apks, timeout)
+    for attempt in range(1, retries + 1):
+        pending = state.pending()
+        if not pending:
+            break
+        waiting: queue.Queue[str] = queue.Queue()
+        for test in pending:
+            waiting.put(test)
+        for result in run_on_devices(
+            devices, functools.partial(state.job, attempt=attempt, waiting=waiting)
+        ):
+            if not result.ok:
+                print(
+                    f"{result.serial}: could not retry tests: {result.error or result.returncode}"
+                )
+    return state.attempts
+
+
+def first_failures(
+    firsts: dict[str, dict[str, str]], out: RetryResult
+) -> dict[str, tuple[str, str]]:
+    """Adds the failed tests of the run to out, returns test id -> (serial, passed or failed)"""
+    outcomes: dict[str, tuple[str, str]] = {}
+    for serial, tests in firsts.items():
+        for test, status in tests.items():
+            if status == "failed":
+                out.failed.setdefault(test, serial)
+                outcomes[test] = (serial, "failed")
+            elif status == "passed" and test not in outcomes:
+                outcomes[test] = (serial, "passed")
+    return outcomes
+
+
+def record_outcomes(
+    out: RetryResult,
+    outcomes: dict[str, tuple[str, str]],
+    store: FlakeStore | None = None,
+) -> None:
+    """Adds the run to the flake history, the quarantine goes into out"""
+    for test in out.flaky:
+        outcomes[test] = (out.failed[test], "flaky")
+    own_store = store is None
+    store = store or FlakeStore()
+    try:
+        out.newly_quarantined, out.released = store.record(outcomes)
+        out.quarantined = store.quarantined()
+    finally:
+        if own_store:
+            store.close()
+
+
+def pass_resolved(
+    results: list[DeviceResult], firsts: dict[str, dict[str, str]], out: RetryResult
+) -> None:
+    """Passes the devices whose failures were all flaky or quarantined"""
+    resolved = set(out.flaky) | set(out.quarantined)
+    for result in results:
+        failed = [
+            test
+            for test, status in firsts.get(result.serial, {}).items()
+            if status == "failed"
+        ]
+        if not failed:
+            continue
+        result.extra["failed_tests"] = failed
+        result.extra["flaky_tests"] = [test for test in failed if test in out.flaky]
+        if (
+            not result.ok
+            and result.error is None
+            and all(test in resolved for test in failed)
+        ):
+            result.returncode = 0
+
+
+def print_outcomes(out: RetryResult) -> None:
+    if out.failed:
+        print(out.summary())
+    for test in out.flaky:
+        print(f"  flaky: {test}")
+    for test in out.still_failing:
+        print(f"  {'quarantined' if test in out.quarantined else 'failed'}: {test}")
+    for test in out.newly_quarantined:
+        print(f"Quarantined {test}: {out.quarantined.get(test, '')}")
+    for test in out.released:
+        print(f"Released {test} from quarantine")
+
+
+def retry_failures(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    results: list[DeviceResult],
+    devices: Sequence[Any],
+    retries: int = 2,
+    output_root: str | None = None,
+    apks: tuple[tuple[str, str], ...] = TEST_APKS,
+    store: FlakeStore | None = None,
+) -> RetryResult:
+    """Retries the failed tests of the run, records the outcomes and passes the devices whose
+    failures were all flaky or quarantined"""
+    firsts = first_outcomes(results, output_root)
+    out = RetryResult()
+    outcomes = first_failures(firsts, out)
+    if out.failed and retries > 0:
+        missing = [apk for apk, _ in apks if not os.path.exists(apk)]
+        if missing:
+            print(f"Not retrying the failed tests, missing: {', '.join(missing)}")
+        elif devices:
+            print(f"Retrying {len(out.failed)} failed tests on {len(devices)} devices")
+            out.attempts = rerun(
+                sorted(out.failed), devices, retries, output_root=output_root, apks=apks
+            )
+    record_outcomes(out, outcomes, store)
+    pass_resolved(results, firsts, out)
+    print_outcomes(out)
+    return out
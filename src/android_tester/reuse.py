@@ -0,0 +1,241 @@
+"""
+Emulator reuse, with --reuse-emulator and in the daemon. Instead of shutting every emulator
+down before a run and booting a new one, a running emulator is reused when it passes a
+health check: online and booted, the requested API level, the ABI and image variant of
+EMULATOR_TYPE (the latter when its AVD config can be read) and a package manager that
+answers. It is then reset to a clean state in seconds:
+the app packages are uninstalled (data cleared where that fails), all background processes
+killed and the launcher brought to the front, or the clean quickboot snapshot is loaded
+back. Only when no emulator passes is one killed and booted.
+
+Hits, misses (by reason) and the boot time saved are kept in <cache dir>/emulator_reuse.json.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import time
+from dataclasses import asdict, dataclass, field
+
+from android_tester import aio, snapshot
+from android_tester.common import Device
+from android_tester.device_watcher import get_registry
+from android_tester.env import APP_PACKAGE_NAME, cache_dir
+from android_tester.packages import PACKAGES, uninstall_all
+from android_tester.props import PROPS, read_props
+from android_tester.readiness import wait_until_ready
+from android_tester.report import RUN, Phase, get_report
+
+RESET_COMMAND = "am kill-all; input keyevent KEYCODE_HOME"
+
+
+@dataclass
+class ReuseStats:
+    """Totals over all runs that asked for an emulator to reuse"""
+
+    runs: int = 0
+    hits: int = 0
+    misses: dict[str, int] = field(default_factory=dict)  # reason -> count
+    seconds_saved: float = 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.runs if self.runs else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"Emulator reuse: {self.hits}/{self.runs} runs ({self.hit_rate:.0%}), "
+            f"~{self.seconds_saved:.0f}s of boot time saved"
+        )
+
+
+def stats_path() -> str:
+    return os.path.join(cache_dir(), "emulator_reuse.json")
+
+
+def load_stats(path: str | None = None) -> ReuseStats:
+    try:
+        with open(path or stats_path(), encoding="utf-8", mode="r") as file:
+            return ReuseStats(**json.load(file))
+    except (OSError, ValueError, TypeError):
+        return ReuseStats()
+
+
+def record(
+    hit: bool, reason: str = "", seconds_saved: float = 0.0, path: str | None = None
+) -> ReuseStats:
+    """Adds one run to the stats on disk, returns the totals"""
+    path = path or stats_path()
+    stats = load_stats(path)
+    stats.runs += 1
+    if hit:
+        stats.hits += 1
+        stats.seconds_saved = round(stats.seconds_saved + seconds_saved, 2)
+    else:
+        stats.misses[reason] = stats.misses.get(reason, 0) + 1
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, encoding="utf-8", mode="w") as file:
+        json.dump(asdict(stats), file, indent=2)
+    os.replace(tmp, path)
+    return stats
+
+
+def avd_system_image(avd_name: str) -> str | None:
+    """sdkmanager path of the AVD's system image, None if unknown.
+
+    Read from image.sysdir.1 of its config.ini."""
+    try:
+        with open(
+            os.path.join(snapshot.avd_dir(avd_name), "config.ini"),
+            encoding="utf-8",
+            mode="r",
+        ) as file:
+            for line in file:
+                key, _, value = line.partition("=")
+                if key.strip() == "image.sysdir.1":
+                    return ";".join(
+                        part
+                        for part in value.strip().replace("\\", "/").split("/")
+                        if part
+                    )
+    except OSError:
+        pass
+    return None
+
+
+async def check_health(  # pylint: disable=too-many-return-statements
+    serial: str, api: int, system_image: str, timeout: float = 10
+) -> tuple[str, str] | None:
+    """None when the emulator can be reused, otherwise (reason, detail)"""
+    try:
+        props = await read_props(serial)
+    except Exception as e:  # pylint: disable=broad-except
+        return "unresponsive", str(e)
+    if not props.boot_completed:
+        return "not_booted", "sys.boot_completed is not 1"
+    if props.api_level != api:
+        return "api", f"API {props.api_level}, {api} requested"
+    # system-images;android-30;google_apis_playstore;x86_64: the variant and ABI must match.
+    variant = system_image.split(";")[2:]
+    if props.abi and variant and props.abi != variant[-1]:
+        return "abi", f"{props.abi}, {variant[-1]} requested"
+    image = avd_system_image(props.avd_name) if props.avd_name else None
+    if image is not None and image.split(";")[2:] != variant:
+        return "image", f"{image}, {system_image} requested"
+    try:
+        output = await aio.adb_shell(serial, "pm path android", timeout=timeout)
+    except Exception as e:  # pylint: disable=broad-except
+        return "unresponsive", str(e)
+    if "package:" not in output:
+        return "package_manager", output.strip()
+    return None
+
+
+async def reset(
+    serial: str, prefix: str = APP_PACKAGE_NAME, snapshot_name: str | None = None
+) -> bool:
+    """Brings a reused emulator back to a clean state, returns whether the snapshot was loaded"""
+    if snapshot_name is not None:
+        result = await aio.run(
+            ["adb", "-s", serial, "emu", "avd", "snapshot", "load", snapshot_name],
+            timeout=120,
+        )
+        PROPS.invalidate(serial)
+        PACKAGES.invalidate(serial)
+        if result.returncode == 0 and "KO" not in result.stdout:
+            return True
+        print(f"{serial}: could not load snapshot {snapshot_name}, resetting in place")
+    PACKAGES.invalidate(
+        serial
+    )  # whatever ran since the emulator was booted may have installed
+    names = [info.name for info in await PACKAGES.find(serial, prefix)]
+    removed = await uninstall_all(serial, names)
+    leftover = [name for name in names if name not in removed]
+    if leftover:
+        await aio.adb_shell(serial, "; ".join(f"pm clear {name}" for name in leftover))
+    await aio.adb_shell(serial, RESET_COMMAND)
+    return False
+
+
+def expected_boot_seconds(avd_name: str, system_image: str) -> float:
+    """What booting this AVD would have cost, from the recorded boot times (0 when unknown)"""
+    metadata = snapshot.load_metadata(avd_name) if avd_name else {}
+    warm = snapshot.has_valid_snapshot(avd_name, system_image) if avd_name else False
+    return float(
+        metadata.get("warm_boot_seconds" if warm else "cold_boot_seconds")
+        or metadata.get("cold_boot_seconds")
+        or 0.0
+    )
+
+
+def find_reusable(
+    api: int, system_image: str, prefer: str | None = None
+) -> tuple[Device | None, str, str]:
+    """(healthy emulator, "", "") or (None, reason, detail), the prefer serial is checked first"""
+    emulators = [
+        device for device in get_registry().devices(online_only=True) if device.emulator
+    ]
+    emulators.sort(key=lambda device: device.serial != prefer)
+    if not emulators:
+        return None, "none_running", "no emulator running"
+    reason, details = "", []
+    for device in emulators:
+        health = aio.run_sync(check_health(device.serial, api, system_image))
+        if health is None:
+            return device, "", ""
+        reason = health[0]
+        details.append(f"{device.serial}: {health[1]}")
+    return None, reason, "; ".join(details)
+
+
+def try_reuse(
+    api: int,
+    system_image: str,
+    reset_snapshot: bool = False,
+    prefer: str | None = None,
+) -> Device | None:
+    """A running emulator reset to a clean state, None when none passes the health check.
+
+    prefer: the serial to try first (the emulator the daemon kept)"""
+    start = time.monotonic()
+    device, reason, detail = find_reusable(api, system_image, prefer=prefer)
+    if device is None:
+        stats = record(False, reason)
+        get_report().add(
+            Phase(
+                "reuse", RUN, start, time.monotonic(), ok=True, detail=f"miss: {detail}"
+            )
+        )
+        print(f"No reusable emulator ({detail})")
+        print(stats.summary())
+        return None
+    props = PROPS.get(device.serial, max_age=float("inf"))
+    avd = props.avd_name if props is not None else ""
+    use_snapshot = (
+        reset_snapshot and bool(avd) and snapshot.has_valid_snapshot(avd, system_image)
+    )
+    if aio.run_sync(
+        reset(
+            device.serial,
+            snapshot_name=snapshot.SNAPSHOT_NAME if use_snapshot else None,
+        )
+    ):
+        wait_until_ready(device.serial, timeout=120)
+    end = time.monotonic()
+    saved = max(expected_boot_seconds(avd, system_image) - (end - start), 0.0)
+    stats = record(True, seconds_saved=saved)
+    get_report().add(
+        Phase(
+            "reuse",
+            device.serial,
+            start,
+            end,
+            ok=True,
+            detail=f"hit, ~{saved:.1f}s saved",
+        )
+    )
+    print(f"Reusing {device.serial}, reset in {end - start:.1f}s")
+    print(stats.summary())
+    return device
@@ -0,0 +1,113 @@
+"""
+Runs a job on many devices at once, with per-device isolation of results.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Sequence
+
+from android_tester.env import device_output_root
+
+
+@dataclass
+class DeviceResult:
+    """Outcome of running a job on a single device"""
+
+    serial: str
+    returncode: int
+    start: float
+    end: float
+    log_path: str | None = None
+    error: str | None = None
+    extra: dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0 and self.error is None
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+def safe_name(name: str) -> str:
+    """name (a serial such as host:port, a test id) usable as a file name"""
+    return re.sub(r"[^A-Za-z0-9._-]", "_", name)
+
+
+def device_output_dir(serial: str, root: str | None = None) -> str:
+    """Returns (and creates) the isolated output directory for a device"""
+    out = os.path.join(root or device_output_root(), safe_name(serial))
+    os.makedirs(out, exist_ok=True)
+    return out
+
+
+def run_on_devices(
+    devices: Sequence[Any],
+    job: Callable[[Any], int],
+    max_parallel: int | None = None,
+) -> list[DeviceResult]:
+    """Runs job(device) on every device concurrently, at most max_parallel at a time.
+
+    A failure (non zero return, exception or sys.exit) on one device never stops the others.
+    Results are returned in the same order as devices.
+    """
+    if not devices:
+        return []
+    workers = max_parallel or len(devices)
+    workers = max(1, min(workers, len(devices)))
+
+    def worker(device: Any) -> DeviceResult:
+        start = time.monotonic()
+        try:
+            rtn = job(device)
+            return DeviceResult(
+                serial=device.serial, returncode=rtn, start=start, end=time.monotonic()
+            )
+        except SystemExit as e:
+            # exec_cmd() calls sys.exit() on failure, keep that local to this device.
+            code = e.code if isinstance(e.code, int) else 1
+            return DeviceResult(
+                serial=device.serial,
+                returncode=code or 1,
+                start=start,
+                end=time.monotonic(),
+                error=f"exit {e.code}",
+            )
+        except Exception as e:
+            return DeviceResult(
+                serial=device.serial,
+                returncode=1,
+                start=start,
+                end=time.monotonic(),
+                error=str(e),
+            )
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="device") as pool:
+        return list(pool.map(worker, devices))
+
+
+def print_results(results: list[DeviceResult]) -> None:
+    """Prints a per device summary"""
+    print("#" * 80)
+    for result in results:
+        status = "PASSED" if result.ok else "FAILED"
+        line = f"# {result.serial}: {status} ({result.duration:.2f}s)"
+        phases = [
+            f"{key[: -len('_time')]} {value:.2f}s"
+            for key, value in result.extra.items()
+            if key.endswith("_time")
+        ]
+        if phases:
+            line += f" [{', '.join(phases)}]"
+        if result.error:
+            line += f" {result.error}"
+        if result.log_path:
+            line += f" log: {result.log_path}"
+        print(line)
+    print("#" * 80)
@@ -0,0 +1,262 @@
+"""
+Android SDK component resolver. Every installed SDK package has a package.xml holding its
+sdkmanager path (`<localPackage path="build-tools;33.0.2">`), so the installed components
+are read locally instead of asking sdkmanager (a JVM start each time). The scan is cached
+on disk and reused as long as none of the scanned directories or package.xml files changed.
+
+Finding adb when it is not on PATH (ANDROID_HOME, else setenvironment re-reading the shell
+profiles/registry) is cached on disk too, keyed by PATH, ANDROID_HOME and ANDROID_SDK_ROOT.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+
+from android_tester.env import cache_dir
+
+PACKAGE_XML = "package.xml"
+MAX_DEPTH = 5  # system-images;android-30;google_apis;x86_64 is 4 levels deep
+DISCOVERY_KEYS = ["PATH", "ANDROID_HOME", "ANDROID_SDK_ROOT"]
+
+
+@dataclass
+class SdkPackage:
+    """An installed package, from its package.xml"""
+
+    path: str  # sdkmanager path, e.g. "build-tools;33.0.2"
+    revision: str
+    obsolete: bool = False
+
+
+@dataclass
+class SdkScan:
+    """Installed packages plus the mtimes the scan depends on"""
+
+    root: str
+    packages: dict[str, SdkPackage] = field(default_factory=dict)
+    mtimes: dict[str, int] = field(default_factory=dict)
+
+    def is_current(self) -> bool:
+        """True when nothing was added, removed or updated since the scan"""
+        for path, mtime in self.mtimes.items():
+            try:
+                if os.stat(path).st_mtime_ns != mtime:
+                    return False
+            except OSError:
+                return False
+        return True
+
+
+def sdk_root() -> str | None:
+    """The SDK directory from ANDROID_SDK_ROOT/ANDROID_HOME, or found from sdkmanager/adb on PATH"""
+    for name in ["ANDROID_SDK_ROOT", "ANDROID_HOME"]:
+        value = os.environ.get(name)
+        if value and os.path.isdir(value):
+            return os.path.abspath(value)
+    sdkmanager = shutil.which("sdkmanager")
+    if sdkmanager:
+        # <sdk>/cmdline-tools/latest/bin/sdkmanager or <sdk>/tools/bin/sdkmanager
+        bin_dir = os.path.dirname(os.path.realpath(sdkmanager))
+        for up in [3, 2]:
+            root = bin_dir
+            for _ in range(up):
+                root = os.path.dirname(root)
+            if os.path.isdir(os.path.join(root, "platform-tools")) or os.path.isdir(
+                os.path.join(root, "licenses")
+            ):
+                return root
+    adb = shutil.which("adb")
+    if adb:
+        root = os.path.dirname(os.path.dirname(os.path.realpath(adb)))
+        if os.path.basename(os.path.dirname(os.path.realpath(adb))) == "platform-tools":
+            return root
+    return None
+
+
+def parse_package_xml(path: str) -> SdkPackage | None:
+    """Reads the localPackage element of a package.xml"""
+    try:
+        root = ET.parse(path).getroot()
+    except (OSError, ET.ParseError):
+        return None
+    for element in root.iter():
+        if element.tag.split("}")[-1] == "localPackage":
+            revision = []
+            for part in ["major", "minor", "micro"]:
+                for child in element.iter():
+                    if child.tag.split("}")[-1] == part and child.text:
+                        revision.append(child.text.strip())
+                        break
+            return SdkPackage(
+                path=element.get("path", ""),
+                revision=".".join(revision),
+                obsolete=element.get("obsolete") == "true",
+            )
+    return None
+
+
+def scan(root: str) -> SdkScan:
+    """Walks the SDK for package.xml files, a package's own directory is not descended into"""
+    out = SdkScan(root=root)
+    for dirpath, dirnames, filenames in os.walk(root):
+        depth = os.path.relpath(dirpath, root).count(os.sep) + (dirpath != root)
+        out.mtimes[dirpath] = os.stat(dirpath).st_mtime_ns
+        if PACKAGE_XML in filenames:
+            xml_path = os.path.join(dirpath, PACKAGE_XML)
+            out.mtimes[xml_path] = os.stat(xml_path).st_mtime_ns
+            package = parse_package_xml(xml_path)
+            if package is not None and package.path:
+                out.packages[package.path] = package
+            dirnames[:] = []
+        elif depth >= MAX_DEPTH:
+            dirnames[:] = []
+        else:
+            dirnames[:] = [name for name in dirnames if not name.startswith(".")]
+    return out
+
+
+class SdkResolver:
+    """Installed SDK packages, from the on-disk cache while it is current"""
+
+    def __init__(self, root: str | None = None, cache_path: str | None = None) -> None:
+        self.root = root or sdk_root()
+        self.cache_path = cache_path or os.path.join(cache_dir(), "sdk_packages.json")
+        self._scan: SdkScan | None = None
+
+    def load_cache(self) -> SdkScan | None:
+        try:
+            with open(self.cache_path, encoding="utf-8", mode="r") as file:
+                data = json.load(file)
+            cached = SdkScan(
+                root=data["root"],
+                packages={
+                    path: SdkPackage(**package)
+                    for path, package in data["packages"].items()
+                },
+                mtimes=data["mtimes"],
+            )
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        return cached if cached.root == self.root else None
+
+    def save_cache(self, result: SdkScan) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache_path)), exist_ok=True)
+        data = {
+            "root": result.root,
+            "packages": {
+                path: vars(package) for path, package in result.packages.items()
+            },
+            "mtimes": result.mtimes,
+        }
+        tmp = f"{self.cache_path}.{os.getpid()}.tmp"
+        with open(tmp, encoding="utf-8", mode="w") as file:
+            json.dump(data, file)
+        os.replace(tmp, self.cache_path)
+
+    def installed(self) -> dict[str, SdkPackage]:
+        """sdkmanager path -> installed package"""
+        if self.root is None:
+            return {}
+        if self._scan is None or not self._scan.is_current():
+            cached = self.load_cache()
+            if cached is not None and cached.is_current():
+                self._scan = cached
+            else:
+                self._scan = scan(self.root)
+                self.save_cache(self._scan)
+        return self._scan.packages
+
+    def missing(self, packages: list[str]) -> list[str]:
+        """The packages that are not installed (all of them when the SDK can't be found)"""
+        installed = self.installed()
+        return [
+            package
+            for package in packages
+            if package not in installed or installed[package].obsolete
+        ]
+
+    def invalidate(self) -> None:
+        self._scan = None
+        try:
+            os.remove(self.cache_path)
+        except OSError:
+            pass
+
+
+def discovery_key() -> str:
+    return hashlib.sha256(
+        "\0".join(os.environ.get(name, "") for name in DISCOVERY_KEYS).encode("utf-8")
+    ).hexdigest()
+
+
+def search_adb() -> tuple[str, dict[str, str]] | None:
+    """(adb, environment changes that put it on PATH), None when setenvironment isn't installed"""
+    for name in ["ANDROID_SDK_ROOT", "ANDROID_HOME"]:
+        value = os.environ.get(name)
+        adb = (
+            shutil.which("adb", path=os.path.join(value, "platform-tools"))
+            if value
+            else None
+        )
+        if adb:
+            return adb, {
+                "PATH": os.path.dirname(adb) + os.pathsep + os.environ.get("PATH", "")
+            }
+    try:
+        # pylint: disable=import-outside-toplevel
+        from setenvironment import reload_environment
+    except ImportError:
+        return None
+    before = dict(os.environ)
+    reload_environment()
+    adb = shutil.which("adb")
+    if adb is None:
+        raise RuntimeError("Android SDK not found.")
+    return adb, {
+        name: value for name, value in os.environ.items() if before.get(name) != value
+    }
+
+
+def load_discovery(cache_path: str) -> dict[str, dict]:
+    try:
+        with open(cache_path, encoding="utf-8", mode="r") as file:
+            cache = json.load(file)
+    except (OSError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+def save_discovery(cache_path: str, cache: dict[str, dict]) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+    tmp = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp, encoding="utf-8", mode="w") as file:
+        json.dump(cache, file)
+    os.replace(tmp, cache_path)
+
+
+def find_adb(cache_path: str | None = None) -> str | None:
+    """Puts adb on PATH if it isn't, returns its path (None when it can't be found).
+
+    The environment changes found for the current PATH/ANDROID_HOME are cached on disk and
+    reapplied next time without searching again."""
+    adb = shutil.which("adb")
+    if adb:
+        return adb
+    cache_path = cache_path or os.path.join(cache_dir(), "sdk_discovery.json")
+    key = discovery_key()
+    cache = load_discovery(cache_path)
+    entry = cache.get(key)
+    if not isinstance(entry, dict) or not os.path.isfile(entry.get("adb", "")):
+        found = search_adb()
+        if found is None:
+            return None
+        entry = {"adb": found[0], "env": found[1]}
+        cache[key] = entry
+        save_discovery(cache_path, cache)
+    os.environ.update(entry["env"])
+    return entry["adb"]
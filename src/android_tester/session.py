@@ -0,0 +1,147 @@
+"""
+Long-lived device shell. One `adb shell` process serves many commands, each framed by a
+sentinel line carrying its exit code, instead of starting adb (and a new shell on the
+device) for every command. A batch of commands is written in one go and its results read
+back in one pass, and batches are applied to many devices concurrently, so configuring a
+device farm costs about one round trip per device.
+"""
+
+from __future__ import annotations
+
+import queue
+import subprocess
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from android_tester.aio import POSIX, kill_process_tree
+
+
+class ShellSession:
+    """Runs commands one at a time in a persistent `adb -s serial shell`, thread safe"""
+
+    def __init__(self, serial: str) -> None:
+        self.serial = serial
+        self.sentinel = f"__ANDROID_TESTER_{uuid.uuid4().hex}__"
+        self.process: subprocess.Popen | None = None
+        self.lines: queue.Queue[str | None] = queue.Queue()
+        self.lock = threading.Lock()
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def start(self) -> ShellSession:
+        self.lines = queue.Queue()
+        self.process = subprocess.Popen(  # pylint: disable=consider-using-with
+            ["adb", "-s", self.serial, "shell"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            start_new_session=POSIX,
+        )
+        threading.Thread(
+            target=self._read,
+            args=(self.process, self.lines),
+            name=f"shell-{self.serial}",
+            daemon=True,
+        ).start()
+        return self
+
+    @staticmethod
+    def _read(process: subprocess.Popen, lines: queue.Queue[str | None]) -> None:
+        assert process.stdout is not None
+        for raw in iter(process.stdout.readline, b""):
+            lines.put(raw.decode("utf-8", "replace").rstrip("\r\n"))
+        lines.put(None)  # end of stream
+
+    def run(self, cmd: str, timeout: float = 30) -> tuple[int, str]:
+        """Returns (exit code, output). Raises TimeoutError, or OSError if the shell went away;
+        either way the session is closed and the next call starts a new shell."""
+        return self.batch([cmd], timeout)[0]
+
+    def batch(self, cmds: list[str], timeout: float = 30) -> list[tuple[int, str]]:
+        """Runs the commands one after another in the shell, (exit code, output) for each.
+
+        All of them are written at once and the results collected afterwards, so the batch
+        costs a single round trip. timeout applies to each result. Errors as for run().
+        """
+        with self.lock:
+            if not self.alive:
+                self.start()
+            assert self.process is not None and self.process.stdin is not None
+            # The leading newline puts the sentinel on its own line even without a final newline.
+            framed = "".join(
+                f"{cmd}\nprintf '\\n%s %d\\n' {self.sentinel} $?\n" for cmd in cmds
+            )
+            try:
+                self.process.stdin.write(framed.encode("utf-8"))
+                self.process.stdin.flush()
+                return [self._collect(timeout) for _ in cmds]
+            except (OSError, TimeoutError):
+                self._close()
+                raise
+
+    def _collect(self, timeout: float) -> tuple[int, str]:
+        out: list[str] = []
+        while True:
+            try:
+                line = self.lines.get(timeout=timeout)
+            except queue.Empty as e:
+                raise TimeoutError(
+                    f"{self.serial}: no answer from the shell within {timeout}s"
+                ) from e
+            if line is None:
+                raise OSError(f"{self.serial}: shell exited")
+            if line.startswith(self.sentinel):
+                code = line[len(self.sentinel) :].strip()
+                return int(code) if code.lstrip("-").isdigit() else 1, "\n".join(out)
+            out.append(line)
+
+    def _close(self) -> None:
+        process, self.process = self.process, None
+        if process is None:
+            return
+        try:
+            if process.stdin is not None:
+                process.stdin.close()
+        except OSError:
+            pass
+        kill_process_tree(process)
+        process.wait()
+
+    def close(self) -> None:
+        with self.lock:
+            self._close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+def run_batches(
+    batches: dict[str, list[str]],
+    timeout: float = 60,
+    max_parallel: int | None = None,
+) -> dict[str, list[tuple[int, str]]]:
+    """Runs serial -> commands on all the devices concurrently, one shell session each.
+
+    When a device's shell fails, the commands it did not answer get exit code 255 and the error.
+    """
+
+    def job(serial: str) -> list[tuple[int, str]]:
+        cmds = batches[serial]
+        try:
+            with ShellSession(serial) as shell:
+                return shell.batch(cmds, timeout)
+        except (OSError, TimeoutError) as e:
+            return [(255, str(e))] * len(cmds)
+
+    if not batches:
+        return {}
+    with ThreadPoolExecutor(
+        max_workers=max_parallel or len(batches), thread_name_prefix="shell-batch"
+    ) as pool:
+        return dict(zip(batches, pool.map(job, batches)))
@@ -1,49 +1,266 @@
-import os
-import subprocess
+"""
+Live device dashboard. Redraws when the device watcher reports a change instead of polling:
+model, API level and boot state come from the property snapshot fetched when a device
+appears, the battery level from one `dumpsys battery` per device, refreshed every
+--battery-interval seconds like the snapshot (every BOOT_POLL seconds while booting).
+Only the lines that changed are rewritten. --json streams one JSON object per change
+for other tools.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import re
+import sys
+import threading
 import time
+from dataclasses import asdict, dataclass
+from typing import IO
+
+from android_tester import aio
+from android_tester.device_watcher import DeviceEvent, DeviceRegistry, get_registry
+from android_tester.props import PROPS, DeviceProps
+from android_tester.sdk import find_adb
+
+BATTERY_LEVEL = re.compile(r"^\s*level:\s*(\d+)", re.MULTILINE)
+CLEAR_SCREEN = "\033[2J\033[H"
+CLEAR_LINE = "\033[K"
+CLEAR_BELOW = "\033[J"
+BOOT_POLL = 5.0  # seconds between property reads of a booting device
+
 
+def parse_battery(output: str) -> int | None:
+    """Battery level from `dumpsys battery`"""
+    match = BATTERY_LEVEL.search(output)
+    return int(match.group(1)) if match else None
 
-def execute_command(cmd) -> str:
-    # return subprocess.check_output(cmd, shell=True).decode('utf-8').strip()
-    # subprocess.run(cmd, shell=True, check=False, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    return (
-        subprocess.run(
-            cmd, shell=True, check=False, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+
+@dataclass
+class DeviceRow:
+    """One line of the dashboard, also the device object of --json"""
+
+    serial: str
+    state: str
+    model: str
+    api_level: int | None
+    battery: int | None
+    boot_completed: bool
+
+    def format(self) -> str:
+        api = str(self.api_level) if self.api_level is not None else "-"
+        battery = f"{self.battery}%" if self.battery is not None else "-"
+        booted = "booted" if self.boot_completed else "booting"
+        return (
+            f"{self.serial:<24} {self.state:<12} {self.model:<24} "
+            f"API {api:<4} {battery:>5}  {booted}"
         )
-        .stdout.decode("utf-8")
-        .strip()
-    )
 
 
-def clear_screen() -> None:
-    os.system("cls" if os.name == "nt" else "clear")
+class BatteryCache:
+    """Battery level per serial, read at most once per ttl seconds"""
 
+    def __init__(self, ttl: float = 60.0) -> None:
+        self.ttl = ttl
+        self.levels: dict[str, tuple[int | None, float]] = {}
+        self.lock = threading.Lock()
 
-def run() -> None:
-    lines: list[str] = []
-    lines.append("List of connected devices:")
-    lines.append("---------------------------")
-    devices_output = execute_command("adb devices")
-    device_lines = devices_output.split("\n")[1:]  # Exclude the first line
-    for line in device_lines:
-        if (
-            "device" in line and "devices" not in line
-        ):  # Ensure we're not getting the header or any offline/unauthorized devices
-            device = line.split()[0]
-            model = execute_command(f"adb -s {device} shell getprop ro.product.model")
-            lines.append(model)
-    clear_screen()
-    print("\n".join(lines))
+    def get(self, serial: str) -> int | None:
+        with self.lock:
+            return self.levels.get(serial, (None, 0.0))[0]
 
+    def stale(self, serials: list[str]) -> list[str]:
+        now = time.monotonic()
+        with self.lock:
+            return [
+                serial
+                for serial in serials
+                if serial not in self.levels or now - self.levels[serial][1] > self.ttl
+            ]
 
-def main():
-    try:
+    def refresh(self, serials: list[str]) -> None:
+        """Reads the battery of the devices concurrently"""
+
+        async def read(serial: str) -> int | None:
+            try:
+                return parse_battery(
+                    await aio.adb_shell(serial, "dumpsys battery", timeout=10)
+                )
+            except Exception:  # pylint: disable=broad-except
+                return None
+
+        async def read_all() -> list[int | None]:
+            return await asyncio.gather(*(read(serial) for serial in serials))
+
+        if not serials:
+            return
+        levels = aio.run_sync(read_all())
+        now = time.monotonic()
+        with self.lock:
+            for serial, level in zip(serials, levels):
+                self.levels[serial] = (level, now)
+
+    def forget(self, serial: str) -> None:
+        with self.lock:
+            self.levels.pop(serial, None)
+
+
+class Dashboard:
+    """Renders the registry's devices, redrawing on device events"""
+
+    def __init__(
+        self,
+        registry: DeviceRegistry,
+        out: IO[str] = sys.stdout,
+        json_mode: bool = False,
+        battery_interval: float = 60.0,
+    ) -> None:
+        self.registry = registry
+        self.out = out
+        self.json_mode = json_mode
+        self.battery = BatteryCache(battery_interval)
+        self.changed = threading.Event()
+        self.screen: list[str] | None = None  # lines currently on the terminal
+        self.last_rows: dict[str, DeviceRow] = {}
+        self.booting = False  # an online device has not finished booting, poll it
+        registry.watcher.add_callback(self._on_event)
+
+    def _on_event(self, event: DeviceEvent) -> None:
+        self.battery.forget(event.serial)  # e.g. reconnected, read it again
+        self.changed.set()
+
+    def props(self, serial: str) -> DeviceProps | None:
+        """The registry fetched the snapshot when the device appeared, it is read again with the
+        battery, or every BOOT_POLL seconds until the device finished booting"""
+        props = PROPS.get(serial, max_age=self.battery.ttl)
+        if props is not None and not props.boot_completed:
+            props = PROPS.get(serial, max_age=BOOT_POLL)
+        return props
+
+    def rows(self) -> list[DeviceRow]:
+        out = []
+        for device in sorted(self.registry.devices(), key=lambda device: device.serial):
+            props = self.props(device.serial) if device.online == "device" else None
+            out.append(
+                DeviceRow(
+                    serial=device.serial,
+                    state=device.online,
+                    model=(props.model if props is not None else "") or device.model,
+                    api_level=(
+                        props.api_level if props is not None else device.api_level
+                    ),
+                    battery=self.battery.get(device.serial),
+                    boot_completed=(
+                        props.boot_completed
+                        if props is not None
+                        else device.boot_completed
+                    ),
+                )
+            )
+        return out
+
+    def render(self, rows: list[DeviceRow]) -> list[str]:
+        lines = ["List of connected devices:", "---------------------------"]
+        lines += [row.format() for row in rows] or ["(none)"]
+        return lines
+
+    def draw(self, lines: list[str]) -> None:
+        """Rewrites only the lines that differ from what is on screen"""
+        if self.screen is None:
+            self.out.write(CLEAR_SCREEN + "\n".join(lines) + "\n")
+        else:
+            for i, line in enumerate(lines):
+                if i >= len(self.screen) or self.screen[i] != line:
+                    self.out.write(f"\033[{i + 1};1H{line}{CLEAR_LINE}")
+            if len(lines) < len(self.screen):
+                self.out.write(f"\033[{len(lines) + 1};1H{CLEAR_BELOW}")
+            self.out.write(f"\033[{len(lines) + 1};1H")
+        self.out.flush()
+        self.screen = lines
+
+    def emit_json(self, rows: list[DeviceRow]) -> None:
+        """One JSON line per device that appeared, changed or disappeared"""
+        current = {row.serial: row for row in rows}
+        for serial, row in current.items():
+            if self.last_rows.get(serial) != row:
+                kind = "changed" if serial in self.last_rows else "added"
+                self.out.write(
+                    json.dumps(
+                        {"event": kind, "time": time.time(), "device": asdict(row)}
+                    )
+                    + "\n"
+                )
+        for serial, row in self.last_rows.items():
+            if serial not in current:
+                self.out.write(
+                    json.dumps(
+                        {"event": "removed", "time": time.time(), "device": asdict(row)}
+                    )
+                    + "\n"
+                )
+        self.out.flush()
+        self.last_rows = current
+
+    def update(self) -> None:
+        online = [device.serial for device in self.registry.devices(online_only=True)]
+        self.battery.refresh(self.battery.stale(online))
+        rows = self.rows()
+        self.booting = any(
+            not row.boot_completed for row in rows if row.state == "device"
+        )
+        if self.json_mode:
+            self.emit_json(rows)
+        else:
+            self.draw(self.render(rows))
+
+    def run(self, once: bool = False) -> None:
+        """Draws, then sleeps until a device event, the next battery refresh or boot state poll"""
         while True:
-            run()
-            time.sleep(1)
+            self.changed.clear()
+            self.update()
+            if once:
+                return
+            self.changed.wait(
+                min(BOOT_POLL, self.battery.ttl) if self.booting else self.battery.ttl
+            )
+
+
+def run(registry: DeviceRegistry) -> None:
+    """Prints the device list once"""
+    Dashboard(registry).run(once=True)
+
+
+def main(argv: list[str] | None = None, prog: str | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog=prog, description="Live view of the connected devices"
+    )
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="Stream one JSON object per device change instead of drawing a table",
+    )
+    parser.add_argument(
+        "--once", action="store_true", help="Print the devices once and exit"
+    )
+    parser.add_argument(
+        "--battery-interval",
+        type=float,
+        default=60.0,
+        help="Seconds between battery level refreshes (default: 60)",
+    )
+    args = parser.parse_args(argv)
+    find_adb()
+    registry = get_registry()
+    dashboard = Dashboard(
+        registry, json_mode=args.json, battery_interval=args.battery_interval
+    )
+    try:
+        dashboard.run(once=args.once)
     except KeyboardInterrupt:
         print("\nExiting...")
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,198 @@
+"""
+Fake adb/emulator/sdkmanager/gradle stand-ins so the orchestration code can be exercised
+(and benchmarked) without hardware. Latencies, boot durations and failures are configurable.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import signal
+import sys
+import tempfile
+from typing import Any
+
+from android_tester.adb_client import CLIENT_ENV
+from android_tester.env import CACHE_DIR_ENV, OUTPUT_DIR_ENV
+from android_tester.simulator.fake_adb_server import FakeAdbServer
+from android_tester.simulator.simcommon import (
+    CONFIG_ENV,
+    load_emulators,
+    write_package_xml,
+)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+TOOLS = {
+    "adb": os.path.join(HERE, "fake_adb.py"),
+    "gradle": os.path.join(HERE, "fake_gradle.py"),
+    "emulator": os.path.join(HERE, "fake_emulator.py"),
+    "sdkmanager": os.path.join(HERE, "fake_sdkmanager.py"),
+}
+
+
+def make_device(
+    serial: str, model: str = "Pixel", emulator: bool | None = None, **props: Any
+) -> dict[str, Any]:
+    """Builds a simulated device entry for the config file"""
+    if emulator is None:
+        emulator = serial.startswith("emulator-")
+    return {
+        "serial": serial,
+        "model": model,
+        "emulator": emulator,
+        "avd_name": props.pop("avd_name", f"avd_{serial}" if emulator else ""),
+        "state": props.pop("state", "device"),
+        "packages": props.pop("packages", []),
+        "props": props,
+    }
+
+
+def make_test(
+    class_name: str, name: str, status: str = "passed", failures: int = 1
+) -> dict[str, Any]:
+    """Builds a simulated instrumentation test, status is passed, failed, error, skipped or
+    flaky: it fails its first failures runs (on any device), then passes"""
+    test: dict[str, Any] = {"class": class_name, "name": name, "status": status}
+    if status == "flaky":
+        test["failures"] = failures
+    return test
+
+
+class FakeToolchain:
+    """Puts fake adb/emulator/sdkmanager/gradle executables first on PATH in a with block.
+
+    latency maps a tool ("adb", "sdkmanager") to the seconds each call takes. fail injects
+    failures: {"install": [serials], "boot": [avd names that never finish booting],
+    "sdkmanager": True}. sdk_packages are installed in the fake SDK from the start."""
+
+    def __init__(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self,
+        devices: list[dict[str, Any]],
+        gradle_duration: float = 0.0,
+        gradle_fail_serials: list[str] | None = None,
+        adb_server: bool = False,
+        instrumentation: list[dict[str, str]] | None = None,
+        avds: list[str] | None = None,
+        boot_duration: float = 0.0,
+        warm_boot_duration: float | None = None,
+        latency: dict[str, float] | None = None,
+        fail: dict[str, Any] | None = None,
+        sdk_packages: list[str] | None = None,
+    ) -> None:
+        self.devices = devices
+        self.instrumentation = instrumentation or []
+        self.avds = avds or []
+        self.boot_duration = boot_duration
+        self.warm_boot_duration = (
+            boot_duration if warm_boot_duration is None else warm_boot_duration
+        )
+        self.latency = latency or {}
+        self.fail = fail or {}
+        self.sdk_packages = sdk_packages or []
+        self.gradle_duration = gradle_duration
+        self.gradle_fail_serials = gradle_fail_serials or []
+        self.adb_server = adb_server
+        self.server: Any = None
+        self.root = ""
+        self.old_environ: dict[str, str] = {}
+
+    @property
+    def bin_dir(self) -> str:
+        return os.path.join(self.root, "bin")
+
+    @property
+    def config_path(self) -> str:
+        return os.path.join(self.root, "config.json")
+
+    @property
+    def sdk_root(self) -> str:
+        return os.path.join(self.root, "sdk")
+
+    @property
+    def events_path(self) -> str:
+        return os.path.join(self.root, "events.jsonl")
+
+    def config(self) -> dict[str, Any]:
+        return {
+            "devices": self.devices,
+            "gradle": {
+                "duration": self.gradle_duration,
+                "fail_serials": self.gradle_fail_serials,
+            },
+            "instrumentation": self.instrumentation,
+            "emulator": {
+                "avds": self.avds,
+                "boot_duration": self.boot_duration,
+                "warm_boot_duration": self.warm_boot_duration,
+            },
+            "latency": self.latency,
+            "fail": self.fail,
+            "sdk_root": self.sdk_root,
+            "events": self.events_path,
+        }
+
+    def write_config(self) -> None:
+        with open(self.config_path, encoding="utf-8", mode="w") as file:
+            json.dump(self.config(), file, indent=2)
+
+    def events(self, tool: str | None = None) -> list[dict[str, Any]]:
+        """Returns the events recorded by the fake tools, in order"""
+        if not os.path.exists(self.events_path):
+            return []
+        out = []
+        with open(self.events_path, encoding="utf-8", mode="r") as file:
+            for line in file:
+                event = json.loads(line)
+                if tool is None or event["tool"] == tool:
+                    out.append(event)
+        return out
+
+    def __enter__(self):
+        self.root = tempfile.mkdtemp(prefix="android_tester_sim_")
+        os.makedirs(self.bin_dir)
+        for name, script in TOOLS.items():
+            wrapper = os.path.join(self.bin_dir, name)
+            with open(wrapper, encoding="utf-8", mode="w") as file:
+                file.write(f'#!/bin/sh\nexec "{sys.executable}" "{script}" "$@"\n')
+            os.chmod(wrapper, 0o755)
+        self.write_config()
+        os.makedirs(self.sdk_root)
+        for package in self.sdk_packages:
+            write_package_xml(self.sdk_root, package)
+        self.old_environ = dict(os.environ)
+        os.environ["PATH"] = self.bin_dir + os.pathsep + os.environ.get("PATH", "")
+        os.environ[CONFIG_ENV] = self.config_path
+        os.environ[CACHE_DIR_ENV] = os.path.join(self.root, "cache")
+        os.environ[OUTPUT_DIR_ENV] = os.path.join(
+            self.root, "output"
+        )  # logs and reports stay out of the checkout
+        os.environ["ANDROID_SDK_ROOT"] = self.sdk_root
+        os.environ["ANDROID_AVD_HOME"] = os.path.join(
+            self.root, "avd"
+        )  # snapshot metadata stays in the simulation
+        os.environ.pop("ANDROID_HOME", None)
+        if self.adb_server:
+            self.server = FakeAdbServer(self.config()).start()
+            os.environ["ANDROID_ADB_SERVER_PORT"] = str(self.server.port)
+        else:
+            # Never let the socket client reach a real adb server while simulating.
+            os.environ[CLIENT_ENV] = "subprocess"
+        return self
+
+    def kill_emulators(self) -> None:
+        """Stops the fake emulators still running"""
+        for emulator in load_emulators(self.config()):
+            try:
+                os.kill(emulator["pid"], signal.SIGTERM)
+            except OSError:
+                pass
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.kill_emulators()
+        if self.server is not None:
+            self.server.stop()
+            self.server = None
+        os.environ.clear()
+        os.environ.update(self.old_environ)
+        shutil.rmtree(self.root, ignore_errors=True)
@@ -0,0 +1,473 @@
+"""
+Fake adb executable. Answers the subset of adb commands android_tester issues.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import sys
+import time
+from typing import Any
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from simcommon import (  # pylint: disable=wrong-import-position,import-error
+    all_devices,
+    append_logcat,
+    encode_log_entry,
+    fails,
+    find_device,
+    latency,
+    load_config,
+    locked,
+    logcat_path,
+    record,
+    remove_emulator,
+    state_dir,
+)
+
+
+def packages_path(config: dict[str, Any], serial: str) -> str:
+    return os.path.join(state_dir(config), f"{serial}.packages.json")
+
+
+def load_packages(config: dict[str, Any], device: dict[str, Any]) -> list[str]:
+    path = packages_path(config, device["serial"])
+    if os.path.exists(path):
+        with open(path, encoding="utf-8", mode="r") as file:
+            return json.load(file)
+    return list(device["packages"])
+
+
+def save_packages(
+    config: dict[str, Any], device: dict[str, Any], packages: list[str]
+) -> None:
+    with open(
+        packages_path(config, device["serial"]), encoding="utf-8", mode="w"
+    ) as file:
+        json.dump(packages, file)
+
+
+def install_info_path(config: dict[str, Any], serial: str, package: str) -> str:
+    return os.path.join(state_dir(config), f"{serial}.{package}.install.json")
+
+
+def install_info(
+    config: dict[str, Any], device: dict[str, Any], package: str
+) -> dict[str, Any]:
+    """versionCode and lastUpdateTime of an installed package, preinstalled ones get defaults"""
+    path = install_info_path(config, device["serial"], package)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8", mode="r") as file:
+            return json.load(file)
+    return {"version_code": 1, "last_update_time": "2024-01-01 00:00:00"}
+
+
+def all_props(device: dict[str, Any]) -> dict[str, str]:
+    props = {
+        "ro.product.model": device["model"],
+        "ro.boot.qemu.avd_name": device["avd_name"],
+        "ro.build.version.sdk": "33",
+        "ro.product.cpu.abi": "x86_64" if device["emulator"] else "arm64-v8a",
+        "sys.boot_completed": "1",
+        "init.svc.bootanim": "stopped",
+    }
+    props.update(device["props"])
+    return props
+
+
+def getprop(device: dict[str, Any], name: str) -> str:
+    return all_props(device).get(name, "")
+
+
+def devices_l(config: dict[str, Any]) -> str:
+    lines = ["List of devices attached"]
+    for i, device in enumerate(all_devices(config)):
+        model = device["model"].replace(" ", "_")
+        state = device.get("state", "device")
+        lines.append(
+            f"{device['serial']}\t{state} product:sdk_{model} model:{model} "
+            f"device:generic transport_id:{i + 1}"
+        )
+    return "\n".join(lines) + "\n"
+
+
+def run_shell(  # pylint: disable=too-many-return-statements,too-many-branches
+    config: dict[str, Any], device: dict[str, Any], args: list[str]
+) -> tuple[int, str]:
+    """Runs a device shell command, returns (exit code, output)"""
+    if len(args) == 1 and ";" in args[0]:
+        # cmd1; cmd2: runs them all, the exit code is the last one's
+        rtn, output = 0, ""
+        for cmd in args[0].split(";"):
+            rtn, out = run_shell(config, device, [cmd.strip()])
+            output += out
+        return rtn, output
+    if len(args) == 1:
+        args = args[0].split()
+    if not args or args == ["true"]:
+        return 0, ""
+    if args == ["getprop"]:
+        return 0, "".join(
+            f"[{key}]: [{value}]\n" for key, value in sorted(all_props(device).items())
+        )
+    if args[0] == "getprop" and len(args) == 2:
+        return 0, getprop(device, args[1]) + "\n"
+    if args[:3] == ["pm", "list", "packages"]:
+        flags = [arg for arg in args[3:] if arg.startswith("-")]
+        match = ([arg for arg in args[3:] if not arg.startswith("-")] or [""])[0]
+        lines = []
+        for uid, package in enumerate(load_packages(config, device), 10100):
+            if match not in package:
+                continue
+            line = (
+                f"package:/data/app/~~Ab1_x==/{package}-Zz9==/base.apk={package}"
+                if "-f" in flags
+                else f"package:{package}"
+            )
+            if "--show-versioncode" in flags:
+                line += f" versionCode:{install_info(config, device, package)['version_code']}"
+            if "-U" in flags:
+                line += f" uid:{uid}"
+            lines.append(line + "\n")
+        return 0, "".join(lines)
+    if args == ["pm", "path", "android"]:
+        return 0, "package:/system/framework/framework-res.apk\n"
+    if args[:2] == ["pm", "path"] and len(args) == 3:
+        if args[2] not in load_packages(config, device):
+            return 1, ""
+        return 0, f"package:/data/app/{args[2]}-1/base.apk\n"
+    if args[:2] == ["dumpsys", "package"] and len(args) == 3:
+        if args[2] not in load_packages(config, device):
+            return 0, f"Unable to find package: {args[2]}\n"
+        info = install_info(config, device, args[2])
+        return 0, (
+            f"Packages:\n  Package [{args[2]}] (1a2b3c):\n    codePath=/data/app/{args[2]}-1\n"
+            f"    versionCode={info['version_code']} minSdk=21 targetSdk=33\n"
+            "    firstInstallTime=2024-01-01 00:00:00\n"
+            f"    lastUpdateTime={info['last_update_time']}\n"
+        )
+    if args[:2] == ["pm", "uninstall"] and len(args) == 3:
+        return uninstall(config, device, args[2])
+    if args == ["dumpsys", "battery"]:
+        level = device["props"].get("battery.level", "100")
+        return (
+            0,
+            (
+                "Current Battery Service state:\n  AC powered: false\n  USB powered: true\n"
+                f"  level: {level}\n  scale: 100\n"
+            ),
+        )
+    if args[:2] == ["settings", "put"]:
+        return 0, ""
+    if args[:2] == ["settings", "get"]:
+        return 0, "1\n"
+    if args[:2] == ["am", "instrument"]:
+        return instrument(config, device, args[2:])
+    if args == ["am", "kill-all"] or args[:2] == ["input", "keyevent"]:
+        return 0, ""
+    if args[:2] == ["pm", "clear"] and len(args) == 3:
+        return (
+            (0, "Success\n")
+            if args[2] in load_packages(config, device)
+            else (1, "Failed\n")
+        )
+    return 1, f"fake adb: unsupported shell command: {args}\n"
+
+
+def uninstall(
+    config: dict[str, Any], device: dict[str, Any], package: str
+) -> tuple[int, str]:
+    with locked(config, device["serial"]):
+        packages = load_packages(config, device)
+        if package not in packages:
+            return 1, "Failure [DELETE_FAILED_INTERNAL_ERROR]\n"
+        packages.remove(package)
+        save_packages(config, device, packages)
+    return 0, "Success\n"
+
+
+def apk_package(apk: str) -> str:
+    """Fake apks are text files holding the package name"""
+    with open(apk, encoding="utf-8", mode="r") as file:
+        return file.read().strip()
+
+
+def install(
+    config: dict[str, Any], device: dict[str, Any], args: list[str]
+) -> tuple[int, str]:
+    apks = [arg for arg in args if not arg.startswith("-")]
+    if len(apks) != 1 or not os.path.exists(apks[0]):
+        return 1, f"adb: failed to stat {apks}\n"
+    package = apk_package(apks[0])
+    if fails(config, "install", device["serial"]):
+        record(
+            config, "adb", "install_failed", serial=device["serial"], package=package
+        )
+        return (
+            1,
+            (
+                "Performing Streamed Install\n"
+                "adb: failed to install: Failure [INSTALL_FAILED_INSUFFICIENT_STORAGE]\n"
+            ),
+        )
+    with locked(config, device["serial"]):
+        packages = load_packages(config, device)
+        if package not in packages:
+            packages.append(package)
+            save_packages(config, device, packages)
+        info = install_info(config, device, package)
+        info["last_update_time"] = (
+            time.strftime("%Y-%m-%d %H:%M:%S") + f".{time.time_ns()}"
+        )
+        with open(
+            install_info_path(config, device["serial"], package),
+            encoding="utf-8",
+            mode="w",
+        ) as file:
+            json.dump(info, file)
+    record(
+        config, "adb", "install", serial=device["serial"], package=package, args=args
+    )
+    return 0, "Performing Streamed Install\nSuccess\n"
+
+
+STATUS_CODES = {"passed": 0, "error": -1, "failed": -2, "skipped": -3}
+
+
+def selected(test: dict[str, Any], classes: str) -> bool:
+    """-e class takes comma separated classes or Class#method"""
+    return any(
+        entry in (test["class"], f"{test['class']}#{test['name']}")
+        for entry in classes.split(",")
+    )
+
+
+def resolve_flaky(
+    config: dict[str, Any], tests: list[dict[str, Any]]
+) -> list[dict[str, Any]]:
+    """Flaky tests fail their first "failures" runs, counted across devices"""
+    if not any(test["status"] == "flaky" for test in tests):
+        return tests
+    path = os.path.join(state_dir(config), "flaky.json")
+    with locked(config, "flaky"):
+        try:
+            with open(path, encoding="utf-8", mode="r") as file:
+                runs = json.load(file)
+        except (OSError, ValueError):
+            runs = {}
+        out = []
+        for test in tests:
+            if test["status"] == "flaky":
+                key = f"{test['class']}#{test['name']}"
+                runs[key] = runs.get(key, 0) + 1
+                test = dict(
+                    test,
+                    status=(
+                        "failed" if runs[key] <= test.get("failures", 1) else "passed"
+                    ),
+                )
+            out.append(test)
+        with open(path, encoding="utf-8", mode="w") as file:
+            json.dump(runs, file)
+    return out
+
+
+def instrument(  # pylint: disable=too-many-locals
+    config: dict[str, Any], device: dict[str, Any], args: list[str]
+) -> tuple[int, str]:
+    """Raw (-r) output of AndroidJUnitRunner for the configured tests.
+
+    Honours numShards/shardIndex and class."""
+    extras = {}
+    for i, arg in enumerate(args[:-2]):
+        if arg == "-e":
+            extras[args[i + 1]] = args[i + 2]
+    tests = config.get("instrumentation", [])
+    if "class" in extras:
+        tests = [test for test in tests if selected(test, extras["class"])]
+    if "numShards" in extras:
+        num_shards, shard_index = int(extras["numShards"]), int(extras["shardIndex"])
+        tests = [test for i, test in enumerate(tests) if i % num_shards == shard_index]
+    tests = resolve_flaky(config, tests)
+    app_pid = 4000 + len(tests)
+    log = [
+        (
+            1000,
+            4,
+            "ActivityManager",
+            f"Start proc {app_pid}:{device_package(config, device)}/u0a123 for added application",
+        )
+    ]
+    for test in tests:
+        log += [
+            (app_pid, 4, "TestRunner", f"started: {test['name']}({test['class']})"),
+            (app_pid, 3, "AppTest", f"running {test['name']}"),
+            (1000, 4, "chatty", "uid=1000 system_server identical 2 lines"),
+        ]
+        if test["status"] in ("failed", "error"):
+            log.append(
+                (app_pid, 6, "TestRunner", f"failed: {test['name']}({test['class']})")
+            )
+        log.append(
+            (app_pid, 4, "TestRunner", f"finished: {test['name']}({test['class']})")
+        )
+    append_logcat(config, device["serial"], log)
+    lines = []
+    for i, test in enumerate(tests):
+        status = [
+            f"INSTRUMENTATION_STATUS: class={test['class']}",
+            f"INSTRUMENTATION_STATUS: current={i + 1}",
+            "INSTRUMENTATION_STATUS: id=AndroidJUnitRunner",
+            f"INSTRUMENTATION_STATUS: numtests={len(tests)}",
+            f"INSTRUMENTATION_STATUS: test={test['name']}",
+        ]
+        lines += status + ["INSTRUMENTATION_STATUS_CODE: 1"]
+        if test["status"] in ("failed", "error"):
+            lines += status + [
+                f"INSTRUMENTATION_STATUS: stack=java.lang.AssertionError: {test['name']}",
+                f"\tat {test['class']}.{test['name']}(Test.java:1)",
+            ]
+        else:
+            lines += status
+        lines.append(f"INSTRUMENTATION_STATUS_CODE: {STATUS_CODES[test['status']]}")
+    failed = sum(1 for test in tests if test["status"] in ("failed", "error"))
+    summary = (
+        f"OK ({len(tests)} tests)"
+        if not failed
+        else f"FAILURES!!!\nTests run: {len(tests)},  Failures: {failed}"
+    )
+    lines += [
+        "INSTRUMENTATION_RESULT: stream=",
+        "Time: 0.1",
+        "",
+        summary,
+        "",
+        "INSTRUMENTATION_CODE: -1",
+    ]
+    record(config, "adb", "instrument", serial=device["serial"], extras=extras)
+    return 0, "\n".join(lines) + "\n"
+
+
+def device_package(config: dict[str, Any], device: dict[str, Any]) -> str:
+    """The app under test, the installed package that has a .test companion"""
+    packages = load_packages(config, device)
+    for package in packages:
+        if f"{package}.test" in packages:
+            return package
+    return "org.internetwatchdogs.androidmonitor"
+
+
+def logcat(config: dict[str, Any], device: dict[str, Any], args: list[str]) -> int:
+    """`logcat -B`: the binary log.
+
+    -d dumps it, otherwise the last entry (-T 1) then new ones until killed."""
+    if "-B" not in args:
+        sys.stderr.write("fake adb: only logcat -B is supported\n")
+        return 1
+    out = sys.stdout.buffer
+    path = logcat_path(config, device["serial"])
+    with open(path, mode="ab+") as file:
+        if "-d" in args:
+            file.seek(0)
+            out.write(file.read())
+            out.flush()
+            return 0
+        file.seek(0, os.SEEK_END)
+        out.write(encode_log_entry(1, 4, "logd", "logcat started"))
+        out.flush()
+        try:
+            while True:
+                data = file.read()
+                if data:
+                    out.write(data)
+                    out.flush()
+                else:
+                    time.sleep(0.02)
+        except (BrokenPipeError, KeyboardInterrupt):
+            return 0
+
+
+SENTINEL_LINE = re.compile(r"^printf '\\n%s %d\\n' (\S+) \$\?$")
+
+
+def interactive_shell(config: dict[str, Any], device: dict[str, Any]) -> int:
+    """`adb shell` without a command: runs the lines read from stdin, like a non-tty shell"""
+    rtn = 0
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        match = SENTINEL_LINE.match(line)
+        if match:
+            sys.stdout.write(f"\n{match.group(1)} {rtn}\n")
+        elif line == "exit":
+            break
+        else:
+            # Looked up per command, a booting emulator's props change while the shell is open.
+            device = find_device(config, device["serial"]) or device
+            rtn, output = run_shell(config, device, [line])
+            sys.stdout.write(output)
+        sys.stdout.flush()
+    return 0
+
+
+def shell(config: dict[str, Any], device: dict[str, Any], args: list[str]) -> int:
+    if not args:
+        return interactive_shell(config, device)
+    rtn, output = run_shell(config, device, args)
+    (sys.stdout if rtn == 0 else sys.stderr).write(output)
+    return rtn
+
+
+def main(  # pylint: disable=too-many-return-statements
+    argv: list[str] | None = None,
+) -> int:
+    args = list(sys.argv[1:] if argv is None else argv)
+    config = load_config()
+    serial: str | None = os.environ.get("ANDROID_SERIAL")
+    if len(args) >= 2 and args[0] == "-s":
+        serial = args[1]
+        args = args[2:]
+    record(config, "adb", "call", serial=serial, args=args)
+    latency(config, "adb")
+    if args[:1] == ["devices"]:
+        sys.stdout.write(devices_l(config))
+        return 0
+    if args[:1] == ["wait-for-device"]:
+        # Blocks until the device is listed and online, like the real adb.
+        while True:
+            device = find_device(config, serial)
+            if device is not None and device["state"] == "device":
+                return 0
+            time.sleep(0.05)
+    device = find_device(config, serial)
+    if device is None:
+        sys.stderr.write(f"adb: device '{serial}' not found\n")
+        return 1
+    if args[:1] == ["shell"]:
+        return shell(config, device, args[1:])
+    if args[:1] == ["uninstall"] and len(args) == 2:
+        rtn, output = uninstall(config, device, args[1])
+        sys.stdout.write(output)
+        return rtn
+    if args[:1] == ["logcat"]:
+        return logcat(config, device, args[1:])
+    if args[:1] == ["install"]:
+        rtn, output = install(config, device, args[1:])
+        (sys.stdout if rtn == 0 else sys.stderr).write(output)
+        return rtn
+    if args[:2] == ["emu", "kill"]:
+        remove_emulator(config, int(device["serial"].rsplit("-", 1)[1]))
+        return 0
+    if args[:3] == ["emu", "avd", "snapshot"]:
+        sys.stdout.write("OK\n")
+        return 0
+    sys.stderr.write(f"fake adb: unsupported command: {args}\n")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
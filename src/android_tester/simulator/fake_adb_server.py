@@ -0,0 +1,253 @@
+"""
+Fake adb server speaking the adb wire protocol, backed by the same config as the fake adb tool.
+"""
+
+from __future__ import annotations
+
+import functools
+import socketserver
+import stat
+import struct
+import threading
+import time
+from typing import Any
+
+from android_tester.simulator import fake_adb
+
+ADB_SERVER_VERSION = 41
+
+
+class AdbProtocolError(Exception):
+    """The client sent something the fake server does not understand"""
+
+
+class FakeAdbHandler(socketserver.BaseRequestHandler):
+    """Handles one client connection"""
+
+    server: FakeAdbServer
+
+    def read_exact(self, size: int) -> bytes:
+        data = b""
+        while len(data) < size:
+            chunk = self.request.recv(size - len(data))
+            if not chunk:
+                raise AdbProtocolError("client closed the connection")
+            data += chunk
+        return data
+
+    def okay(self, payload: bytes | None = None) -> None:
+        out = b"OKAY"
+        if payload is not None:
+            out += f"{len(payload):04x}".encode("ascii") + payload
+        self.request.sendall(out)
+
+    def fail(self, message: str) -> None:
+        payload = message.encode("utf-8")
+        self.request.sendall(b"FAIL" + f"{len(payload):04x}".encode("ascii") + payload)
+
+    def handle(self) -> None:
+        device: dict[str, Any] | None = None
+        try:
+            while True:
+                service = self.read_exact(int(self.read_exact(4), 16)).decode("utf-8")
+                self.server.record(service)
+                if self.server.latency:
+                    time.sleep(self.server.latency)
+                if (
+                    service.startswith("host:transport:")
+                    or service == "host:transport-any"
+                ):
+                    serial = (
+                        service.split(":", 2)[2]
+                        if service.startswith("host:transport:")
+                        else None
+                    )
+                    device = fake_adb.find_device(self.server.config, serial)
+                    if device is None:
+                        self.fail(f"device '{serial}' not found")
+                        return
+                    if device.get("state", "device") != "device":
+                        self.fail(f"device {device['state']}")
+                        return
+                    self.okay()
+                    continue
+                if device is None:
+                    self.handle_host(service)
+                    return
+                self.handle_device(device, service)
+                return
+        except (AdbProtocolError, ConnectionError):
+            return
+
+    def handle_host(self, service: str) -> None:
+        if service == "host:version":
+            self.okay(f"{ADB_SERVER_VERSION:04x}".encode("ascii"))
+        elif service in ("host:devices", "host:devices-l"):
+            self.okay(self.server.device_list(long=service.endswith("-l")))
+        elif service in ("host:track-devices", "host:track-devices-l"):
+            self.okay()
+            self.track_devices(long=service.endswith("-l"))
+        else:
+            self.fail(f"unknown host service '{service}'")
+
+    def track_devices(self, long: bool) -> None:
+        """Sends the device list now and again on every change, until the client goes away"""
+        generation = -1
+        last: bytes | None = None
+        while not self.server.stopped:
+            with self.server.changed:
+                self.server.changed.wait_for(
+                    functools.partial(self.server.changed_since, generation),
+                    timeout=0.5,
+                )
+                generation = self.server.generation
+                # Also picks up emulators started or killed by the fake tools.
+                payload = self.server.device_list(long=long)
+            if payload == last:
+                continue
+            last = payload
+            self.request.sendall(f"{len(payload):04x}".encode("ascii") + payload)
+
+    def handle_device(self, device: dict[str, Any], service: str) -> None:
+        if service.startswith("shell:"):
+            _, output = fake_adb.run_shell(
+                self.server.config, device, [service[len("shell:") :]]
+            )
+            self.okay()
+            self.request.sendall(output.encode("utf-8"))
+        elif service == "sync:":
+            self.okay()
+            self.handle_sync(device)
+        else:
+            self.fail(f"unknown device service '{service}'")
+
+    def handle_sync(  # pylint: disable=too-many-locals
+        self, device: dict[str, Any]
+    ) -> None:
+        files = self.server.files.setdefault(device["serial"], {})
+        while True:
+            header = self.read_exact(8)
+            cmd, size = header[:4], struct.unpack("<I", header[4:])[0]
+            if cmd == b"QUIT":
+                return
+            path = self.read_exact(size).decode("utf-8")
+            if cmd == b"STAT":
+                entry = files.get(path)
+                if entry is None:
+                    self.request.sendall(b"STAT" + struct.pack("<III", 0, 0, 0))
+                else:
+                    self.request.sendall(
+                        b"STAT" + struct.pack("<III", entry[1], len(entry[0]), entry[2])
+                    )
+            elif cmd == b"RECV":
+                entry = files.get(path)
+                if entry is None:
+                    message = b"No such file or directory"
+                    self.request.sendall(
+                        b"FAIL" + struct.pack("<I", len(message)) + message
+                    )
+                    continue
+                data = entry[0]
+                for offset in range(0, len(data), 64 * 1024):
+                    chunk = data[offset : offset + 64 * 1024]
+                    self.request.sendall(
+                        b"DATA" + struct.pack("<I", len(chunk)) + chunk
+                    )
+                self.request.sendall(b"DONE" + struct.pack("<I", 0))
+            elif cmd == b"SEND":
+                name, mode = path.rsplit(",", 1)
+                chunks: list[bytes] = []
+                while True:
+                    header = self.read_exact(8)
+                    part, value = header[:4], struct.unpack("<I", header[4:])[0]
+                    if part == b"DONE":
+                        files[name] = (
+                            b"".join(chunks),
+                            int(mode) | stat.S_IFREG,
+                            value,
+                        )
+                        break
+                    chunks.append(self.read_exact(value))
+                self.request.sendall(b"OKAY" + struct.pack("<I", 0))
+            else:
+                raise AdbProtocolError(f"unknown sync command {cmd!r}")
+
+
+class FakeAdbServer(socketserver.ThreadingTCPServer):
+    """Fake adb server on 127.0.0.1, port 0 picks a free port"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(
+        self, config: dict[str, Any], port: int = 0, latency: float = 0.0
+    ) -> None:
+        super().__init__(("127.0.0.1", port), FakeAdbHandler)
+        self.config = config
+        self.latency = latency
+        self.files: dict[str, dict[str, tuple[bytes, int, int]]] = {}
+        self.services: list[str] = []
+        self.thread: threading.Thread | None = None
+        self.changed = threading.Condition()
+        self.generation = 0
+        self.stopped = False
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def record(self, service: str) -> None:
+        self.services.append(service)
+
+    def device_list(self, long: bool) -> bytes:
+        text = fake_adb.devices_l(self.config).split("\n", 1)[1]
+        if not long:
+            text = "".join(
+                f"{line.split()[0]}\t{line.split()[1]}\n" for line in text.splitlines()
+            )
+        return text.encode("utf-8")
+
+    def changed_since(self, generation: int) -> bool:
+        """Whether the device list changed after generation (or the server stopped)"""
+        return self.generation != generation or self.stopped
+
+    def _changed(self) -> None:
+        with self.changed:
+            self.generation += 1
+            self.changed.notify_all()
+
+    def add_device(self, device: dict[str, Any]) -> None:
+        """Plugs in a device, trackers are notified"""
+        self.config["devices"].append(device)
+        self._changed()
+
+    def remove_device(self, serial: str) -> None:
+        self.config["devices"] = [
+            device for device in self.config["devices"] if device["serial"] != serial
+        ]
+        self._changed()
+
+    def set_state(self, serial: str, state: str) -> None:
+        for device in self.config["devices"]:
+            if device["serial"] == serial:
+                device["state"] = state
+        self._changed()
+
+    def start(self) -> FakeAdbServer:
+        self.thread = threading.Thread(
+            target=self.serve_forever, name="fake-adb-server", daemon=True
+        )
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.stopped = True
+        self._changed()
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.stop()
@@ -0,0 +1,109 @@
+"""
+Fake emulator executable. Lists the configured AVDs, or "boots" one: the console port is
+opened, the device shows up offline in the fake adb, goes online and finishes booting after
+the configured boot duration. Runs until `adb emu kill` or a signal.
+"""
+
+from __future__ import annotations
+
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Any
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from simcommon import (  # pylint: disable=wrong-import-position,import-error
+    fails,
+    load_config,
+    load_emulators,
+    locked,
+    record,
+    remove_emulator,
+    save_emulators,
+)
+
+
+def option(args: list[str], name: str) -> str | None:
+    if name in args and args.index(name) + 1 < len(args):
+        return args[args.index(name) + 1]
+    return None
+
+
+def register(config: dict[str, Any], entry: dict[str, Any]) -> None:
+    with locked(config, "emulators"):
+        save_emulators(config, load_emulators(config) + [entry])
+
+
+def is_registered(config: dict[str, Any], port: int) -> bool:
+    return any(emulator["port"] == port for emulator in load_emulators(config))
+
+
+def boot(config: dict[str, Any], avd: str, port: int, args: list[str]) -> int:
+    settings = config.get("emulator", {})
+    duration = settings.get("boot_duration", 0.0)
+    if "-snapshot" in args and "-no-snapshot-load" not in args:
+        duration = settings.get("warm_boot_duration", duration)
+    console = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    console.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    try:
+        console.bind(("127.0.0.1", port))
+    except OSError:
+        print(f"ERROR   | Console port {port} is in use", flush=True)
+        return 1
+    console.listen(4)
+    now = time.time()
+    never = fails(config, "boot", avd)
+    register(
+        config,
+        {
+            "avd": avd,
+            "port": port,
+            "pid": os.getpid(),
+            "online_at": now + duration * 0.3,
+            "booted_at": None if never else now + duration,
+        },
+    )
+    record(config, "emulator", "start", avd=avd, port=port, args=args)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        print(
+            f"INFO    | Android emulator version 34.1.19.0 (fake), avd {avd}",
+            flush=True,
+        )
+        print(f"INFO    | Listening on console port {port}", flush=True)
+        booted = never
+        while is_registered(config, port):
+            if not booted and time.time() >= now + duration:
+                print(
+                    f"INFO    | Boot completed in {int(duration * 1000)} ms", flush=True
+                )
+                booted = True
+            time.sleep(0.05)
+        record(config, "emulator", "exit", avd=avd, port=port)
+        return 0
+    finally:
+        remove_emulator(config, port)
+        console.close()
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = list(sys.argv[1:] if argv is None else argv)
+    config = load_config()
+    avds = config.get("emulator", {}).get("avds", [])
+    if "-list-avds" in args:
+        sys.stdout.write("".join(f"{avd}\n" for avd in avds))
+        return 0
+    avd = option(args, "-avd")
+    if avd is None or avd not in avds:
+        print(
+            f"PANIC: Missing emulator engine program for AVD '{avd}'", file=sys.stderr
+        )
+        return 1
+    return boot(config, avd, int(option(args, "-port") or 5554), args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
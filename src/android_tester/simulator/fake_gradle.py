@@ -0,0 +1,63 @@
+"""
+Fake gradle executable. Sleeps for the configured duration and fails for the configured serials.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from simcommon import (  # pylint: disable=wrong-import-position,import-error
+    load_config,
+    record,
+)
+
+OPTIONS_WITH_VALUE = {
+    "-I",
+    "--init-script",
+    "--project-cache-dir",
+    "-p",
+    "--project-dir",
+}
+
+
+def task_names(args: list[str]) -> list[str]:
+    tasks = []
+    skip = False
+    for arg in args:
+        if skip:
+            skip = False
+        elif arg in OPTIONS_WITH_VALUE:
+            skip = True
+        elif not arg.startswith("-"):
+            tasks.append(arg)
+    return tasks
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = list(sys.argv[1:] if argv is None else argv)
+    config = load_config()
+    settings = config["gradle"]
+    serial = os.environ.get("ANDROID_SERIAL")
+    tasks = task_names(args)
+    record(config, "gradle", "start", serial=serial, args=args, cwd=os.getcwd())
+    print(f"> Configure project for {serial}", flush=True)
+    # Half the time configuring, half running the tasks.
+    time.sleep(settings["duration"] / 2)
+    failed = serial in settings["fail_serials"]
+    for task in tasks:
+        print(f"> Task :app:{task}{' FAILED' if failed else ''}", flush=True)
+    time.sleep(settings["duration"] / 2)
+    record(config, "gradle", "end", serial=serial, failed=failed)
+    if failed:
+        print("BUILD FAILED")
+        return 1
+    print("BUILD SUCCESSFUL")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+"""
+Fake sdkmanager executable. Installs packages into the fake SDK by writing their package.xml,
+after the configured latency (standing in for the JVM start).
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from simcommon import (  # pylint: disable=wrong-import-position,import-error
+    fails,
+    latency,
+    load_config,
+    record,
+    write_package_xml,
+)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = list(sys.argv[1:] if argv is None else argv)
+    config = load_config()
+    record(config, "sdkmanager", "call", args=args)
+    latency(config, "sdkmanager")
+    sdk_root = config["sdk_root"]
+    if "--licenses" in args:
+        sys.stdin.readline()  # one of the answers piped in by `yes`
+        print("All SDK package licenses accepted")
+        return 0
+    if "--install" in args:
+        packages = [arg for arg in args if not arg.startswith("-")]
+        if fails(config, "sdkmanager"):
+            print(f"Warning: Failed to install {packages[0]}", file=sys.stderr)
+            return 1
+        for package in packages:
+            write_package_xml(sdk_root, package)
+            print(f"Installed {package}")
+        return 0
+    if "--list_installed" in args:
+        for dirpath, _, filenames in os.walk(sdk_root):
+            if "package.xml" in filenames:
+                print(os.path.relpath(dirpath, sdk_root).replace(os.sep, ";"))
+        return 0
+    print(f"fake sdkmanager: unsupported arguments {args}", file=sys.stderr)
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+"""
+Shared helpers for the fake tools. Stdlib only, these run as standalone scripts.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import json
+import os
+import re
+import struct
+import sys
+import time
+from typing import Any, Iterator
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # type: ignore
+
+CONFIG_ENV = "ANDROID_TESTER_SIM_CONFIG"
+AVD_API = re.compile(r"API_(\d+)")  # Pixel_API_30 runs API 30
+
+
+def load_config() -> dict[str, Any]:
+    path = os.environ.get(CONFIG_ENV)
+    if not path:
+        sys.stderr.write(f"{CONFIG_ENV} is not set\n")
+        sys.exit(1)
+    with open(path, encoding="utf-8", mode="r") as file:
+        return json.load(file)
+
+
+def state_dir(config: dict[str, Any]) -> str:
+    out = os.path.join(os.path.dirname(config["events"]), "state")
+    os.makedirs(out, exist_ok=True)
+    return out
+
+
+@contextlib.contextmanager
+def locked(config: dict[str, Any], name: str) -> Iterator[None]:
+    """Serializes read-modify-write of a state file between concurrent fake tool processes"""
+    with open(
+        os.path.join(state_dir(config), f"{name}.lock"), encoding="utf-8", mode="w"
+    ) as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def latency(config: dict[str, Any], tool: str) -> None:
+    """Sleeps for the configured per-call latency of the tool"""
+    delay = config.get("latency", {}).get(tool, 0.0)
+    if delay:
+        time.sleep(delay)
+
+
+def fails(config: dict[str, Any], point: str, key: Any = True) -> bool:
+    """Failure injection: config["fail"][point] is True or a list of serials/avd names"""
+    value = config.get("fail", {}).get(point)
+    if isinstance(value, list):
+        return key in value
+    return bool(value)
+
+
+def emulators_path(config: dict[str, Any]) -> str:
+    return os.path.join(state_dir(config), "emulators.json")
+
+
+def load_emulators(config: dict[str, Any]) -> list[dict[str, Any]]:
+    """Emulators started by the fake emulator tool and not killed yet"""
+    try:
+        with open(emulators_path(config), encoding="utf-8", mode="r") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return []
+
+
+def save_emulators(config: dict[str, Any], emulators: list[dict[str, Any]]) -> None:
+    tmp = f"{emulators_path(config)}.{os.getpid()}.tmp"
+    with open(tmp, encoding="utf-8", mode="w") as file:
+        json.dump(emulators, file)
+    os.replace(tmp, emulators_path(config))
+
+
+def remove_emulator(config: dict[str, Any], port: int) -> None:
+    """Forgets the emulator, its fake process exits once its entry is gone"""
+    with locked(config, "emulators"):
+        save_emulators(
+            config,
+            [
+                emulator
+                for emulator in load_emulators(config)
+                if emulator["port"] != port
+            ],
+        )
+
+
+def emulator_device(emulator: dict[str, Any]) -> dict[str, Any]:
+    """Device entry of a running fake emulator, offline and not booted until its times pass"""
+    now = time.time()
+    booted = emulator["booted_at"] is not None and now >= emulator["booted_at"]
+    props = {
+        "sys.boot_completed": "1" if booted else "0",
+        "init.svc.bootanim": "stopped" if booted else "running",
+    }
+    api = AVD_API.search(emulator["avd"])
+    if api:
+        props["ro.build.version.sdk"] = api.group(1)
+    return {
+        "serial": f"emulator-{emulator['port']}",
+        "model": "sdk_gphone64_x86_64",
+        "emulator": True,
+        "avd_name": emulator["avd"],
+        "state": "device" if now >= emulator["online_at"] else "offline",
+        "packages": [],
+        "props": props,
+    }
+
+
+def all_devices(config: dict[str, Any]) -> list[dict[str, Any]]:
+    return list(config["devices"]) + [
+        emulator_device(emulator) for emulator in load_emulators(config)
+    ]
+
+
+PACKAGE_XML = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<ns2:repository xmlns:ns2="http://schemas.android.com/repository/android/common/02">
+  <localPackage path="{path}" obsolete="false">
+    <revision><major>1</major><minor>0</minor><micro>0</micro></revision>
+    <display-name>{path}</display-name>
+  </localPackage>
+</ns2:repository>
+"""
+
+
+def write_package_xml(sdk_root: str, path: str) -> None:
+    """Marks an sdkmanager package as installed in a fake SDK"""
+    directory = os.path.join(sdk_root, *path.split(";"))
+    os.makedirs(directory, exist_ok=True)
+    with open(
+        os.path.join(directory, "package.xml"), encoding="utf-8", mode="w"
+    ) as file:
+        file.write(PACKAGE_XML.format(path=path))
+
+
+def logcat_path(config: dict[str, Any], serial: str) -> str:
+    return os.path.join(state_dir(config), f"logcat-{serial}.bin")
+
+
+def encode_log_entry(pid: int, priority: int, tag: str, message: str) -> bytes:
+    """A v4 logger_entry as streamed by `logcat -B`"""
+    payload = (
+        bytes([priority])
+        + tag.encode("utf-8")
+        + b"\0"
+        + message.encode("utf-8")
+        + b"\0"
+    )
+    now = time.time()
+    header = struct.pack(
+        "<HHiIIIII", len(payload), 28, pid, pid, int(now), int(now % 1 * 1e9), 0, 10000
+    )
+    return header + payload
+
+
+def append_logcat(
+    config: dict[str, Any], serial: str, entries: list[tuple[int, int, str, str]]
+) -> None:
+    """Adds (pid, priority, tag, message) entries to the device log, in one write"""
+    with open(logcat_path(config, serial), mode="ab") as file:
+        file.write(b"".join(encode_log_entry(*entry) for entry in entries))
+
+
+def find_device(config: dict[str, Any], serial: str | None) -> dict[str, Any] | None:
+    devices = all_devices(config)
+    if serial is None:
+        return devices[0] if len(devices) == 1 else None
+    for device in devices:
+        if device["serial"] == serial:
+            return device
+    return None
+
+
+def record(config: dict[str, Any], tool: str, event: str, **fields: Any) -> None:
+    """Appends an event line, a single small write so concurrent tools don't interleave"""
+    entry = {"tool": tool, "event": event, "t": time.time(), "pid": os.getpid()}
+    entry.update(fields)
+    with open(config["events"], encoding="utf-8", mode="a") as file:
+        file.write(json.dumps(entry) + "\n")
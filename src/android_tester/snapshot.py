@@ -0,0 +1,131 @@
+"""
+Quickboot snapshot lifecycle: the first boot of an AVD is a cold boot which is saved as a
+clean snapshot, later boots restore it. The snapshot is invalidated when the system image or
+the AVD config changes.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from typing import Any
+
+from android_tester.common import exec_cmd
+
+SNAPSHOT_NAME = "android_tester_clean"
+METADATA_FILE = "android_tester_snapshot.json"
+
+
+def avd_home() -> str:
+    if os.environ.get("ANDROID_AVD_HOME"):
+        return os.environ["ANDROID_AVD_HOME"]
+    for var in ["ANDROID_EMULATOR_HOME", "ANDROID_USER_HOME"]:
+        if os.environ.get(var):
+            return os.path.join(os.environ[var], "avd")
+    return os.path.join(os.path.expanduser("~"), ".android", "avd")
+
+
+def avd_dir(avd_name: str) -> str:
+    """Returns the AVD content dir, honoring the path= entry of <name>.ini"""
+    ini = os.path.join(avd_home(), f"{avd_name}.ini")
+    if os.path.exists(ini):
+        with open(ini, encoding="utf-8", mode="r") as file:
+            for line in file:
+                if line.startswith("path="):
+                    return line.split("=", 1)[1].strip()
+    return os.path.join(avd_home(), f"{avd_name}.avd")
+
+
+def fingerprint(avd_name: str, system_image: str) -> str:
+    """Hash of everything that makes a saved snapshot stale"""
+    sha = hashlib.sha256(system_image.encode("utf-8"))
+    config = os.path.join(avd_dir(avd_name), "config.ini")
+    if os.path.exists(config):
+        with open(config, encoding="utf-8", mode="r") as file:
+            lines = sorted(line.strip() for line in file if line.strip())
+        sha.update("\n".join(lines).encode("utf-8"))
+    return sha.hexdigest()
+
+
+def load_metadata(avd_name: str) -> dict[str, Any]:
+    path = os.path.join(avd_dir(avd_name), METADATA_FILE)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding="utf-8", mode="r") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_metadata(avd_name: str, metadata: dict[str, Any]) -> None:
+    path = os.path.join(avd_dir(avd_name), METADATA_FILE)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, encoding="utf-8", mode="w") as file:
+        json.dump(metadata, file, indent=2)
+
+
+def has_valid_snapshot(avd_name: str, system_image: str) -> bool:
+    """True if the clean snapshot exists and matches the current system image and config"""
+    metadata = load_metadata(avd_name)
+    if metadata.get("fingerprint") != fingerprint(avd_name, system_image):
+        return False
+    return os.path.isdir(os.path.join(avd_dir(avd_name), "snapshots", SNAPSHOT_NAME))
+
+
+def invalidate(avd_name: str) -> None:
+    """Deletes the clean snapshot so the next boot is a cold boot"""
+    shutil.rmtree(
+        os.path.join(avd_dir(avd_name), "snapshots", SNAPSHOT_NAME), ignore_errors=True
+    )
+    metadata = load_metadata(avd_name)
+    metadata.pop("fingerprint", None)
+    save_metadata(avd_name, metadata)
+
+
+def emulator_args(warm: bool) -> list[str]:
+    """Emulator flags for a warm (snapshot) or cold boot.
+
+    The snapshot itself is never overwritten."""
+    if warm:
+        return ["-snapshot", SNAPSHOT_NAME, "-no-snapshot-save"]
+    return ["-no-snapshot-load", "-no-snapshot-save"]
+
+
+def save_snapshot(serial: str, avd_name: str, system_image: str) -> bool:
+    """Saves the state of the running emulator as the clean snapshot"""
+    rtn = exec_cmd(
+        ["adb", "-s", serial, "emu", "avd", "snapshot", "save", SNAPSHOT_NAME],
+        ignore_errors=True,
+        timeout=300,
+    )
+    if rtn != 0:
+        print(f"Could not save snapshot {SNAPSHOT_NAME} for {avd_name}")
+        return False
+    metadata = load_metadata(avd_name)
+    metadata["fingerprint"] = fingerprint(avd_name, system_image)
+    metadata["system_image"] = system_image
+    metadata["created"] = time.time()
+    save_metadata(avd_name, metadata)
+    return True
+
+
+def record_boot_time(avd_name: str, warm: bool, seconds: float) -> None:
+    """Stores the latest cold/warm boot-to-ready time and prints both for comparison"""
+    metadata = load_metadata(avd_name)
+    key = "warm_boot_seconds" if warm else "cold_boot_seconds"
+    metadata[key] = round(seconds, 2)
+    save_metadata(avd_name, metadata)
+    print(boot_time_summary(metadata))
+
+
+def boot_time_summary(metadata: dict[str, Any]) -> str:
+    def fmt(value: float | None) -> str:
+        return f"{value:.2f}s" if value is not None else "n/a"
+
+    cold = metadata.get("cold_boot_seconds")
+    warm = metadata.get("warm_boot_seconds")
+    return f"Boot to ready: cold {fmt(cold)}, warm {fmt(warm)}"
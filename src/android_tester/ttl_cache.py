@@ -0,0 +1,48 @@
+"""
+Per-device cache shared by the property snapshots (props) and the package index (packages):
+one entry per serial, older than the ttl counts as missing, our own changes invalidate it.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Generic, Protocol, TypeVar
+
+
+class Entry(Protocol):  # pylint: disable=too-few-public-methods
+    """What is cached: something read from a device at fetched_at"""
+
+    serial: str
+    fetched_at: float  # time.monotonic()
+
+
+E = TypeVar("E", bound=Entry)
+
+
+class TtlCache(Generic[E]):
+    """Entries per serial, thread safe"""
+
+    def __init__(self, ttl: float) -> None:
+        self.ttl = ttl
+        self.entries: dict[str, E] = {}
+        self.lock = threading.Lock()
+
+    def cached(self, serial: str, max_age: float | None = None) -> E | None:
+        max_age = self.ttl if max_age is None else max_age
+        with self.lock:
+            entry = self.entries.get(serial)
+        if entry is not None and time.monotonic() - entry.fetched_at <= max_age:
+            return entry
+        return None
+
+    def put(self, entry: E) -> None:
+        with self.lock:
+            self.entries[entry.serial] = entry
+
+    def invalidate(self, serial: str | None = None) -> None:
+        with self.lock:
+            if serial is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(serial, None)
@@ -0,0 +1,82 @@
+"""
+Tests the in-process adb client against the fake adb server.
+"""
+
+import unittest
+
+from android_tester.adb_client import AdbClient, AdbError, get_client
+from android_tester.common import get_live_devices, query_adb_devices
+from android_tester.simulator import FakeToolchain, make_device
+
+DEVICES = [
+    make_device(
+        "R58M1",
+        model="Galaxy S10",
+        packages=["org.example.app", "org.example.app.test", "com.other"],
+    ),
+    make_device("emulator-5554", model="sdk_gphone64", avd_name="test_33"),
+]
+
+
+class AdbClientTester(unittest.TestCase):
+    """Wire protocol tester."""
+
+    def test_host_and_shell(self) -> None:
+        """host:devices-l, host:transport and shell: round trips."""
+        with FakeToolchain(DEVICES, adb_server=True) as sim:
+            client = AdbClient(port=sim.server.port)
+            self.assertEqual(41, client.version())
+            lines = client.devices_l()
+            self.assertEqual(
+                ["R58M1", "emulator-5554"], [line.split()[0] for line in lines]
+            )
+            self.assertIn("model:Galaxy_S10", lines[0])
+            self.assertEqual(
+                "test_33",
+                client.shell("emulator-5554", "getprop ro.boot.qemu.avd_name").strip(),
+            )
+            with self.assertRaises(AdbError):
+                client.shell("missing", "true")
+
+    def test_sync(self) -> None:
+        """sync: push, stat and pull."""
+        with FakeToolchain(DEVICES, adb_server=True) as sim:
+            client = AdbClient(port=sim.server.port)
+            data = bytes(range(256)) * 1000
+            client.push("R58M1", data, "/data/local/tmp/blob", mtime=1234)
+            mode, size, mtime = client.stat("R58M1", "/data/local/tmp/blob")
+            self.assertEqual((len(data), 1234), (size, mtime))
+            self.assertTrue(mode & 0o100000)
+            self.assertEqual((0, 0, 0), client.stat("R58M1", "/missing"))
+            self.assertEqual(data, client.pull("R58M1", "/data/local/tmp/blob"))
+            with self.assertRaises(AdbError):
+                client.pull("R58M1", "/missing")
+
+    def test_device_methods_use_socket(self) -> None:
+        """The existing Device helpers go through the socket client, no adb process."""
+        with FakeToolchain(DEVICES, adb_server=True) as sim:
+            self.assertEqual(2, len(query_adb_devices()))
+            devices = get_live_devices()
+            self.assertEqual(["unknown", "test_33"], [d.name for d in devices])
+            device = devices[0]
+            self.assertEqual(
+                ["org.example.app", "org.example.app.test"],
+                device.list_packages("org.example"),
+            )
+            device.uninstall("org.example.app.test")
+            self.assertEqual(["org.example.app"], device.list_packages("org.example"))
+            self.assertEqual([], sim.events("adb"))
+            self.assertIn("host:devices-l", sim.server.services)
+
+    def test_server_gone(self) -> None:
+        """Once the adb server stops answering the helpers fall back to the adb executable."""
+        with FakeToolchain(DEVICES, adb_server=True) as sim:
+            self.assertIsNotNone(get_client())
+            sim.server.stop()
+            self.assertEqual(2, len(query_adb_devices()))
+            self.assertIsNone(get_client())
+            self.assertEqual(["devices", "-l"], sim.events("adb")[0]["args"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+"""
+Tests timeouts, cancellation and the sync wrappers of the asyncio API.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import io
+import os
+import subprocess
+import tempfile
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from android_tester import aio
+from android_tester.adb_client import get_client
+from android_tester.common import Device, exec_cmd
+from android_tester.simulator import FakeToolchain, make_device
+
+
+def is_gone(pid: int) -> bool:
+    """True once the process no longer exists or is a zombie"""
+    try:
+        with open(f"/proc/{pid}/stat", encoding="utf-8") as file:
+            return file.read().split(")")[-1].split()[0] == "Z"
+    except FileNotFoundError:
+        return True
+
+
+def wait_gone(pid: int, timeout: float = 3) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if is_gone(pid):
+            return True
+        time.sleep(0.05)
+    return False
+
+
+@unittest.skipUnless(os.path.isdir("/proc"), "needs /proc")
+class AioTester(unittest.TestCase):
+    """asyncio API tester."""
+
+    def spawn_tree(self, pid_file: str) -> list[str]:
+        # The shell starts a grandchild and waits on it.
+        return ["/bin/sh", "-c", f"sleep 30 & echo $! > {pid_file}; wait"]
+
+    def test_timeout_kills_tree(self) -> None:
+        """A timeout kills the grandchild too."""
+        with tempfile.TemporaryDirectory() as tmp:
+            pid_file = os.path.join(tmp, "pid")
+            with self.assertRaises(subprocess.TimeoutExpired):
+                aio.run_sync(aio.run(self.spawn_tree(pid_file), timeout=0.5))
+            with open(pid_file, encoding="utf-8") as file:
+                self.assertTrue(wait_gone(int(file.read())))
+
+    def test_cancel_kills_tree(self) -> None:
+        """Cancelling the task kills the grandchild too."""
+
+        async def cancel_later(pid_file: str) -> None:
+            task = asyncio.create_task(aio.run(self.spawn_tree(pid_file)))
+            await asyncio.sleep(0.5)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        with tempfile.TemporaryDirectory() as tmp:
+            pid_file = os.path.join(tmp, "pid")
+            aio.run_sync(cancel_later(pid_file))
+            with open(pid_file, encoding="utf-8") as file:
+                self.assertTrue(wait_gone(int(file.read())))
+
+    def test_sync_wrappers(self) -> None:
+        """The blocking helpers keep their behavior on top of aio."""
+        self.assertEqual(3, exec_cmd(["/bin/sh", "-c", "exit 3"], ignore_errors=True))
+        with self.assertRaises(SystemExit):
+            exec_cmd("exit 4")
+        # No shell: metacharacters are plain arguments, input replaces a pipe.
+        self.assertEqual(["echo", "a|b", "$HOME"], aio.split_cmd("echo 'a|b' '$HOME'"))
+        self.assertEqual(
+            0, exec_cmd(["sh", "-c", 'read answer && test "$answer" = y'], input=b"y\n")
+        )
+        self.assertEqual(127, exec_cmd(["no-such-command"], ignore_errors=True))
+        with FakeToolchain([make_device("R58M1", packages=["a.b", "a.b.test"])]):
+            device = Device("unknown", "device", "R58M1", False, "", "", "", "1")
+            self.assertEqual(["a.b", "a.b.test"], device.list_packages("a.b"))
+            device.uninstall("a.b.test")
+            self.assertEqual(["a.b"], device.list_packages("a.b"))
+            with self.assertRaises(SystemExit):
+                device.uninstall("missing")
+
+    def test_inherited_output_follows_sys_stdout(self) -> None:
+        """Without a file descriptor to inherit (the daemon's stdout) it goes to sys.stdout."""
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            exec_cmd(["/bin/sh", "-c", "echo from the child"])
+        self.assertIn("from the child", out.getvalue())
+
+    def test_concurrent_uninstall(self) -> None:
+        """Many devices are driven from one thread."""
+        devices = [make_device(f"R58M{i}", packages=["a.b"]) for i in range(4)]
+
+        async def uninstall_all() -> list[bool]:
+            return await asyncio.gather(
+                *(aio.uninstall(d["serial"], "a.b") for d in devices)
+            )
+
+        with FakeToolchain(devices):
+            self.assertEqual([True] * 4, aio.run_sync(uninstall_all()))
+
+    def test_shared_loop(self) -> None:
+        """Blocking callers on any thread share one loop, so MAX_PROCESSES bounds them all."""
+
+        async def current_loop() -> asyncio.AbstractEventLoop:
+            return asyncio.get_running_loop()
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            loops = set(pool.map(lambda _: aio.run_sync(current_loop()), range(8)))
+        self.assertEqual(
+            {aio.background_loop()}, loops | {aio.run_sync(current_loop())}
+        )
+
+    def test_adb_shell_timeout(self) -> None:
+        """A shell over the adb server socket gives up at the timeout, the socket times out."""
+        with FakeToolchain([make_device("R58M1")], adb_server=True) as sim:
+            self.assertIsNotNone(get_client())
+            sim.server.latency = 2.0
+            start = time.monotonic()
+            with self.assertRaises(TimeoutError):
+                aio.run_sync(aio.adb_shell("R58M1", "true", timeout=0.3))
+            self.assertLess(time.monotonic() - start, 1.5)
+
+    def test_wait_for_boot_offline(self) -> None:
+        """An offline device is polled until the timeout, the adb server's FAIL is not raised."""
+        with FakeToolchain([make_device("R58M1", state="offline")], adb_server=True):
+            self.assertFalse(
+                aio.run_sync(aio.wait_for_boot("R58M1", timeout=0.5, poll_interval=0.1))
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,10 +1,40 @@
 """
 Unit test file.
 """
+
+from __future__ import annotations
+
 import os
+import subprocess
+import sys
 import unittest
 
 COMMAND = "android-tester --help"
+STARTUP_BUDGET_US = 50_000  # imports of `--help`, interpreter startup included
+HEAVY_MODULES = [
+    "android_tester.android_tests",
+    "android_tester.aio",
+    "asyncio",
+    "subprocess",
+    "setenvironment",
+]
+
+
+def import_times(args: list[str]) -> list[tuple[str, int, bool]]:
+    """(module, cumulative import time in microseconds, imported at top level) per import"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    out = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        out.append((name.strip(), int(cumulative), not name.startswith("  ")))
+    return out
 
 
 class MainTester(unittest.TestCase):
@@ -15,6 +45,20 @@ class MainTester(unittest.TestCase):
         rtn = os.system(COMMAND)
         self.assertEqual(0, rtn)
 
+    def test_help_startup(self) -> None:
+        """--help imports argparse and nothing that runs tests."""
+        times = import_times(["-m", "android_tester.cli", "--help"])
+        imported = {
+            name
+            for name, _, _ in times + import_times(["-c", "import android_tester.cli"])
+        }
+        for module in HEAVY_MODULES:
+            self.assertNotIn(module, imported)
+        top_level = [(name, cumulative) for name, cumulative, top in times if top]
+        self.assertLess(
+            sum(cumulative for _, cumulative in top_level), STARTUP_BUDGET_US, top_level
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,114 @@
+"""
+Tests the resident daemon: commands forwarded to it and the emulator kept between test runs.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from android_tester import cli, daemon, reuse
+from android_tester.emulator import SDK_PACKAGES
+from android_tester.env import NO_DAEMON_ENV, OUTPUT_DIR_ENV
+from android_tester.simulator import FakeToolchain, make_device
+
+APP = "org.internetwatchdogs.androidmonitor"
+
+
+def run_cli(argv: list[str]) -> tuple[int, str]:
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        returncode = cli.main(argv)
+    return returncode, out.getvalue()
+
+
+def status() -> dict:
+    out = io.StringIO()
+    assert daemon.request("status", out=out) == 0
+    return json.loads(out.getvalue())
+
+
+class DaemonTester(unittest.TestCase):
+    """Daemon tester."""
+
+    def test_forwarded_commands(self) -> None:
+        devices = [make_device("R58M1", packages=[APP, f"{APP}.test", "com.other"])]
+        with FakeToolchain(devices) as sim:
+            self.assertIsNone(daemon.request("status"))
+            self.assertEqual(0, daemon.start())
+            try:
+                self.assertEqual(0, daemon.start())  # already running
+                returncode, output = run_cli(["uninstall", APP])
+                self.assertEqual(0, returncode)
+                self.assertIn(f"R58M1: uninstall {APP}.test: Success", output)
+                with self.assertRaises(SystemExit), contextlib.redirect_stderr(
+                    io.StringIO()
+                ):
+                    run_cli(
+                        ["uninstall", "--bogus"]
+                    )  # parsed in the client, never sent
+                self.assertEqual(1, status()["runs"])
+            finally:
+                self.assertEqual(0, daemon.stop())
+            self.assertEqual(1, daemon.stop())
+            uninstalls = [
+                event
+                for event in sim.events("adb")
+                if "pm uninstall" in " ".join(event["args"])
+            ]
+            self.assertEqual(1, len(uninstalls))
+            self.assertNotIn("com.other", " ".join(uninstalls[0]["args"]))
+
+    def test_emulator_reused_between_runs(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp, FakeToolchain(
+            [], avds=["Pixel_API_30"], sdk_packages=SDK_PACKAGES
+        ) as sim:
+            self.assertEqual(0, daemon.start())
+            try:
+                first = run_cli(["test", "--api", "30", "--report-dir", tmp])
+                second = run_cli(["--api", "30", "--report-dir", tmp])
+                state = status()
+            finally:
+                daemon.stop()
+            starts = [
+                event for event in sim.events("emulator") if event["event"] == "start"
+            ]
+            resets = [
+                event
+                for event in sim.events("adb")
+                if "kill-all" in " ".join(map(str, event.get("args", [])))
+            ]
+            stats = reuse.load_stats()
+        self.assertEqual(0, first[0], first[1])
+        self.assertEqual(0, second[0], second[1])
+        self.assertNotIn("Reusing emulator", first[1])
+        self.assertIn("Reusing emulator emulator-5554", second[1])
+        self.assertEqual(1, len(starts))
+        self.assertEqual(
+            (1, 1, "emulator-5554"),
+            (state["emulator_boots"], state["emulator_reuses"], state["emulator"]),
+        )
+        # The kept emulator went through the health check and reset like any reused one.
+        self.assertEqual(1, len(resets))
+        self.assertEqual(
+            (2, 1, {"none_running": 1}), (stats.runs, stats.hits, stats.misses)
+        )
+
+    def test_client_environment(self) -> None:
+        """A command runs with the client's environment and directory, then the daemon's."""
+        env = {"PATH": os.environ["PATH"], OUTPUT_DIR_ENV: "/tmp/client-out"}
+        before_env, before_cwd = dict(os.environ), os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp, daemon.client_environment(env, tmp):
+            self.assertEqual("/tmp/client-out", os.environ[OUTPUT_DIR_ENV])
+            self.assertEqual("1", os.environ[NO_DAEMON_ENV])
+            self.assertEqual(os.path.realpath(tmp), os.path.realpath(os.getcwd()))
+        self.assertEqual(before_env, dict(os.environ))
+        self.assertEqual(before_cwd, os.getcwd())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+"""
+Tests event driven device tracking against the fake adb server.
+"""
+
+import asyncio
+import time
+import unittest
+
+from android_tester.adb_client import AdbClient
+from android_tester.device_watcher import (
+    ADDED,
+    REMOVED,
+    STATE_CHANGED,
+    DeviceEvent,
+    DeviceRegistry,
+    DeviceWatcher,
+)
+from android_tester.simulator import FakeToolchain, make_device
+
+
+class DeviceWatcherTester(unittest.TestCase):
+    """Device watcher tester."""
+
+    def test_registry_follows_events(self) -> None:
+        """Devices appearing, changing state and leaving are seen without polling."""
+        with FakeToolchain([make_device("R58M1")], adb_server=True) as sim:
+            client = AdbClient(port=sim.server.port)
+            registry = DeviceRegistry(DeviceWatcher(client=client)).start()
+            events: list[DeviceEvent] = []
+            registry.watcher.add_callback(events.append)
+            try:
+                self.assertEqual(["R58M1"], [d.serial for d in registry.devices()])
+                start = time.monotonic()
+                sim.server.add_device(
+                    make_device("emulator-5554", avd_name="test_33", state="offline")
+                )
+                device = registry.wait_for(lambda d: d.emulator, timeout=5)
+                self.assertIsNotNone(device)
+                self.assertLess(time.monotonic() - start, 1.0)
+                sim.server.set_state("emulator-5554", "device")
+                device = registry.wait_for(
+                    lambda d: d.emulator and d.online == "device", timeout=5
+                )
+                assert device is not None
+                self.assertEqual("test_33", device.name)
+                sim.server.remove_device("R58M1")
+                self.assertIsNotNone(
+                    registry.wait_for(lambda d: len(registry.devices()) == 1, timeout=5)
+                )
+                self.assertEqual(
+                    [ADDED, STATE_CHANGED, REMOVED], [e.kind for e in events]
+                )
+            finally:
+                registry.stop()
+
+    def test_slow_props_do_not_hold_up_events(self) -> None:
+        """A slow getprop of one device does not delay the events of the others."""
+        with FakeToolchain([], adb_server=True) as sim:
+            registry = DeviceRegistry(
+                DeviceWatcher(client=AdbClient(port=sim.server.port))
+            ).start()
+            try:
+                sim.server.latency = 0.5  # per request, a getprop takes two
+                sim.server.add_device(make_device("emulator-5554"))
+                start = time.monotonic()
+                sim.server.add_device(make_device("emulator-5556", state="offline"))
+                self.assertIsNotNone(
+                    registry.wait_for(lambda d: d.serial == "emulator-5556", timeout=5)
+                )
+                self.assertLess(time.monotonic() - start, 0.5)
+                self.assertIsNone(
+                    registry.get("emulator-5554")
+                )  # its properties are still being read
+                self.assertIsNotNone(
+                    registry.wait_for(lambda d: d.serial == "emulator-5554", timeout=5)
+                )
+            finally:
+                registry.stop()
+
+    def test_asyncio_queue(self) -> None:
+        """Events can be consumed from an asyncio queue."""
+
+        async def consume(watcher: DeviceWatcher, sim: FakeToolchain) -> str:
+            queue = watcher.queue()
+            sim.server.add_device(make_device("emulator-5556"))
+            event = await asyncio.wait_for(queue.get(), timeout=5)
+            return f"{event.kind} {event.serial}"
+
+        with FakeToolchain([], adb_server=True) as sim:
+            client = AdbClient(port=sim.server.port)
+            watcher = DeviceWatcher(client=client).start()
+            try:
+                self.assertEqual(
+                    "added emulator-5556", asyncio.run(consume(watcher, sim))
+                )
+            finally:
+                watcher.stop()
+
+
+if __name__ == "__main__":
+    unittest.main()
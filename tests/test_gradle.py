@@ -0,0 +1,51 @@
+"""
+Tests the gradle orchestration against the fake gradle.
+"""
+
+import os
+import tempfile
+import unittest
+
+from android_tester.gradle import BUILD_TASKS, GRADLE_FLAGS, build_once, run_gradle
+from android_tester.simulator import FakeToolchain
+
+
+class GradleTester(unittest.TestCase):
+    """Gradle orchestration tester."""
+
+    def test_build_once_single_invocation(self) -> None:
+        with FakeToolchain([], gradle_duration=0.4) as sim:
+            with tempfile.TemporaryDirectory() as tmpdir:
+                run = build_once(
+                    cwd=tmpdir, log_path=os.path.join(tmpdir, "logs", "build.log")
+                )
+                self.assertTrue(run.ok)
+                with open(
+                    os.path.join(tmpdir, "logs", "build.log"), encoding="utf-8"
+                ) as file:
+                    self.assertIn("> Task :app:assembleDebugAndroidTest", file.read())
+            starts = [
+                event for event in sim.events("gradle") if event["event"] == "start"
+            ]
+            self.assertEqual(1, len(starts))
+            args = starts[0]["args"]
+            self.assertEqual(BUILD_TASKS, args[-len(BUILD_TASKS) :])
+            for flag in GRADLE_FLAGS:
+                self.assertIn(flag, args)
+        self.assertIsNotNone(run.configured)
+        self.assertGreaterEqual(run.configuration_time, 0.15)
+        self.assertGreaterEqual(run.execution_time, 0.15)
+
+    def test_failed_run_timing(self) -> None:
+        with FakeToolchain([], gradle_duration=0.0, gradle_fail_serials=["R58M1"]):
+            env = dict(os.environ, ANDROID_SERIAL="R58M1")
+            run = run_gradle(["connectedCheck"], env=env, extra_args=["-Pfoo=1"])
+        self.assertFalse(run.ok)
+        self.assertIn("-Pfoo=1", run.args)
+        self.assertLessEqual(
+            run.configuration_time + run.execution_time, run.end - run.start + 1e-6
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
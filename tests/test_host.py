@@ -0,0 +1,162 @@
+"""
+Tests the host resource planning against synthetic /proc files, and a pool run that queues
+the shards which do not fit.
+"""
+
+from __future__ import annotations
+
+import os
+import tempfile
+import unittest
+
+from android_tester.android_tests import run_sharded_tests
+from android_tester.emulator_pool import EmulatorPool
+from android_tester.host import HostResources, plan_emulators, read_host
+from android_tester.report import start_report
+from android_tester.simulator import FakeToolchain
+
+CPUINFO = "".join(
+    f"processor\t: {i}\nmodel name\t: Fake CPU\nflags\t\t: vmx\n\n" for i in range(8)
+)
+MEMINFO = "MemTotal:       16384000 kB\nMemFree:         1024000 kB\nMemAvailable:    8192000 kB\n"
+LOADAVG = "1.50 1.20 0.90 2/345 6789\n"
+
+
+def write_proc(root: str, kvm: bool = True) -> tuple[str, str]:
+    """Writes the fixture /proc and /dev under root, returns their paths"""
+    proc, dev = os.path.join(root, "proc"), os.path.join(root, "dev")
+    os.makedirs(proc)
+    os.makedirs(dev)
+    for name, text in [
+        ("cpuinfo", CPUINFO),
+        ("meminfo", MEMINFO),
+        ("loadavg", LOADAVG),
+    ]:
+        with open(os.path.join(proc, name), encoding="utf-8", mode="w") as file:
+            file.write(text)
+    if kvm:
+        with open(os.path.join(dev, "kvm"), encoding="utf-8", mode="w") as file:
+            file.write("")
+    return proc, os.path.join(dev, "kvm")
+
+
+class HostTester(unittest.TestCase):
+    """Host tester."""
+
+    def test_read_host(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            host = read_host(*write_proc(tmp))
+            self.assertEqual(
+                (8, 8000, 1.5, True),
+                (host.cpus, host.memory_available_mb, host.load, host.kvm),
+            )
+        with tempfile.TemporaryDirectory() as tmp:
+            self.assertFalse(read_host(*write_proc(tmp, kvm=False)).kvm)
+
+    def test_plan(self) -> None:
+        big = HostResources(cpus=32, memory_available_mb=64000, load=0.0, kvm=True)
+        plan = plan_emulators(4, big)
+        self.assertEqual(
+            (4, 0, 4, 2048, "on", ""),
+            (
+                plan.slots,
+                plan.queued,
+                plan.cores,
+                plan.memory_mb,
+                plan.accel,
+                plan.reason,
+            ),
+        )
+        self.assertEqual(
+            [
+                "-cores",
+                "4",
+                "-memory",
+                "2048",
+                "-gpu",
+                "swiftshader_indirect",
+                "-accel",
+                "on",
+            ],
+            plan.emulator_args(),
+        )
+        # 8 cpus, one reserved and 1.5 busy: two emulators of two cores.
+        with tempfile.TemporaryDirectory() as tmp:
+            plan = plan_emulators(4, read_host(*write_proc(tmp)))
+        self.assertEqual(
+            (2, 2, 2, "cpu"), (plan.slots, plan.queued, plan.cores, plan.reason)
+        )
+        # Memory bound: the instances get less memory before fewer are booted.
+        plan = plan_emulators(
+            6, HostResources(cpus=32, memory_available_mb=8192, load=0.0, kvm=True)
+        )
+        self.assertEqual((4, 1536, "memory"), (plan.slots, plan.memory_mb, plan.reason))
+        plan = plan_emulators(
+            3, HostResources(cpus=32, memory_available_mb=64000, load=0.0, kvm=False)
+        )
+        self.assertEqual((1, "off", "kvm"), (plan.slots, plan.accel, plan.reason))
+        plan = plan_emulators(
+            2, HostResources(cpus=8, memory_available_mb=None, load=0.0, kvm=None)
+        )
+        self.assertEqual(
+            ["-cores", "3", "-gpu", "swiftshader_indirect"], plan.emulator_args()
+        )
+
+    def test_pool_queues_shards(self) -> None:
+        """Three shards on the two emulators the host fits, the plan is in the report."""
+        plan = plan_emulators(
+            3, HostResources(cpus=5, memory_available_mb=64000, load=0.0, kvm=True)
+        )
+        self.assertEqual(2, plan.slots)
+        report = start_report()
+        with FakeToolchain([], avds=["Pixel_API_33"], boot_duration=0.3) as sim:
+            with tempfile.TemporaryDirectory() as output_root, EmulatorPool(
+                3, use_snapshot=False, plan=plan
+            ) as pool:
+                self.assertEqual(2, len(pool.running_devices))
+                results = run_sharded_tests(
+                    pool.running_devices, output_root=output_root, num_shards=3
+                )
+            self.assertTrue(all(result.ok for result in results))
+            starts = [
+                event for event in sim.events("emulator") if event["event"] == "start"
+            ]
+            self.assertEqual(2, len(starts))
+            self.assertTrue(
+                all(
+                    " ".join(plan.emulator_args()) in " ".join(event["args"])
+                    for event in starts
+                )
+            )
+            shards = sorted(
+                arg
+                for event in sim.events("gradle")
+                if event["event"] == "start"
+                for arg in event["args"]
+                if "shardIndex" in arg
+            )
+            self.assertEqual(
+                [
+                    f"-Pandroid.testInstrumentationRunnerArguments.shardIndex={i}"
+                    for i in range(3)
+                ],
+                shards,
+            )
+            # Teardown: every instance is told to shut down before waiting for any of them.
+            calls = [
+                event["args"] for event in sim.events("adb") if event["event"] == "call"
+            ]
+            kills = [i for i, args in enumerate(calls) if args == ["emu", "kill"]]
+            waits = [
+                i
+                for i, args in enumerate(calls)
+                if args == ["shell", "true"] and i > min(kills)
+            ]
+            self.assertEqual(2, len(kills))
+            self.assertLess(max(kills), min(waits))
+        self.assertEqual(1, report.to_dict()["host"]["queued"])
+        self.assertIn("Host: 2 of 3 emulators at once", report.summary_table())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+"""
+Tests that unchanged APKs are not pushed again.
+"""
+
+import os
+import tempfile
+import unittest
+
+from android_tester import aio
+from android_tester.install_cache import InstallCache, install_if_changed
+from android_tester.simulator import FakeToolchain, make_device
+
+PACKAGE = "org.internetwatchdogs.androidmonitor"
+
+
+def installs(sim: FakeToolchain) -> int:
+    return len([event for event in sim.events("adb") if event["event"] == "install"])
+
+
+class InstallCacheTester(unittest.TestCase):
+    """Install cache tester."""
+
+    def test_skip_unchanged(self) -> None:
+        with FakeToolchain(
+            [make_device("R58M1")]
+        ) as sim, tempfile.TemporaryDirectory() as tmpdir:
+            apk = os.path.join(tmpdir, "app.apk")
+            with open(apk, encoding="utf-8", mode="w") as file:
+                file.write(PACKAGE)
+            cache_path = os.path.join(tmpdir, "cache.json")
+            self.assertTrue(
+                aio.run_sync(
+                    install_if_changed("R58M1", apk, PACKAGE, InstallCache(cache_path))
+                )
+            )
+            # A fresh cache object reads the persisted entry.
+            self.assertFalse(
+                aio.run_sync(
+                    install_if_changed("R58M1", apk, PACKAGE, InstallCache(cache_path))
+                )
+            )
+            self.assertEqual(1, installs(sim))
+
+            # Changed APK
+            with open(apk, encoding="utf-8", mode="w") as file:
+                file.write(PACKAGE + "\n")
+            cache = InstallCache(cache_path)
+            self.assertTrue(
+                aio.run_sync(install_if_changed("R58M1", apk, PACKAGE, cache))
+            )
+            self.assertEqual(2, installs(sim))
+
+            # Removed from the device behind the cache's back
+            aio.run_sync(aio.uninstall("R58M1", PACKAGE))
+            self.assertTrue(
+                aio.run_sync(install_if_changed("R58M1", apk, PACKAGE, cache))
+            )
+            self.assertEqual(3, installs(sim))
+
+
+if __name__ == "__main__":
+    unittest.main()
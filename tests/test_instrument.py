@@ -0,0 +1,138 @@
+"""
+Tests the direct install + am instrument path against the fake adb.
+"""
+
+import os
+import tempfile
+import unittest
+import xml.etree.ElementTree as ET
+
+from android_tester.common import get_live_devices
+from android_tester.instrument import InstrumentationParser, run_direct
+from android_tester.simulator import FakeToolchain, make_device, make_test
+
+RAW_OUTPUT = """INSTRUMENTATION_STATUS: class=com.example.FooTest
+INSTRUMENTATION_STATUS: current=1
+INSTRUMENTATION_STATUS: numtests=3
+INSTRUMENTATION_STATUS: test=testPass
+INSTRUMENTATION_STATUS_CODE: 1
+INSTRUMENTATION_STATUS: class=com.example.FooTest
+INSTRUMENTATION_STATUS: test=testPass
+INSTRUMENTATION_STATUS_CODE: 0
+INSTRUMENTATION_STATUS: class=com.example.FooTest
+INSTRUMENTATION_STATUS: test=testFail
+INSTRUMENTATION_STATUS_CODE: 1
+INSTRUMENTATION_STATUS: class=com.example.FooTest
+INSTRUMENTATION_STATUS: stack=java.lang.AssertionError: expected 1
+\tat com.example.FooTest.testFail(FooTest.java:12)
+INSTRUMENTATION_STATUS: test=testFail
+INSTRUMENTATION_STATUS_CODE: -2
+INSTRUMENTATION_STATUS: class=com.example.FooTest
+INSTRUMENTATION_STATUS: test=testIgnored
+INSTRUMENTATION_STATUS_CODE: -3
+INSTRUMENTATION_RESULT: stream=
+Time: 0.5
+
+FAILURES!!!
+INSTRUMENTATION_CODE: -1
+"""
+
+TESTS = [make_test("com.example.FooTest", f"test{i}") for i in range(6)]
+
+
+class InstrumentTester(unittest.TestCase):
+    """Direct instrumentation tester."""
+
+    def test_parse_raw_output(self) -> None:
+        parser = InstrumentationParser("emulator-5554")
+        for line in RAW_OUTPUT.splitlines(keepends=True):
+            parser.feed(line)
+        result = parser.close()
+        self.assertEqual(
+            ["passed", "failed", "skipped"], [test.status for test in result.tests]
+        )
+        self.assertIn("FooTest.java:12", result.tests[1].stack)
+        self.assertEqual(-1, result.code)
+        self.assertIn("FAILURES!!!", result.result["stream"])
+        self.assertFalse(result.ok)
+
+    def test_crash_mid_test(self) -> None:
+        parser = InstrumentationParser("emulator-5554")
+        for line in RAW_OUTPUT.splitlines()[:5] + [
+            "INSTRUMENTATION_RESULT: shortMsg=Process crashed.",
+            "INSTRUMENTATION_CODE: 0",
+        ]:
+            parser.feed(line)
+        result = parser.close()
+        self.assertEqual(["error"], [test.status for test in result.tests])
+        self.assertIn("Process crashed", result.summary())
+
+    def test_run_direct_sharded(self) -> None:
+        devices = [make_device("emulator-5554"), make_device("192.168.1.5:5555")]
+        with FakeToolchain(
+            devices, instrumentation=TESTS
+        ) as sim, tempfile.TemporaryDirectory() as tmpdir:
+            apks = []
+            for package in [
+                "org.internetwatchdogs.androidmonitor",
+                "org.internetwatchdogs.androidmonitor.test",
+            ]:
+                apks.append((os.path.join(tmpdir, f"{package}.apk"), package))
+                with open(apks[-1][0], encoding="utf-8", mode="w") as file:
+                    file.write(package)
+            output_root = os.path.join(tmpdir, "out")
+            # Left over from an earlier run in the same output dir, must not be counted again.
+            stale_dir = os.path.join(
+                output_root, "emulator-5554", "androidTest-results", "connected"
+            )
+            os.makedirs(stale_dir)
+            with open(
+                os.path.join(stale_dir, "TEST-old.xml"), encoding="utf-8", mode="w"
+            ) as file:
+                file.write(
+                    '<testsuite name="stale" tests="3" failures="3" errors="0" '
+                    'skipped="0" time="1" />'
+                )
+            results = run_direct(
+                get_live_devices(),
+                output_root=output_root,
+                shard=True,
+                apks=tuple(apks),
+            )
+            self.assertTrue(all(result.ok for result in results))
+            self.assertEqual(
+                4,
+                len(
+                    [
+                        event
+                        for event in sim.events("adb")
+                        if event["event"] == "install"
+                    ]
+                ),
+            )
+            for result in results:
+                self.assertIn("install_time", result.extra)
+            # A network serial is sanitized in the file name as in the directory name.
+            self.assertTrue(
+                os.path.exists(
+                    os.path.join(
+                        output_root,
+                        "192.168.1.5_5555",
+                        "androidTest-results",
+                        "connected",
+                        "TEST-192.168.1.5_5555.xml",
+                    )
+                )
+            )
+            merged = ET.parse(os.path.join(output_root, "TEST-merged.xml")).getroot()
+            self.assertEqual("6", merged.get("tests"))
+            self.assertEqual("0", merged.get("failures"))
+            self.assertFalse(os.path.exists(os.path.join(stale_dir, "TEST-old.xml")))
+
+    def test_missing_apks(self) -> None:
+        with self.assertRaises(FileNotFoundError):
+            run_direct([], apks=(("/nonexistent/app.apk", "org.example"),))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+"""
+Tests merging of sharded JUnit XML results.
+"""
+
+import os
+import tempfile
+import unittest
+import xml.etree.ElementTree as ET
+
+from android_tester.junit import find_junit_xml, merge_junit_xml
+
+SHARD = """<?xml version='1.0' encoding='UTF-8' ?>
+<testsuite name="com.example.Test" tests="{tests}" failures="{failures}" errors="0" skipped="0" time="{time}">
+  <testcase name="test{index}" classname="com.example.Test" time="{time}" />
+</testsuite>
+"""
+
+
+class JunitTester(unittest.TestCase):
+    """JUnit merge tester."""
+
+    def test_merge_shards(self) -> None:
+        """Counters are summed and every suite is kept."""
+        with tempfile.TemporaryDirectory() as tmp:
+            for i in range(3):
+                shard_dir = os.path.join(
+                    tmp,
+                    f"emulator-555{i}",
+                    "build",
+                    "app",
+                    "outputs",
+                    "androidTest-results",
+                    "connected",
+                )
+                os.makedirs(shard_dir)
+                with open(
+                    os.path.join(shard_dir, "TEST-shard.xml"),
+                    encoding="utf-8",
+                    mode="w",
+                ) as file:
+                    file.write(
+                        SHARD.format(index=i, tests=2, failures=i % 2, time="1.5")
+                    )
+            paths = find_junit_xml(tmp)
+            self.assertEqual(3, len(paths))
+            out = os.path.join(tmp, "merged.xml")
+            merge_junit_xml(paths, out)
+            root = ET.parse(out).getroot()
+            self.assertEqual("testsuites", root.tag)
+            self.assertEqual("6", root.get("tests"))
+            self.assertEqual("1", root.get("failures"))
+            self.assertEqual("4.500", root.get("time"))
+            self.assertEqual(3, len(root.findall("testsuite")))
+
+    def test_merge_skips_unparsable(self) -> None:
+        """A truncated file (a crashed run) is skipped with a warning."""
+        with tempfile.TemporaryDirectory() as tmp:
+            good = os.path.join(tmp, "TEST-good.xml")
+            bad = os.path.join(tmp, "TEST-bad.xml")
+            with open(good, encoding="utf-8", mode="w") as file:
+                file.write(SHARD.format(index=0, tests=2, failures=0, time="1.0"))
+            with open(bad, encoding="utf-8", mode="w") as file:
+                file.write("<testsuite name=")
+            with self.assertWarns(UserWarning):
+                root = merge_junit_xml([good, bad], os.path.join(tmp, "merged.xml"))
+            self.assertEqual("2", root.get("tests"))
+
+
+if __name__ == "__main__":
+    unittest.main()
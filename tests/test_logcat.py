@@ -0,0 +1,163 @@
+"""
+Tests the binary logcat parser, the app filter, the spilling ring buffer and per-test capture.
+"""
+
+import os
+import struct
+import subprocess
+import tempfile
+import unittest
+
+from android_tester.common import Device
+from android_tester.instrument import run_direct
+from android_tester.logcat import (
+    LogBuffer,
+    LogcatCapture,
+    LogcatFilter,
+    LogcatParser,
+    LogEntry,
+)
+from android_tester.simulator import FakeToolchain, make_device, make_test
+
+APP = "org.internetwatchdogs.androidmonitor"
+
+
+def entry_bytes(
+    pid: int, tag: str, message: str, priority: int = 4, hdr_size: int = 28
+) -> bytes:
+    payload = bytes([priority]) + tag.encode() + b"\0" + message.encode() + b"\0"
+    header = struct.pack(
+        "<HHiIII", len(payload), hdr_size, pid, pid, 1700000000, 5_000_000
+    )
+    return header + b"\0" * ((hdr_size or 20) - len(header)) + payload
+
+
+class LogcatTester(unittest.TestCase):
+    """Logcat tester."""
+
+    def test_parser(self) -> None:
+        data = entry_bytes(42, "MyTag", "hello\n") + entry_bytes(
+            7, "Old", "v1 header", priority=6, hdr_size=0
+        )
+        parser = LogcatParser()
+        # Fed one byte at a time, entries come out once complete.
+        entries = [
+            entry for i in range(len(data)) for entry in parser.feed(data[i : i + 1])
+        ]
+        self.assertEqual(
+            [
+                LogEntry(42, 42, 1700000000, 5_000_000, 4, "MyTag", "hello"),
+                LogEntry(7, 7, 1700000000, 5_000_000, 6, "Old", "v1 header"),
+            ],
+            entries,
+        )
+        self.assertEqual(b"", parser.pending)
+        self.assertTrue(entries[1].format().endswith("    7     7 E Old: v1 header"))
+
+    def test_filter(self) -> None:
+        log_filter = LogcatFilter([APP])
+
+        def keep(pid: int, tag: str, message: str = "") -> bool:
+            return log_filter.matches(LogEntry(pid, pid, 0, 0, 4, tag, message))
+
+        self.assertFalse(keep(1234, "App"))
+        self.assertFalse(
+            keep(1000, "ActivityManager", "Start proc 999:com.other/u0a1 for activity")
+        )
+        self.assertFalse(
+            keep(
+                1000,
+                "ActivityManager",
+                f"Start proc 1234:{APP}/u0a2 for added application",
+            )
+        )
+        self.assertTrue(keep(1234, "App"))
+        self.assertFalse(keep(999, "App"))
+        self.assertTrue(keep(999, "TestRunner"))
+
+    def test_buffer_spills(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            buffer = LogBuffer(
+                os.path.join(tmp, "segments"), max_lines=10, segment_lines=4
+            )
+            for i in range(25):
+                self.assertEqual(i, buffer.append(f"line {i}"))
+            self.assertLessEqual(len(buffer.memory), 10)
+            self.assertEqual(25, len(buffer))
+            self.assertTrue(
+                os.listdir(os.path.join(tmp, "segments"))[0].endswith(".log.gz")
+            )
+            self.assertEqual([f"line {i}" for i in range(25)], list(buffer.lines()))
+            self.assertEqual(["line 3", "line 4", "line 5"], list(buffer.lines(3, 6)))
+
+    def test_capture(self) -> None:
+        tests = [
+            make_test("com.example.MainTest", "works"),
+            make_test("com.example.MainTest", "breaks", "failed"),
+        ]
+        with tempfile.TemporaryDirectory() as tmp:
+            with FakeToolchain(
+                [make_device("R58M1", packages=[APP, f"{APP}.test"])],
+                instrumentation=tests,
+            ), LogcatCapture("R58M1", tmp) as capture:
+                subprocess.run(
+                    [
+                        "adb",
+                        "-s",
+                        "R58M1",
+                        "shell",
+                        "am",
+                        "instrument",
+                        "-r",
+                        "-w",
+                        f"{APP}.test/runner",
+                    ],
+                    capture_output=True,
+                    check=True,
+                )
+            self.assertEqual(
+                ["com.example.MainTest#works", "com.example.MainTest#breaks"],
+                list(capture.tests),
+            )
+            with open(
+                os.path.join(tmp, "logcat", "com.example.MainTest#breaks.log"),
+                encoding="utf-8",
+            ) as file:
+                broken = file.read()
+            self.assertIn("started: breaks(com.example.MainTest)", broken)
+            self.assertIn("running breaks", broken)
+            self.assertIn("failed: breaks", broken)
+            self.assertNotIn("running works", broken)
+            with open(os.path.join(tmp, "logcat", "app.log"), encoding="utf-8") as file:
+                app_log = file.read()
+            self.assertNotIn("chatty", app_log)
+            self.assertNotIn("logcat started", app_log)
+
+    def test_direct_run_captures_logcat(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            apks = []
+            for package in [APP, f"{APP}.test"]:
+                apks.append((os.path.join(tmp, f"{package}.apk"), package))
+                with open(apks[-1][0], encoding="utf-8", mode="w") as file:
+                    file.write(package)
+            with FakeToolchain(
+                [make_device("R58M1")],
+                instrumentation=[make_test("com.example.MainTest", "works")],
+            ):
+                results = run_direct(
+                    [Device("unknown", "device", "R58M1", False, "", "", "", "1")],
+                    output_root=tmp,
+                    apks=tuple(apks),
+                )
+            self.assertTrue(results[0].ok)
+            self.assertTrue(
+                os.path.exists(
+                    os.path.join(
+                        tmp, "R58M1", "logcat", "com.example.MainTest#works.log"
+                    )
+                )
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+"""
+Tests the log pump: pipes are drained, triggers fire and the buffers stay bounded.
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from android_tester.logpump import BOOT_COMPLETED, LogPump, RotatingFile, run_logged
+
+# Writes far more than a pipe buffer (64 KiB) before the interesting line.
+NOISY_CHILD = """
+import sys, time
+for i in range(5000):
+    print("x" * 100, i)
+sys.stdout.flush()
+print("INFO    | Boot completed in 1234 ms", flush=True)
+time.sleep(30)
+"""
+
+
+class LogPumpTester(unittest.TestCase):
+    """Log pump tester."""
+
+    def test_trigger_after_full_pipe(self) -> None:
+        proc = subprocess.Popen(  # pylint: disable=consider-using-with
+            [sys.executable, "-c", NOISY_CHILD],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+        )
+        try:
+            pump = LogPump.attach(proc, "noisy", max_lines=100)
+            line = pump.wait_for(BOOT_COMPLETED, timeout=20)
+            self.assertIsNotNone(line)
+            self.assertIn("Boot completed", line or "")
+            self.assertEqual(len(pump.tail(1000)), 100)
+            # A trigger added after the line was seen fires from the buffer.
+            self.assertTrue(pump.add_trigger("Boot completed").event.is_set())
+        finally:
+            proc.kill()
+            proc.wait()
+        pump.join(5)
+        self.assertTrue(pump.done.is_set())
+
+    def test_wait_for_returns_none_at_eof(self) -> None:
+        proc = subprocess.Popen(  # pylint: disable=consider-using-with
+            [sys.executable, "-c", "print('hello')"], stdout=subprocess.PIPE
+        )
+        pump = LogPump.attach(proc, "short")
+        self.assertIsNone(pump.wait_for("never printed", timeout=10))
+        proc.wait()
+        self.assertEqual(pump.tail(), ["hello"])
+
+    def test_run_logged_rotates(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            log_path = os.path.join(tmpdir, "logs", "child.log")
+            rtn, pump = run_logged(
+                [sys.executable, "-c", "print('done'); raise SystemExit(3)"],
+                "child",
+                log_path=log_path,
+            )
+            self.assertEqual(rtn, 3)
+            self.assertEqual(pump.tail(), ["done"])
+            with open(log_path, encoding="utf-8") as file:
+                self.assertEqual(file.read(), "done\n")
+            rotating = RotatingFile(
+                os.path.join(tmpdir, "rot.log"), max_bytes=10, backup_count=2
+            )
+            for _ in range(5):
+                rotating.write("0123456789\n")
+            rotating.close()
+            self.assertEqual(
+                sorted(os.listdir(tmpdir)),
+                ["logs", "rot.log", "rot.log.1", "rot.log.2"],
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+"""
+Tests the package index: parsing, prefix/glob lookups, invalidation and batched uninstalls.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import unittest
+
+from android_tester.common import Device
+from android_tester.packages import (
+    PACKAGES,
+    PackageInfo,
+    parse_package_list,
+    uninstall_matching,
+)
+from android_tester.simulator import FakeToolchain, make_device
+
+APP = "org.internetwatchdogs.androidmonitor"
+DEVICES = [
+    make_device(f"R58M{i}", packages=[APP, f"{APP}.test", "com.other"])
+    for i in range(3)
+]
+
+
+def list_calls(sim: FakeToolchain) -> list[list[str]]:
+    return [
+        event["args"]
+        for event in sim.events("adb")
+        if "pm list packages" in " ".join(event["args"])
+    ]
+
+
+class PackagesTester(unittest.TestCase):
+    """Package index tester."""
+
+    def setUp(self) -> None:
+        PACKAGES.invalidate()
+
+    def test_parse(self) -> None:
+        output = (
+            "package:/data/app/~~x1==/com.a-y2==/base.apk=com.a versionCode:42 uid:10123\n"
+            "package:/system/app/B/B.apk=com.b\n"
+        )
+        self.assertEqual(
+            {
+                "com.a": PackageInfo(
+                    "com.a", "/data/app/~~x1==/com.a-y2==/base.apk", 42, 10123
+                ),
+                "com.b": PackageInfo("com.b", "/system/app/B/B.apk"),
+            },
+            parse_package_list(output),
+        )
+
+    def test_queries_are_cached(self) -> None:
+        with FakeToolchain(DEVICES[:1]) as sim:
+            device = Device("unknown", "device", "R58M0", False, "", "", "", "1")
+            self.assertEqual(
+                [APP, f"{APP}.test"], [info.name for info in device.find_packages(APP)]
+            )
+            self.assertEqual(
+                [f"{APP}.test"], [info.name for info in device.find_packages("*.test")]
+            )
+            self.assertEqual(["com.other"], device.list_packages("other"))
+            info = device.find_packages("com.other")[0]
+            self.assertEqual((1, 10102), (info.version_code, info.uid))
+            self.assertTrue(info.path.endswith("/base.apk"))
+            self.assertEqual(1, len(list_calls(sim)))
+            device.uninstall("com.other")
+            self.assertEqual([], device.find_packages("com.other"))
+            self.assertEqual(2, len(list_calls(sim)))
+
+    def test_uninstall_matching(self) -> None:
+        with FakeToolchain(DEVICES) as sim:
+            serials = [device["serial"] for device in DEVICES]
+            self.assertEqual(
+                {serial: [APP, f"{APP}.test"] for serial in serials},
+                uninstall_matching(serials, APP),
+            )
+            self.assertEqual(
+                {serial: [] for serial in serials}, uninstall_matching(serials, "org.*")
+            )
+            self.assertEqual(["com.other"], asyncio.run(PACKAGES.get("R58M0")).names)
+            uninstalls = [
+                event["args"]
+                for event in sim.events("adb")
+                if "pm uninstall" in " ".join(event["args"])
+            ]
+            # One command per device for both packages.
+            self.assertEqual(len(serials), len(uninstalls))
+
+
+if __name__ == "__main__":
+    unittest.main()
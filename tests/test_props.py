@@ -0,0 +1,50 @@
+"""
+Tests the batched getprop property snapshots.
+"""
+
+import unittest
+
+from android_tester.common import get_live_devices
+from android_tester.props import PROPS, parse_getprop
+from android_tester.simulator import FakeToolchain, make_device
+
+GETPROP = """[dalvik.vm.heapsize]: [512m]
+[ro.boot.qemu.avd_name]: [Pixel_6_API_33]
+[ro.build.version.sdk]: [33]
+[ro.product.cpu.abi]: [x86_64]
+[ro.product.model]: [sdk_gphone64_x86_64]
+[sys.boot_completed]: [1]
+[persist.sys.empty]: []
+"""
+
+
+class PropsTester(unittest.TestCase):
+    """Property snapshot tester."""
+
+    def test_parse(self) -> None:
+        """The full getprop dump is parsed, empty values included."""
+        props = parse_getprop(GETPROP)
+        self.assertEqual(7, len(props))
+        self.assertEqual("Pixel_6_API_33", props["ro.boot.qemu.avd_name"])
+        self.assertEqual("", props["persist.sys.empty"])
+
+    def test_one_getprop_per_device(self) -> None:
+        """Enumerating devices costs one getprop per device, cached afterwards."""
+        devices = [
+            make_device(f"emulator-{5554 + 2 * i}", avd_name=f"avd{i}")
+            for i in range(5)
+        ]
+        with FakeToolchain(devices, adb_server=True) as sim:
+            PROPS.invalidate()
+            found = get_live_devices()
+            self.assertEqual([f"avd{i}" for i in range(5)], [d.name for d in found])
+            self.assertEqual({33}, {d.api_level for d in found})
+            self.assertTrue(all(d.boot_completed and d.abi == "x86_64" for d in found))
+            get_live_devices()
+            shells = [s for s in sim.server.services if s.startswith("shell:")]
+            self.assertEqual(["shell:getprop"] * 5, shells)
+            PROPS.invalidate()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+"""
+Tests the shell session framing and the readiness engine against the fake adb.
+"""
+
+import threading
+import time
+import unittest
+from typing import Any
+
+from android_tester.readiness import SIGNALS, backoff_poll, wait_until_ready
+from android_tester.session import ShellSession
+from android_tester.simulator import FakeToolchain, make_device
+
+
+class ReadinessTester(unittest.TestCase):
+    """Readiness tester."""
+
+    def test_shell_session(self) -> None:
+        with FakeToolchain([make_device("R58M1", model="Galaxy S10")]) as sim:
+            with ShellSession("R58M1") as shell:
+                self.assertEqual(
+                    (0, "Galaxy S10\n"), shell.run("getprop ro.product.model")
+                )
+                self.assertEqual((0, ""), shell.run("true"))
+                rtn, output = shell.run("no-such-command")
+                self.assertEqual(1, rtn)
+                self.assertIn("unsupported", output)
+                self.assertEqual(
+                    (0, "package:/system/framework/framework-res.apk\n"),
+                    shell.run("pm path android"),
+                )
+            shells = [
+                event for event in sim.events("adb") if event["args"] == ["shell"]
+            ]
+            self.assertEqual(1, len(shells))
+
+    def test_ready_device(self) -> None:
+        with FakeToolchain([make_device("emulator-5554")]):
+            readiness = wait_until_ready("emulator-5554", timeout=30)
+        self.assertTrue(readiness.ready)
+        self.assertEqual(
+            [name for name in SIGNALS if name != "console_port"],
+            list(readiness.latencies),
+        )
+
+    def test_still_booting(self) -> None:
+        props: dict[str, Any] = {"sys.boot_completed": "0"}
+        with FakeToolchain([make_device("emulator-5554", **props)]):
+            start = time.monotonic()
+            readiness = wait_until_ready("emulator-5554", timeout=1)
+        self.assertFalse(readiness.ready)
+        self.assertEqual("boot_completed", readiness.failed_signal)
+        self.assertLess(time.monotonic() - start, 5)
+
+    def test_backoff_and_wake(self) -> None:
+        calls = []
+        wake = threading.Event()
+        threading.Timer(0.3, wake.set).start()
+
+        def check() -> bool:
+            calls.append(time.monotonic())
+            return wake.is_set()
+
+        start = time.monotonic()
+        self.assertTrue(backoff_poll(check, time.monotonic() + 10, wake))
+        # Woken up right away instead of after the next (growing) delay.
+        self.assertLess(time.monotonic() - start, 1.0)
+        gaps = [b - a for a, b in zip(calls, calls[1:])]
+        self.assertGreater(gaps[-2], gaps[0])
+        self.assertFalse(backoff_poll(lambda: False, time.monotonic() + 0.2))
+
+
+if __name__ == "__main__":
+    unittest.main()
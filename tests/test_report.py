@@ -0,0 +1,73 @@
+"""
+Tests the run report.
+"""
+
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from android_tester.report import RUN, Phase, RunReport
+from android_tester.scheduler import DeviceResult, device_output_dir
+
+JUNIT = """<?xml version="1.0" encoding="utf-8"?>
+<testsuite name="s" tests="3" failures="1" errors="0" skipped="1" time="1.0">
+  <testcase classname="A" name="a" time="0.5"/>
+</testsuite>
+"""
+
+
+class ReportTester(unittest.TestCase):
+    """Run report tester."""
+
+    def test_phases_results_and_outputs(self) -> None:
+        report = RunReport()
+        with report.phase("sdk_install"):
+            pass
+        with self.assertRaises(RuntimeError), report.phase("avd_boot", "emulator-5554"):
+            raise RuntimeError("boom")
+        now = time.monotonic()
+        report.add(Phase("test", "emulator-5554", now, now + 2.0))
+        report.add(Phase("test", "emulator-5554", now, now + 1.0))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            xml_dir = os.path.join(
+                device_output_dir("emulator-5554", root=tmpdir),
+                "androidTest-results",
+                "connected",
+            )
+            os.makedirs(xml_dir)
+            with open(
+                os.path.join(xml_dir, "TEST-a.xml"), encoding="utf-8", mode="w"
+            ) as file:
+                file.write(JUNIT)
+            report.add_results(
+                [DeviceResult("emulator-5554", 0, now, now + 3)], output_root=tmpdir
+            )
+            report.finish()
+            self.assertEqual(
+                {"test": 3.0},
+                {
+                    k: round(v, 3)
+                    for k, v in report.phase_totals("emulator-5554").items()
+                    if k == "test"
+                },
+            )
+            self.assertEqual([RUN, "emulator-5554"], report.serials())
+            self.assertFalse(report.ok)  # the boot phase failed
+            table = report.summary_table()
+            self.assertIn("1/3", table)
+            self.assertLess(table.index("avd_boot"), table.index("test"))
+            paths = report.write(os.path.join(tmpdir, "report"))
+            with open(paths["json"], encoding="utf-8") as file:
+                data = json.load(file)
+            self.assertEqual(
+                ["sdk_install", "avd_boot", "test", "test"],
+                [p["name"] for p in data["phases"]],
+            )
+            self.assertEqual(3, data["devices"][0]["tests"]["tests"])
+            self.assertTrue(os.path.exists(paths["junit"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,153 @@
+"""
+Tests the flake history and the retry of only the failed tests against the fake adb.
+"""
+
+from __future__ import annotations
+
+import os
+import tempfile
+import unittest
+
+from android_tester.common import get_live_devices
+from android_tester.flakes import QUARANTINE_FLAKES, RELEASE_AFTER, WINDOW, FlakeStore
+from android_tester.instrument import run_direct
+from android_tester.retry import retry_failures
+from android_tester.simulator import FakeToolchain, make_device, make_test
+
+APP = "org.internetwatchdogs.androidmonitor"
+# Sharded over two devices: emulator-5554 runs test0 and test2, emulator-5556 test1 and test3.
+TESTS = [
+    make_test("com.example.FooTest", "test0", status="flaky"),
+    make_test("com.example.FooTest", "test1", status="failed"),
+    make_test("com.example.FooTest", "test2"),
+    make_test("com.example.FooTest", "test3"),
+]
+
+
+def write_apks(root: str) -> tuple[tuple[str, str], ...]:
+    apks = []
+    for package in [APP, f"{APP}.test"]:
+        apks.append((os.path.join(root, f"{package}.apk"), package))
+        with open(apks[-1][0], encoding="utf-8", mode="w") as file:
+            file.write(package)
+    return tuple(apks)
+
+
+class RetryTester(unittest.TestCase):
+    """Retry tester."""
+
+    def test_quarantine(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp, FlakeStore(
+            os.path.join(tmp, "flakes.sqlite")
+        ) as store:
+            test = "com.example.FooTest#testFlaky"
+            for i in range(QUARANTINE_FLAKES):
+                added, _ = store.record(
+                    {
+                        test: ("emulator-5554", "flaky"),
+                        "com.example.FooTest#testOk": ("emulator-5554", "passed"),
+                    }
+                )
+                self.assertEqual([test] if i == QUARANTINE_FLAKES - 1 else [], added)
+            self.assertIn(test, store.quarantined())
+            released: list[str] = []
+            for _ in range(RELEASE_AFTER):
+                self.assertEqual([], released)
+                _, released = store.record({test: ("emulator-5554", "passed")})
+            self.assertEqual([test], released)
+            self.assertEqual({}, store.quarantined())
+            # The flakes from before the release are still in the window, they do not count again.
+            store.record({test: ("emulator-5554", "passed")})
+            self.assertEqual({}, store.quarantined())
+            self.assertEqual([test], [history.test_id for history in store.histories()])
+            # Only the last WINDOW runs are kept, the flakes age out.
+            for _ in range(WINDOW):
+                store.record({test: ("emulator-5554", "passed")})
+            self.assertEqual(WINDOW, len(store.outcomes(test)))
+            self.assertEqual([], store.histories())
+
+    def test_release_by_hand(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp, FlakeStore(
+            os.path.join(tmp, "flakes.sqlite")
+        ) as store:
+            test = "com.example.FooTest#testFlaky"
+            for _ in range(QUARANTINE_FLAKES):
+                store.record({test: ("emulator-5554", "flaky")})
+            self.assertTrue(store.release(test))
+            self.assertFalse(store.release(test))
+            store.record({test: ("emulator-5554", "passed")})
+            self.assertEqual({}, store.quarantined())
+            # New flakes after the release quarantine it again.
+            added: list[str] = []
+            for _ in range(QUARANTINE_FLAKES):
+                self.assertEqual([], added)
+                added, _ = store.record({test: ("emulator-5554", "flaky")})
+            self.assertEqual([test], added)
+
+    def test_retry_failures(self) -> None:
+        devices = [
+            make_device("emulator-5554", packages=[APP]),
+            make_device("emulator-5556", packages=[APP]),
+        ]
+        with FakeToolchain(
+            devices, instrumentation=TESTS
+        ) as sim, tempfile.TemporaryDirectory() as tmp:
+            apks = write_apks(tmp)
+            with FlakeStore(os.path.join(tmp, "flakes.sqlite")) as store:
+                output_root = os.path.join(tmp, "out")
+                results = run_direct(
+                    get_live_devices(), output_root=output_root, shard=True, apks=apks
+                )
+                self.assertEqual([False, False], [result.ok for result in results])
+                retry = retry_failures(
+                    results,
+                    get_live_devices(),
+                    retries=2,
+                    output_root=output_root,
+                    apks=apks,
+                    store=store,
+                )
+                self.assertEqual(["com.example.FooTest#test0"], retry.flaky)
+                self.assertEqual(["com.example.FooTest#test1"], retry.blocking)
+                self.assertEqual(2, len(retry.attempts["com.example.FooTest#test1"]))
+                # Only the failed tests ran again.
+                reruns = sorted(
+                    event["extras"]["class"]
+                    for event in sim.events("adb")
+                    if event["event"] == "instrument" and "class" in event["extras"]
+                )
+                self.assertEqual(
+                    ["com.example.FooTest#test0"] + ["com.example.FooTest#test1"] * 2,
+                    reruns,
+                )
+                self.assertEqual([True, False], [result.ok for result in results])
+                self.assertEqual(
+                    ["com.example.FooTest#test0"], results[0].extra["flaky_tests"]
+                )
+                self.assertEqual(["flaky"], store.outcomes("com.example.FooTest#test0"))
+                self.assertEqual(
+                    ["failed"], store.outcomes("com.example.FooTest#test1")
+                )
+
+                # A quarantined test still runs, its failure no longer fails the device.
+                for _ in range(QUARANTINE_FLAKES):
+                    store.record(
+                        {"com.example.FooTest#test1": ("emulator-5556", "flaky")}
+                    )
+                results = run_direct(
+                    get_live_devices(), output_root=output_root, shard=True, apks=apks
+                )
+                retry = retry_failures(
+                    results,
+                    get_live_devices(),
+                    retries=0,
+                    output_root=output_root,
+                    apks=apks,
+                    store=store,
+                )
+                self.assertEqual([], retry.blocking)
+                self.assertEqual([True, True], [result.ok for result in results])
+
+
+if __name__ == "__main__":
+    unittest.main()
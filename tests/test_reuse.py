@@ -0,0 +1,118 @@
+"""
+Tests emulator reuse: health check, reset to a clean state and the reuse metrics.
+"""
+
+import os
+import subprocess
+import tempfile
+import unittest
+
+from android_tester import reuse, snapshot
+from android_tester.android_tests import acquire_emulator
+from android_tester.device_watcher import get_registry
+from android_tester.emulator import EMULATOR_TYPE, SDK_PACKAGES
+from android_tester.report import start_report
+from android_tester.simulator import FakeToolchain
+
+APP = "org.internetwatchdogs.androidmonitor"
+AVD = "Pixel_API_33"
+
+
+def packages(serial: str) -> str:
+    return subprocess.check_output(
+        ["adb", "-s", serial, "shell", "pm", "list", "packages"], text=True
+    )
+
+
+class ReuseTester(unittest.TestCase):
+    """Reuse tester."""
+
+    def setUp(self) -> None:
+        # The shared registry may still list the emulators of an earlier simulation.
+        get_registry().wait_gone(lambda device: device.emulator, timeout=10)
+
+    def test_reused_between_runs(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            apk = os.path.join(tmp, "app.apk")
+            with open(apk, encoding="utf-8", mode="w") as file:
+                file.write(APP)
+            with FakeToolchain(
+                [], avds=[AVD], sdk_packages=SDK_PACKAGES, boot_duration=0.5
+            ) as sim:
+                with acquire_emulator(33, use_snapshot=False, reuse=True) as first:
+                    self.assertIsNotNone(first.process)
+                    subprocess.check_call(
+                        ["adb", "-s", first.serial, "install", apk],
+                        stdout=subprocess.DEVNULL,
+                    )
+                self.assertFalse(first.stopped)  # kept for the next run
+                self.assertIn(APP, packages(first.serial))
+                report = start_report()
+                with acquire_emulator(33, use_snapshot=False, reuse=True) as second:
+                    self.assertIsNone(second.process)
+                    self.assertEqual(first.serial, second.serial)
+                self.assertNotIn(APP, packages(second.serial))
+                self.assertEqual(
+                    ["hit"],
+                    [
+                        phase.detail.split(",")[0]
+                        for phase in report.phases
+                        if phase.name == "reuse"
+                    ],
+                )
+                stats = reuse.load_stats()
+                self.assertEqual(
+                    (2, 1, {"none_running": 1}), (stats.runs, stats.hits, stats.misses)
+                )
+                self.assertGreater(stats.seconds_saved, 0)
+                with acquire_emulator(33, use_snapshot=False) as third:
+                    self.assertIsNotNone(third.process)
+                self.assertTrue(third.stopped)
+                self.assertEqual(
+                    2,
+                    len(
+                        [
+                            event
+                            for event in sim.events("emulator")
+                            if event["event"] == "start"
+                        ]
+                    ),
+                )
+                self.assertEqual(
+                    2, reuse.load_stats().runs
+                )  # not reusing unless asked to
+
+    def test_health_check(self) -> None:
+        with FakeToolchain([], avds=[AVD], sdk_packages=SDK_PACKAGES):
+            running = acquire_emulator(33, use_snapshot=False, reuse=True)
+            try:
+                self.assertIsNone(reuse.try_reuse(30, EMULATOR_TYPE))
+                config = os.path.join(snapshot.avd_dir(AVD), "config.ini")
+                os.makedirs(os.path.dirname(config), exist_ok=True)
+                with open(config, encoding="utf-8", mode="w") as file:
+                    file.write(
+                        "hw.cpu.arch=x86_64\n"
+                        "image.sysdir.1=system-images/android-33/google_apis/x86_64/\n"
+                    )
+                self.assertEqual(
+                    "system-images;android-33;google_apis;x86_64",
+                    reuse.avd_system_image(AVD),
+                )
+                self.assertIsNone(
+                    reuse.try_reuse(33, EMULATOR_TYPE)
+                )  # google_apis, not google_apis_playstore
+                reused = reuse.try_reuse(
+                    33, "system-images;android-33;google_apis;x86_64"
+                )
+                assert reused is not None
+                self.assertEqual(running.serial, reused.serial)
+                self.assertEqual(
+                    {"none_running": 1, "api": 1, "image": 1}, reuse.load_stats().misses
+                )
+            finally:
+                running.kill()
+            self.assertTrue(running.stopped)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+"""
+Tests the multi-device scheduler against the fake adb/gradle toolchain.
+"""
+
+from __future__ import annotations
+
+import os
+import tempfile
+import time
+import unittest
+
+from android_tester.android_tests import run_all_devices
+from android_tester.common import get_live_devices
+from android_tester.simulator import FakeToolchain, make_device
+
+DEVICES = [
+    make_device(
+        "R58M1", model="Galaxy S10", packages=["org.internetwatchdogs.androidmonitor"]
+    ),
+    make_device("R58M2", model="Galaxy S10"),
+    make_device("emulator-5554", model="sdk_gphone64"),
+]
+
+
+def intervals(toolchain: FakeToolchain) -> dict[str, tuple[float, float]]:
+    out: dict[str, list[float]] = {}
+    for event in toolchain.events("gradle"):
+        out.setdefault(event["serial"], []).append(event["t"])
+    return {serial: (times[0], times[1]) for serial, times in out.items()}
+
+
+class SchedulerTester(unittest.TestCase):
+    """Scheduler concurrency and failure isolation."""
+
+    def test_parallel_fan_out(self) -> None:
+        """All devices run at the same time, one failure does not affect the others."""
+        with FakeToolchain(
+            DEVICES, gradle_duration=1.0, gradle_fail_serials=["R58M2"]
+        ) as sim:
+            devices = get_live_devices()
+            self.assertEqual(3, len(devices))
+            with tempfile.TemporaryDirectory() as output_root:
+                start = time.monotonic()
+                results = run_all_devices(devices, output_root=output_root)  # type: ignore
+                elapsed = time.monotonic() - start
+                self.assertEqual(
+                    ["R58M1", "R58M2", "emulator-5554"], [r.serial for r in results]
+                )
+                self.assertEqual([True, False, True], [r.ok for r in results])
+                for result in results:
+                    assert result.log_path is not None
+                    self.assertTrue(os.path.exists(result.log_path))
+                    with open(result.log_path, encoding="utf-8") as file:
+                        self.assertIn(
+                            f"Configure project for {result.serial}", file.read()
+                        )
+                    self.assertIn("configuration_time", result.extra)
+            # The devices share the project cache dir (configuration cache) of the project.
+            self.assertFalse(
+                [
+                    event
+                    for event in sim.events("gradle")
+                    if event["event"] == "start"
+                    and "--project-cache-dir" in event["args"]
+                ]
+            )
+            spans = intervals(sim)
+            latest_start = max(start for start, _ in spans.values())
+            earliest_end = min(end for _, end in spans.values())
+            self.assertLess(latest_start, earliest_end, "gradle runs did not overlap")
+            self.assertLess(elapsed, 3 * 1.0)
+
+    def test_max_parallel(self) -> None:
+        """With --max-parallel 1 the devices run one after another."""
+        with FakeToolchain(DEVICES[:2], gradle_duration=0.2) as sim:
+            devices = get_live_devices()
+            with tempfile.TemporaryDirectory() as output_root:
+                results = run_all_devices(devices, max_parallel=1, output_root=output_root)  # type: ignore
+            self.assertTrue(all(r.ok for r in results))
+            spans = sorted(intervals(sim).values())
+            self.assertLessEqual(spans[0][1], spans[1][0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+"""
+Tests the SDK component resolver against a synthetic SDK directory.
+"""
+
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from android_tester import emulator, sdk
+from android_tester.sdk import SdkResolver
+
+PACKAGE_XML = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<ns2:repository xmlns:ns2="http://schemas.android.com/repository/android/common/02">
+  <localPackage path="{path}" obsolete="false">
+    <revision><major>{major}</major><minor>0</minor><micro>2</micro></revision>
+    <display-name>{path}</display-name>
+  </localPackage>
+</ns2:repository>
+"""
+
+
+def add_package(root: str, path: str, major: int = 33) -> None:
+    directory = os.path.join(root, *path.split(";"))
+    os.makedirs(directory, exist_ok=True)
+    with open(
+        os.path.join(directory, "package.xml"), encoding="utf-8", mode="w"
+    ) as file:
+        file.write(PACKAGE_XML.format(path=path, major=major))
+
+
+class SdkTester(unittest.TestCase):
+    """SDK resolver tester."""
+
+    def setUp(self) -> None:
+        # pylint: disable-next=consider-using-with
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.tmpdir.name, "sdk")
+        self.cache = os.path.join(self.tmpdir.name, "cache", "sdk.json")
+        for path in ["platform-tools", "emulator", "build-tools;33.0.2"]:
+            add_package(self.root, path)
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def test_missing_and_cache(self) -> None:
+        resolver = SdkResolver(self.root, self.cache)
+        image = "system-images;android-30;google_apis_playstore;x86_64"
+        self.assertEqual(
+            [image], resolver.missing(["platform-tools", "emulator", image])
+        )
+        self.assertEqual("33.0.2", resolver.installed()["build-tools;33.0.2"].revision)
+        # A new resolver (next run) answers from the cache without scanning.
+        with mock.patch.object(sdk, "scan", side_effect=AssertionError("scanned")):
+            self.assertEqual(
+                [image], SdkResolver(self.root, self.cache).missing([image])
+            )
+        # Installing the image changes the mtimes, the cache is rebuilt.
+        time.sleep(0.01)
+        add_package(self.root, image)
+        self.assertEqual([], SdkResolver(self.root, self.cache).missing([image]))
+
+    def test_ensure_installed_skips_sdkmanager(self) -> None:
+        add_package(self.root, emulator.EMULATOR_TYPE)
+        with mock.patch.dict(
+            os.environ,
+            {
+                "ANDROID_SDK_ROOT": self.root,
+                "ANDROID_TESTER_CACHE_DIR": self.tmpdir.name,
+            },
+        ):
+            with mock.patch.object(emulator, "exec_cmd") as exec_cmd:
+                emulator.ensure_installed()
+                exec_cmd.assert_not_called()
+            os.remove(os.path.join(self.root, "emulator", "package.xml"))
+            with mock.patch.object(emulator, "exec_cmd") as exec_cmd:
+                emulator.ensure_installed()
+                commands = [call.args[0] for call in exec_cmd.call_args_list]
+        self.assertEqual(2, len(commands))
+        self.assertEqual(
+            ["sdkmanager", "--install", "emulator", "--channel=0"], commands[1]
+        )
+
+    def test_find_adb_cached(self) -> None:
+        adb = os.path.join(self.root, "platform-tools", "adb")
+        with open(adb, encoding="utf-8", mode="w") as file:
+            file.write("#!/bin/sh\n")
+        os.chmod(adb, 0o755)
+        env = {
+            "PATH": self.tmpdir.name,
+            "ANDROID_HOME": self.root,
+            "ANDROID_SDK_ROOT": "",
+        }
+        with mock.patch.dict(os.environ, env):
+            self.assertEqual(adb, sdk.find_adb(self.cache))
+            self.assertTrue(os.environ["PATH"].startswith(os.path.dirname(adb)))
+        # Same PATH/ANDROID_HOME next run: the environment comes from the cache, no search.
+        with mock.patch.dict(os.environ, env), mock.patch.object(
+            sdk, "search_adb", side_effect=AssertionError("searched")
+        ):
+            self.assertEqual(adb, sdk.find_adb(self.cache))
+            self.assertTrue(os.environ["PATH"].startswith(os.path.dirname(adb)))
+        with mock.patch.dict(
+            os.environ, {**env, "ANDROID_HOME": self.tmpdir.name}
+        ), mock.patch.dict(sys.modules, {"setenvironment": None}):
+            self.assertIsNone(sdk.find_adb(self.cache))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+"""
+Tests batched shell commands and their concurrent application to many devices.
+"""
+
+from __future__ import annotations
+
+import unittest
+
+from android_tester.android_tests import STAY_AWAKE_SETTINGS, stay_awake
+from android_tester.common import get_live_devices
+from android_tester.session import ShellSession, run_batches
+from android_tester.simulator import FakeToolchain, make_device
+
+APP = "org.internetwatchdogs.androidmonitor"
+DEVICES = [
+    make_device(f"R58M{i}", packages=[APP, f"{APP}.test", "com.other"])
+    for i in range(4)
+]
+
+
+def shells(sim: FakeToolchain) -> list[str]:
+    return [
+        event["serial"] for event in sim.events("adb") if event["args"] == ["shell"]
+    ]
+
+
+class SessionTester(unittest.TestCase):
+    """Session tester."""
+
+    def test_batch(self) -> None:
+        with FakeToolchain(DEVICES[:1]), ShellSession("R58M0") as shell:
+            results = shell.batch(
+                ["true", "pm path com.missing", f"pm list packages {APP}"]
+            )
+        self.assertEqual(
+            [(0, ""), (1, ""), (0, f"package:{APP}\npackage:{APP}.test\n")], results
+        )
+
+    def test_run_batches(self) -> None:
+        with FakeToolchain(DEVICES) as sim:
+            results = run_batches(
+                {
+                    "R58M0": ["true", "getprop ro.product.model"],
+                    "R58M1": ["no-such-command"],
+                    "missing": ["true"],
+                }
+            )
+            self.assertEqual([(0, ""), (0, "Pixel\n")], results["R58M0"])
+            self.assertEqual(1, results["R58M1"][0][0])
+            self.assertEqual(255, results["missing"][0][0])
+            self.assertEqual(["R58M0", "R58M1", "missing"], sorted(shells(sim)))
+
+    def test_stay_awake(self) -> None:
+        """One shell per device for all the settings."""
+        with FakeToolchain(DEVICES) as sim:
+            stay_awake(get_live_devices())
+            self.assertEqual(
+                sorted(device["serial"] for device in DEVICES), sorted(shells(sim))
+            )
+            self.assertFalse(
+                [
+                    event
+                    for event in sim.events("adb")
+                    if event["args"][:2] == ["shell", "settings"]
+                ]
+            )
+        self.assertEqual(3, len(STAY_AWAKE_SETTINGS))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+"""
+Tests the device dashboard: event driven updates, diff redraws and JSON streaming.
+"""
+
+import io
+import json
+import time
+import unittest
+from typing import Any
+
+from android_tester.adb_client import AdbClient
+from android_tester.device_watcher import DeviceRegistry, DeviceWatcher
+from android_tester.props import PROPS, DeviceProps
+from android_tester.show_devices import BOOT_POLL, Dashboard, parse_battery
+from android_tester.simulator import FakeToolchain, make_device
+
+
+class ShowDevicesTester(unittest.TestCase):
+    """Dashboard tester."""
+
+    def test_parse_battery(self) -> None:
+        self.assertEqual(
+            87,
+            parse_battery(
+                "Current Battery Service state:\n  AC powered: false\n  level: 87\n  scale: 100\n"
+            ),
+        )
+        self.assertIsNone(parse_battery("Can't find service: battery"))
+
+    def test_draw_rewrites_changed_lines_only(self) -> None:
+        out = io.StringIO()
+        with FakeToolchain([]):
+            dashboard = Dashboard(DeviceRegistry(DeviceWatcher()), out=out)
+            dashboard.draw(["title", "a", "b", "c"])
+            self.assertTrue(out.getvalue().startswith("\033[2J"))
+            out.seek(0)
+            out.truncate()
+            dashboard.draw(["title", "a", "B"])
+        self.assertEqual("\033[3;1HB\033[K\033[4;1H\033[J\033[4;1H", out.getvalue())
+
+    def test_json_stream(self) -> None:
+        props: dict[str, Any] = {"battery.level": "42", "ro.build.version.sdk": "33"}
+        devices = [make_device("R58M1", model="Galaxy S10", **props)]
+        with FakeToolchain(devices, adb_server=True) as sim:
+            client = AdbClient(port=sim.server.port)
+            registry = DeviceRegistry(DeviceWatcher(client=client)).start()
+            out = io.StringIO()
+            try:
+                dashboard = Dashboard(registry, out=out, json_mode=True)
+                dashboard.update()
+                dashboard.update()  # nothing changed, nothing written
+                sim.server.add_device(
+                    make_device("emulator-5554", model="sdk_gphone64")
+                )
+                self.assertTrue(dashboard.changed.wait(5))
+                self.assertIsNotNone(
+                    registry.wait_for(lambda d: d.serial == "emulator-5554", timeout=5)
+                )
+                dashboard.update()
+            finally:
+                registry.stop()
+            battery_reads = [
+                event
+                for event in sim.events("adb")
+                if "battery" in " ".join(map(str, event.get("args", [])))
+            ]
+        events = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(["added", "added"], [event["event"] for event in events])
+        self.assertEqual(
+            {
+                "serial": "R58M1",
+                "state": "device",
+                "model": "Galaxy S10",
+                "api_level": 33,
+                "battery": 42,
+                "boot_completed": True,
+            },
+            events[0]["device"],
+        )
+        self.assertEqual("emulator-5554", events[1]["device"]["serial"])
+        self.assertEqual(
+            [], battery_reads
+        )  # read over the adb server socket, no adb processes
+
+    def test_boot_state_is_polled(self) -> None:
+        """A booting device is read again after BOOT_POLL, a booted one with the battery."""
+        with FakeToolchain([make_device("emulator-5554")], adb_server=True) as sim:
+            registry = DeviceRegistry(
+                DeviceWatcher(client=AdbClient(port=sim.server.port))
+            ).start()
+            try:
+                dashboard = Dashboard(registry, out=io.StringIO(), json_mode=True)
+                booting = {"sys.boot_completed": "0", "ro.product.model": "booting"}
+                PROPS.put(
+                    DeviceProps("emulator-5554", booting, fetched_at=time.monotonic())
+                )
+                dashboard.update()
+                self.assertTrue(dashboard.booting)
+                PROPS.put(
+                    DeviceProps(
+                        "emulator-5554",
+                        booting,
+                        fetched_at=time.monotonic() - BOOT_POLL - 1,
+                    )
+                )
+                dashboard.update()
+                self.assertFalse(dashboard.booting)
+                self.assertEqual("Pixel", dashboard.last_rows["emulator-5554"].model)
+                PROPS.put(
+                    DeviceProps(
+                        "emulator-5554",
+                        {"sys.boot_completed": "1", "ro.product.model": "kept"},
+                        fetched_at=time.monotonic() - BOOT_POLL - 1,
+                    )
+                )
+                dashboard.update()
+                self.assertEqual("kept", dashboard.last_rows["emulator-5554"].model)
+            finally:
+                registry.stop()
+                PROPS.invalidate()
+
+
+if __name__ == "__main__":
+    unittest.main()
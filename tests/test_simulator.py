@@ -0,0 +1,104 @@
+"""
+Tests the fake emulator, sdkmanager and failure injection of the simulator.
+"""
+
+import asyncio
+import os
+import subprocess
+import tempfile
+import unittest
+
+from android_tester.emulator import SDK_PACKAGES, ensure_installed
+from android_tester.emulator_pool import launch_emulator
+from android_tester.install_cache import InstallCache, install_if_changed
+from android_tester.logpump import BOOT_COMPLETED, LogPump
+from android_tester.readiness import wait_until_ready
+from android_tester.sdk import SdkResolver
+from android_tester.simulator import FakeToolchain, make_device
+
+
+class SimulatorTester(unittest.TestCase):
+    """Simulator tester."""
+
+    def test_emulator_boot_and_kill(self) -> None:
+        with FakeToolchain([], avds=["Pixel_API_33"], boot_duration=0.5) as sim:
+            self.assertEqual(
+                "Pixel_API_33\n",
+                subprocess.check_output(["emulator", "-list-avds"], text=True),
+            )
+            process = launch_emulator("Pixel_API_33", 5600)
+            assert process is not None and process.stdout is not None
+            pump = LogPump(process.stdout, name="emulator-5600")
+            boot = pump.add_trigger(BOOT_COMPLETED)
+            pump.start()
+            readiness = wait_until_ready(
+                "emulator-5600", timeout=20, console_port=5600, boot_signal=boot.event
+            )
+            self.assertTrue(readiness.ready, readiness.summary())
+            self.assertTrue(boot.event.is_set())
+            self.assertGreaterEqual(readiness.latencies["boot_completed"], 0.4)
+            devices = subprocess.check_output(["adb", "devices", "-l"], text=True)
+            self.assertIn("emulator-5600", devices)
+            subprocess.check_call(["adb", "-s", "emulator-5600", "emu", "kill"])
+            self.assertEqual(0, process.wait(timeout=10))
+            pump.join()
+            self.assertNotIn(
+                "emulator-5600",
+                subprocess.check_output(["adb", "devices", "-l"], text=True),
+            )
+            self.assertEqual(
+                ["start", "exit"], [event["event"] for event in sim.events("emulator")]
+            )
+
+    def test_emulator_never_boots(self) -> None:
+        with FakeToolchain([], avds=["Broken"], fail={"boot": ["Broken"]}):
+            process = launch_emulator("Broken", 5602)
+            assert process is not None
+            readiness = wait_until_ready(
+                "emulator-5602", timeout=1.5, console_port=5602
+            )
+            self.assertFalse(readiness.ready)
+            self.assertEqual("boot_completed", readiness.failed_signal)
+        self.assertEqual(
+            0, process.wait(timeout=10)
+        )  # stopped when the simulation ends
+
+    def test_sdkmanager(self) -> None:
+        with FakeToolchain([], sdk_packages=SDK_PACKAGES[:1]) as sim:
+            self.assertEqual(SDK_PACKAGES[1:], SdkResolver().missing(SDK_PACKAGES))
+            ensure_installed()
+            self.assertEqual([], SdkResolver().missing(SDK_PACKAGES))
+            ensure_installed()
+            installs = [
+                event["args"]
+                for event in sim.events("sdkmanager")
+                if "--install" in event["args"]
+            ]
+            self.assertEqual(1, len(installs))
+            self.assertEqual(
+                SDK_PACKAGES[1:],
+                [arg for arg in installs[0] if not arg.startswith("-")],
+            )
+
+    def test_install_failure(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            apk = os.path.join(tmp, "app-debug.apk")
+            with open(apk, encoding="utf-8", mode="w") as file:
+                file.write("com.example.app")
+            devices = [make_device("R58M1"), make_device("R58M2")]
+            with FakeToolchain(devices, fail={"install": ["R58M2"]}):
+                cache = InstallCache(os.path.join(tmp, "cache.json"))
+                self.assertTrue(
+                    asyncio.run(
+                        install_if_changed("R58M1", apk, "com.example.app", cache)
+                    )
+                )
+                with self.assertRaises(subprocess.CalledProcessError):
+                    asyncio.run(
+                        install_if_changed("R58M2", apk, "com.example.app", cache)
+                    )
+                self.assertIsNone(cache.get("R58M2", "com.example.app"))
+
+
+if __name__ == "__main__":
+    unittest.main()